@@ -0,0 +1,70 @@
+"""
+Benchmark of `TextChunker` against langchain's `RecursiveCharacterTextSplitter` on large inputs.
+
+    python -m benchmarks.chunker_benchmark --size-mb 10
+
+The input is `--file` repeated up to `--size-mb` megabytes. In compatibility mode the chunks of both splitters
+must be identical; the command exits with status 1 if they differ.
+"""
+import argparse
+import sys
+import time
+
+from task.tools.rag.chunker import DEFAULT_SEPARATORS, TextChunker
+
+
+def _timed(fn, repeat: int):
+    result = None
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--file', default='tests/microwave_manual.txt')
+    parser.add_argument('--size-mb', type=float, default=10)
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--chunk-overlap', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.file, encoding='utf-8') as file:
+        sample = file.read()
+    text = sample * max(1, int(args.size_mb * 1024 * 1024 / len(sample)))
+    print(f"{len(text) / 1024 / 1024:.1f} MB of text, best of {args.repeat} runs\n")
+
+    chunker = TextChunker(args.chunk_size, args.chunk_overlap)
+    offsets, offsets_time = _timed(lambda: chunker.split_offsets(text), args.repeat)
+    chunks, chunks_time = _timed(lambda: chunker.split_text(text), args.repeat)
+    print(f"{'TextChunker.split_offsets':<32} {offsets_time:>8.3f}s {len(offsets):>8} chunks")
+    print(f"{'TextChunker.split_text':<32} {chunks_time:>8.3f}s {len(chunks):>8} chunks")
+
+    try:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+    except ImportError:
+        print("\nlangchain-text-splitters is not installed, skipping comparison")
+        return 0
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        length_function=len,
+        separators=list(DEFAULT_SEPARATORS)
+    )
+    expected, splitter_time = _timed(lambda: splitter.split_text(text), args.repeat)
+    print(f"{'RecursiveCharacterTextSplitter':<32} {splitter_time:>8.3f}s {len(expected):>8} chunks")
+    print(f"\nspeedup: {splitter_time / offsets_time:.2f}x (offsets), {splitter_time / chunks_time:.2f}x (strings)")
+
+    if chunks != expected:
+        print("compatibility check failed: chunks differ")
+        return 1
+    print("compatibility check passed: chunks are identical")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Parity check and indexing-throughput benchmark of embedding backends against the PyTorch baseline.
+
+    python -m benchmarks.embedding_benchmark --backends onnx onnx-int8 --repeat 20
+
+Every backend embeds the chunks of `--file` (split like `RagTool` does). Parity is reported as the cosine
+similarity to the PyTorch embeddings and as the overlap of top-k retrieval results. The command exits with
+status 1 if a backend's mean cosine is below `--min-cosine`.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from task.tools.rag.chunker import TextChunker
+from task.tools.rag.embedding_model import DEFAULT_EMBEDDING_MODEL, EMBEDDING_BACKENDS, load_embedding_model
+
+_QUERIES = [
+    "How do I clean the inside of the oven?",
+    "What should I do if the oven does not start?",
+    "Can I use metal containers?",
+    "How to set the clock?",
+    "Precautions to avoid exposure to microwave energy",
+]
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def _throughput(model, chunks: list[str], repeat: int) -> float:
+    model.encode(chunks[:8])
+    started = time.perf_counter()
+    for _ in range(repeat):
+        model.encode(chunks)
+    return len(chunks) * repeat / (time.perf_counter() - started)
+
+
+def _top_k_overlap(reference: np.ndarray, candidate: np.ndarray, ref_queries: np.ndarray,
+                   cand_queries: np.ndarray, k: int) -> float:
+    overlaps = []
+    for ref_query, cand_query in zip(ref_queries, cand_queries):
+        ref_top = set(np.argsort(-(reference @ ref_query))[:k])
+        cand_top = set(np.argsort(-(candidate @ cand_query))[:k])
+        overlaps.append(len(ref_top & cand_top) / k)
+    return float(np.mean(overlaps))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--file', default='tests/microwave_manual.txt')
+    parser.add_argument('--model', default=DEFAULT_EMBEDDING_MODEL)
+    parser.add_argument('--backends', nargs='+', default=['onnx', 'onnx-int8'],
+                        choices=[b for b in EMBEDDING_BACKENDS if b != 'torch'])
+    parser.add_argument('--cache-dir', default=None)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--min-cosine', type=float, default=0.98)
+    args = parser.parse_args()
+
+    with open(args.file, encoding='utf-8') as file:
+        text = file.read()
+    splitter = TextChunker(chunk_size=500, chunk_overlap=50)
+    chunks = splitter.split_text(text)
+    print(f"{len(chunks)} chunks from {args.file}, {args.repeat} repetitions\n")
+
+    baseline_model = load_embedding_model(args.model, 'torch')
+    baseline = _normalize(baseline_model.encode(chunks))
+    baseline_queries = _normalize(baseline_model.encode(_QUERIES))
+    baseline_rate = _throughput(baseline_model, chunks, args.repeat)
+    print(f"{'backend':<10} {'chunks/s':>10} {'speedup':>8} {'mean cos':>9} {'min cos':>8} {'top-k':>6}")
+    print(f"{'torch':<10} {baseline_rate:>10.1f} {1.0:>7.2f}x {1.0:>9.4f} {1.0:>8.4f} {1.0:>6.2f}")
+
+    failed = False
+    for backend in args.backends:
+        model = load_embedding_model(args.model, backend, args.cache_dir)
+        embeddings = _normalize(model.encode(chunks))
+        cosines = np.sum(embeddings * baseline, axis=1)
+        overlap = _top_k_overlap(baseline, embeddings, baseline_queries, _normalize(model.encode(_QUERIES)), args.top_k)
+        rate = _throughput(model, chunks, args.repeat)
+        print(f"{backend:<10} {rate:>10.1f} {rate / baseline_rate:>7.2f}x "
+              f"{cosines.mean():>9.4f} {cosines.min():>8.4f} {overlap:>6.2f}")
+        if cosines.mean() < args.min_cosine:
+            print(f"  parity check failed: mean cosine {cosines.mean():.4f} < {args.min_cosine}")
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
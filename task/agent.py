@@ -3,15 +3,18 @@ import copy
 import json
 from typing import Any
 
-from aidial_client import AsyncDial
 from aidial_client.types.chat.legacy.chat_completion import CustomContent, ToolCall
 from aidial_sdk.chat_completion import Message, Role, Choice, Request, Response
 
 from task.tools.base import BaseTool
 from task.tools.models import ToolCallParams
+from task.utils.dial_client_registry import DialClientRegistry
 from task.utils.constants import TOOL_CALL_HISTORY_KEY
 from task.utils.history import unpack_messages
+from task.utils.prompt_prefix import PromptCacheStats, PromptPrefix
 from task.utils.stage import StageProcessor
+from task.utils.state_codec import StateCodec
+from task.utils.tool_selector import ToolSelector
 
 
 class GeneralPurposeAgent:
@@ -21,23 +24,31 @@ class GeneralPurposeAgent:
             endpoint: str,
             system_prompt: str,
             tools: list[BaseTool],
+            state_codec: StateCodec | None = None,
+            client_registry: DialClientRegistry | None = None,
+            tool_selector: ToolSelector | None = None,
+            prompt_prefix: PromptPrefix | None = None,
+            prompt_cache_stats: PromptCacheStats | None = None,
     ):
         self.endpoint = endpoint
         self.system_prompt = system_prompt
         self.tools = tools or []
         self._tools_dict = {tool.name: tool for tool in self.tools}
-        self._tool_schemas = [tool.schema for tool in self.tools] if self.tools else []
+        self.prompt_prefix = prompt_prefix or PromptPrefix(system_prompt, self.tools)
+        self.prompt_cache_stats = prompt_cache_stats
         self.state: dict[str, Any] = {TOOL_CALL_HISTORY_KEY: []}
+        self.state_codec = state_codec or StateCodec()
+        self.client_registry = client_registry or DialClientRegistry()
+        self.tool_selector = tool_selector
 
     async def handle_request(self, deployment_name: str, choice: Choice, request: Request,
                              response: Response) -> Message:
-        client = AsyncDial(
-            base_url=self.endpoint,
-            api_key=request.api_key,
-            api_version=request.api_version,
-        )
-        prepared_messages = self._prepare_messages(request.messages)
-        tool_schemas = self._tool_schemas or None
+        client = self.client_registry.get(self.endpoint, request.api_key, request.api_version)
+        prepared_messages = await self._prepare_messages(request.messages, request.headers.get("x-conversation-id"))
+        tool_schemas = self.prompt_prefix.tool_schemas() or None
+        if self.tool_selector and tool_schemas:
+            selected_tools = await self.tool_selector.select(request.messages, prepared_messages)
+            tool_schemas = self.prompt_prefix.tool_schemas(tool.name for tool in selected_tools)
         chunks = await client.chat.completions.create(
             deployment_name=deployment_name,
             messages=prepared_messages,
@@ -48,8 +59,11 @@ class GeneralPurposeAgent:
         tool_call_index_map: dict[int, dict[str, Any]] = {}
         content_parts: list[str] = []
         collected_attachments: list[dict[str, Any]] = []
+        usage = None
 
         async for chunk in chunks:
+            if chunk.usage:
+                usage = chunk.usage
             if not chunk.choices:
                 continue
             delta = chunk.choices[0].delta
@@ -105,6 +119,9 @@ class GeneralPurposeAgent:
                                 existing_args = tool_call["function"].get("arguments", "")
                                 tool_call["function"]["arguments"] = existing_args + function_delta.arguments
 
+        if self.prompt_cache_stats:
+            self.prompt_cache_stats.record(self.prompt_prefix.fingerprint_for(tool_schemas), usage)
+
         content = "".join(content_parts)
         custom_content = None
         if collected_attachments:
@@ -138,19 +155,19 @@ class GeneralPurposeAgent:
             )
             return await self.handle_request(deployment_name, choice, request, response)
 
-        choice.set_state(self.state)
+        # Encoding compresses contents and may write blobs to Redis or disk, so it runs off the event loop
+        choice.set_state(await asyncio.to_thread(
+            self.state_codec.encode, self.state[TOOL_CALL_HISTORY_KEY], request.headers.get("x-conversation-id")
+        ))
         return assistant_message
 
-    def _prepare_messages(self, messages: list[Message]) -> list[dict[str, Any]]:
+    async def _prepare_messages(self, messages: list[Message], conversation_id: str | None) -> list[dict[str, Any]]:
         state_history = copy.deepcopy(self.state.get(TOOL_CALL_HISTORY_KEY, []))
-        unpacked_messages = unpack_messages(messages, state_history)
-        prepared_messages: list[dict[str, Any]] = [
-            {
-                "role": Role.SYSTEM.value,
-                "content": self.system_prompt,
-            }
-        ]
-        prepared_messages.extend(unpacked_messages)
+        unpacked_messages = unpack_messages(messages, state_history, self.state_codec)
+        # The static prefix always goes first so its serialization is shared across turns and users
+        prepared_messages = self.prompt_prefix.messages(unpacked_messages)
+        # Blobs are fetched last, only for the messages that made it into the context
+        prepared_messages = await asyncio.to_thread(self.state_codec.resolve, prepared_messages, conversation_id)
 
         for message in prepared_messages:
             print(json.dumps(message, ensure_ascii=False, default=str))
@@ -186,6 +203,7 @@ class GeneralPurposeAgent:
                     api_key=api_key,
                     api_version=api_version,
                     conversation_id=conversation_id,
+                    client_registry=self.client_registry,
                 )
             )
         finally:
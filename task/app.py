@@ -1,5 +1,6 @@
 import logging
 import os
+from pathlib import Path
 
 import uvicorn
 from aidial_sdk import DIALApp
@@ -8,57 +9,195 @@ from aidial_sdk.chat_completion import ChatCompletion, Request, Response
 from task.agent import GeneralPurposeAgent
 from task.prompts import SYSTEM_PROMPT
 from task.tools.base import BaseTool
+from task.tools.deployment.configurable_deployment_tool import ConfigurableDeploymentTool
 from task.tools.deployment.image_generation_tool import ImageGenerationTool
 from task.tools.files.file_content_extraction_tool import FileContentExtractionTool
 from task.tools.py_interpreter.python_code_interpreter_tool import PythonCodeInterpreterTool
 from task.tools.mcp.mcp_client import MCPClient
 from task.tools.mcp.mcp_tool import MCPTool
+from task.tools.mcp.result_store import CachePolicy, MCPResultStore
 from task.tools.rag.document_cache import DocumentCache
+from task.tools.rag.embedding_model import load_embedding_model
 from task.tools.rag.rag_tool import RagTool
+from task.tools.rag.shared_store import create_shared_store
+from task.utils.admission import AdmissionController
+from task.utils.dial_client_registry import DialClientRegistry
+from task.utils.file_prefetcher import FilePrefetcher
+from task.utils.prompt_prefix import PromptCacheStats, PromptPrefix
+from task.utils.state_codec import BlobStore, StateCodec
+from task.utils.tool_selector import ToolSelector
 
 logging.basicConfig(level=logging.INFO)
 
 DIAL_ENDPOINT = os.getenv('DIAL_ENDPOINT', "http://localhost:8080")
 DEPLOYMENT_NAME = os.getenv('DEPLOYMENT_NAME', 'gpt-4o')
 # DEPLOYMENT_NAME = os.getenv('DEPLOYMENT_NAME', 'claude-sonnet-3-7')
+RAG_EMBEDDING_WORKERS = int(os.getenv('RAG_EMBEDDING_WORKERS', 1))
+RAG_EARLY_ANSWER_BATCHES = int(os.getenv('RAG_EARLY_ANSWER_BATCHES', 0))
+RAG_INDEX_STORAGE = os.getenv('RAG_INDEX_STORAGE', 'flat')
+RAG_EXACT_RERANK = os.getenv('RAG_EXACT_RERANK', 'false').lower() == 'true'
+# 'torch', 'onnx', 'onnx-int8' or 'openvino'; exported models are cached in RAG_EMBEDDING_CACHE_DIR
+RAG_EMBEDDING_BACKEND = os.getenv('RAG_EMBEDDING_BACKEND', 'torch')
+RAG_EMBEDDING_CACHE_DIR = os.getenv('RAG_EMBEDDING_CACHE_DIR') or None
+RAG_QUERY_CACHE_SIZE = int(os.getenv('RAG_QUERY_CACHE_SIZE', 1024))
+# Cache of synthesized answers to the same question on the same chunks, 0 disables it
+RAG_ANSWER_CACHE_SIZE = int(os.getenv('RAG_ANSWER_CACHE_SIZE', 512))
+# Opt-in: also reuse answers of questions with at least this embedding similarity (e.g. 0.97), empty disables it
+RAG_ANSWER_CACHE_SIMILARITY = os.getenv('RAG_ANSWER_CACHE_SIMILARITY', '')
+# Return ranked chunks to the agent instead of an answer synthesized by a nested completion
+RAG_RETRIEVAL_ONLY = os.getenv('RAG_RETRIEVAL_ONLY', 'false').lower() == 'true'
+RAG_RETRIEVAL_TOKEN_BUDGET = int(os.getenv('RAG_RETRIEVAL_TOKEN_BUDGET', 2000))
+RAG_CACHE_MAX_ENTRIES = int(os.getenv('RAG_CACHE_MAX_ENTRIES', 256))
+# e.g. 'redis://localhost:6379/1' or 'file:///var/cache/gpa-rag-cache', empty for a per-process cache only
+RAG_SHARED_CACHE_URL = os.getenv('RAG_SHARED_CACHE_URL', '')
+# Store for large tool outputs referenced from conversation state, same url format as RAG_SHARED_CACHE_URL
+STATE_BLOB_STORE_URL = os.getenv('STATE_BLOB_STORE_URL', '')
+PREFETCH_ATTACHMENTS = os.getenv('PREFETCH_ATTACHMENTS', 'false').lower() == 'true'
+PREFETCH_RAG_INDEXING = os.getenv('PREFETCH_RAG_INDEXING', 'false').lower() == 'true'
+# Path to JSON list of additional DIAL deployments exposed as tools, see ConfigurableDeploymentTool
+DEPLOYMENT_TOOLS_CONFIG = os.getenv('DEPLOYMENT_TOOLS_CONFIG', '')
+INTERPRETER_WARM_POOL_SIZE = int(os.getenv('INTERPRETER_WARM_POOL_SIZE', 0))
+INTERPRETER_SESSION_IDLE_TIMEOUT = float(os.getenv('INTERPRETER_SESSION_IDLE_TIMEOUT', 1800))
+MCP_RESULT_CACHE_PATH = os.getenv(
+    'MCP_RESULT_CACHE_PATH', os.path.join(Path.home(), '.cache', 'gpa-mcp-results', 'results.sqlite3')
+)
+# Opted-in MCP tools as `name=ttl_seconds:stale_seconds`, comma separated. Empty value disables the cache
+MCP_RESULT_CACHE_TOOLS = os.getenv('MCP_RESULT_CACHE_TOOLS', 'search=3600:86400,fetch_content=86400:604800')
+# Max number of tool schemas sent per completion call (ranked for the conversation), 0 sends all of them
+TOOL_SELECTION_MAX_TOOLS = int(os.getenv('TOOL_SELECTION_MAX_TOOLS', 0))
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv('ADMISSION_MAX_IN_FLIGHT', 32))
+ADMISSION_MAX_QUEUED_PER_TENANT = int(os.getenv('ADMISSION_MAX_QUEUED_PER_TENANT', 8))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv('ADMISSION_RETRY_AFTER_SECONDS', 5))
+# Concurrent slots of expensive stages per worker as `stage=slots`, comma separated
+ADMISSION_STAGE_CONCURRENCY = os.getenv('ADMISSION_STAGE_CONCURRENCY', 'extraction=2,embedding=1,interpreter=4')
+# Fair-share weights as `tenant_id=weight` (tenant id is reported by /admission/metrics), default weight is 1
+ADMISSION_TENANT_WEIGHTS = os.getenv('ADMISSION_TENANT_WEIGHTS', '')
 
 
 class GeneralPurposeAgentApplication(ChatCompletion):
 
     def __init__(self):
         self.tools: list[BaseTool] = []
+        blob_store = create_shared_store(STATE_BLOB_STORE_URL)
+        self.state_codec = StateCodec(BlobStore(blob_store) if blob_store else None)
+        self.prefetcher: FilePrefetcher | None = None
+        self.tool_selector: ToolSelector | None = None
+        self.prompt_prefix: PromptPrefix | None = None
+        self.prompt_cache_stats = PromptCacheStats()
+        self.client_registry = DialClientRegistry()
+        self.mcp_cache_policies = self._parse_cache_policies(MCP_RESULT_CACHE_TOOLS)
+        self.mcp_result_store = MCPResultStore(MCP_RESULT_CACHE_PATH) if self.mcp_cache_policies else None
+        self.admission = AdmissionController(
+            max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+            max_queued_per_tenant=ADMISSION_MAX_QUEUED_PER_TENANT,
+            stage_concurrency={k: int(v) for k, v in self._parse_pairs(ADMISSION_STAGE_CONCURRENCY).items()},
+            tenant_weights={k: float(v) for k, v in self._parse_pairs(ADMISSION_TENANT_WEIGHTS).items()},
+            retry_after_seconds=ADMISSION_RETRY_AFTER_SECONDS,
+        )
+
+    @staticmethod
+    def _parse_pairs(value: str) -> dict[str, str]:
+        return dict(
+            item.partition('=')[::2] for item in filter(None, (part.strip() for part in value.split(',')))
+        )
+
+    @staticmethod
+    def _parse_cache_policies(value: str) -> dict[str, CachePolicy]:
+        policies: dict[str, CachePolicy] = {}
+        for item in filter(None, (part.strip() for part in value.split(','))):
+            name, _, ttls = item.partition('=')
+            ttl, _, stale_ttl = ttls.partition(':')
+            policies[name] = CachePolicy(ttl=float(ttl), stale_ttl=float(stale_ttl or 0))
+        return policies
 
     async def _get_mcp_tools(self, url: str) -> list[BaseTool]:
         tools: list[BaseTool] = []
         mcp_client = await MCPClient.create(url)
         mcp_tools = await mcp_client.get_tools()
         for mcp_tool_model in mcp_tools:
-            tools.append(MCPTool(mcp_client, mcp_tool_model))
+            tools.append(
+                MCPTool(
+                    mcp_client,
+                    mcp_tool_model,
+                    self.mcp_result_store,
+                    self.mcp_cache_policies.get(mcp_tool_model.name),
+                )
+            )
         return tools
 
     async def _create_tools(self) -> list[BaseTool]:
         tools: list[BaseTool] = [
             ImageGenerationTool(DIAL_ENDPOINT),
             FileContentExtractionTool(DIAL_ENDPOINT),
-            RagTool(DIAL_ENDPOINT, DEPLOYMENT_NAME, DocumentCache.create()),
+            RagTool(
+                DIAL_ENDPOINT,
+                DEPLOYMENT_NAME,
+                DocumentCache.create(
+                    max_entries=RAG_CACHE_MAX_ENTRIES,
+                    shared_store=create_shared_store(RAG_SHARED_CACHE_URL),
+                ),
+                embedding_workers=RAG_EMBEDDING_WORKERS,
+                early_answer_batches=RAG_EARLY_ANSWER_BATCHES,
+                storage_mode=RAG_INDEX_STORAGE,
+                exact_rerank=RAG_EXACT_RERANK,
+                embedding_backend=RAG_EMBEDDING_BACKEND,
+                embedding_cache_dir=RAG_EMBEDDING_CACHE_DIR,
+                query_cache_size=RAG_QUERY_CACHE_SIZE,
+                answer_cache_size=RAG_ANSWER_CACHE_SIZE,
+                answer_similarity_threshold=float(RAG_ANSWER_CACHE_SIMILARITY) if RAG_ANSWER_CACHE_SIMILARITY else None,
+                retrieval_only=RAG_RETRIEVAL_ONLY,
+                retrieval_token_budget=RAG_RETRIEVAL_TOKEN_BUDGET,
+            ),
             await PythonCodeInterpreterTool.create(
                 dial_endpoint=DIAL_ENDPOINT,
                 mcp_url='http://localhost:8050/mcp',
-                tool_name='execute_code'
+                tool_name='execute_code',
+                warm_pool_size=INTERPRETER_WARM_POOL_SIZE,
+                session_idle_timeout=INTERPRETER_SESSION_IDLE_TIMEOUT,
             )
         ]
         tools.extend(await self._get_mcp_tools('http://localhost:8051/mcp'))
+        if DEPLOYMENT_TOOLS_CONFIG:
+            tools.extend(ConfigurableDeploymentTool.load_all(
+                DIAL_ENDPOINT, DEPLOYMENT_TOOLS_CONFIG, registered_names=[tool.name for tool in tools]
+            ))
         return tools
 
     async def chat_completion(self, request: Request, response: Response) -> None:
+        async with self.admission.admit(request.api_key):
+            await self._handle(request, response)
+
+    async def _handle(self, request: Request, response: Response) -> None:
         if not self.tools:
             self.tools = await self._create_tools()
+            self.prompt_prefix = PromptPrefix(SYSTEM_PROMPT, self.tools)
+            if TOOL_SELECTION_MAX_TOOLS > 0:
+                self.tool_selector = ToolSelector(
+                    self.tools,
+                    TOOL_SELECTION_MAX_TOOLS,
+                    lambda: load_embedding_model(backend=RAG_EMBEDDING_BACKEND, cache_dir=RAG_EMBEDDING_CACHE_DIR),
+                )
+            if PREFETCH_ATTACHMENTS:
+                rag_tool = next((tool for tool in self.tools if isinstance(tool, RagTool)), None)
+                self.prefetcher = FilePrefetcher(
+                    DIAL_ENDPOINT,
+                    self.client_registry,
+                    rag_tool if PREFETCH_RAG_INDEXING else None
+                )
+
+        if self.prefetcher:
+            self.prefetcher.start(request)
 
         with response.create_single_choice() as choice:
             agent = GeneralPurposeAgent(
                 endpoint=DIAL_ENDPOINT,
                 system_prompt=SYSTEM_PROMPT,
-                tools=self.tools
+                tools=self.tools,
+                state_codec=self.state_codec,
+                client_registry=self.client_registry,
+                tool_selector=self.tool_selector,
+                prompt_prefix=self.prompt_prefix,
+                prompt_cache_stats=self.prompt_cache_stats,
             )
             await agent.handle_request(
                 choice=choice,
@@ -67,6 +206,27 @@ class GeneralPurposeAgentApplication(ChatCompletion):
                 response=response
             )
 
+    def interpreter_metrics(self) -> dict:
+        return {
+            tool.name: tool.sessions.stats() for tool in self.tools if isinstance(tool, PythonCodeInterpreterTool)
+        }
+
+    def rag_metrics(self) -> dict:
+        return {
+            tool.name: tool.cache_stats() for tool in self.tools if isinstance(tool, RagTool)
+        }
+
+    async def close(self) -> None:
+        """Releases pooled connections and embedding workers on app shutdown."""
+        for tool in self.tools:
+            if isinstance(tool, RagTool):
+                tool.indexer.close()
+            elif isinstance(tool, PythonCodeInterpreterTool):
+                await tool.close()
+        await self.client_registry.close()
+        if self.mcp_result_store:
+            self.mcp_result_store.close()
+
 
 app = DIALApp()
 agent_app = GeneralPurposeAgentApplication()
@@ -74,6 +234,12 @@ app.add_chat_completion(
     deployment_name="general-purpose-agent",
     impl=agent_app
 )
+app.add_event_handler("shutdown", agent_app.close)
+app.add_api_route("/admission/metrics", agent_app.admission.metrics, methods=["GET"])
+app.add_api_route("/rag/metrics", agent_app.rag_metrics, methods=["GET"])
+app.add_api_route("/interpreter/metrics", agent_app.interpreter_metrics, methods=["GET"])
+app.add_api_route("/prompt/metrics", agent_app.prompt_cache_stats.stats, methods=["GET"])
 
 if __name__ == "__main__":
+    # Single process; for several workers sharing the embedding model run `python -m task.server`
     uvicorn.run(app, port=5030, host="0.0.0.0")
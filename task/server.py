@@ -0,0 +1,164 @@
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from typing import Optional
+
+import uvicorn
+
+from task.tools.rag.embedding_model import load_embedding_model
+
+HOST = os.getenv('HOST', '0.0.0.0')
+PORT = int(os.getenv('PORT', 5030))
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', os.cpu_count() or 1))
+RAG_EMBEDDING_BACKEND = os.getenv('RAG_EMBEDDING_BACKEND', 'torch')
+RAG_EMBEDDING_CACHE_DIR = os.getenv('RAG_EMBEDDING_CACHE_DIR') or None
+
+# Worker exit codes, uvicorn uses the same code for a failed startup
+_EXIT_ERROR = 1
+_EXIT_STARTUP_FAILURE = 3
+# A worker that exits with an error sooner than this after spawn is a fast failure (e.g. broken import or config)
+_FAST_FAILURE_SECONDS = 30.0
+_MAX_FAST_FAILURES = 5
+_MAX_RESTART_DELAY = 30.0
+
+
+class PreforkServer:
+    """
+    Multi-process server for `task.app:app` that shares the embedding model between workers.
+
+    The parent loads the SentenceTransformer weights, binds the listening socket and forks `workers` children.
+    Every child imports the app after the fork, so per-process state (connection pools, SQLite handles,
+    background threads) is created in the child, while the model weights are inherited copy-on-write.
+    Workers that die unexpectedly are restarted, SIGINT/SIGTERM are forwarded to all workers.
+    A worker that fails soon after spawn is restarted with exponential backoff; after `_MAX_FAST_FAILURES`
+    fast failures in a row the server stops all workers and exits with an error instead of fork-looping.
+
+    Workers share the RAG `DocumentCache` tier through `RAG_SHARED_CACHE_URL` (Redis, or a local
+    `file:///...` store), so a document is indexed once per node, not once per worker. It isn't set by the server:
+    without it every worker keeps its own in-process cache.
+    """
+
+    def __init__(self, host: str, port: int, workers: int):
+        self.host = host
+        self.port = port
+        self.workers = max(1, workers)
+        self._children: dict[int, int] = {}
+        self._spawned_at: dict[int, float] = {}
+        self._fast_failures: dict[int, int] = {}
+        self._stopping = False
+        self._failed = False
+
+    def run(self) -> None:
+        if not os.getenv('RAG_SHARED_CACHE_URL') and self.workers > 1:
+            print("[PreforkServer] RAG_SHARED_CACHE_URL is not set, each worker indexes documents on its own")
+
+        load_embedding_model(backend=RAG_EMBEDDING_BACKEND, cache_dir=RAG_EMBEDDING_CACHE_DIR)
+        # Objects allocated so far are never collected, so GC passes in workers don't touch (and copy) their pages
+        gc.freeze()
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGTERM, self._stop)
+
+        print(f"[PreforkServer] Starting {self.workers} workers on {self.host}:{self.port}")
+        for slot in range(self.workers):
+            self._spawn(slot, sock)
+
+        while self._children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            slot = self._children.pop(pid, None)
+            if slot is None or self._stopping:
+                continue
+
+            exit_code = os.waitstatus_to_exitcode(status)
+            delay = self._restart_delay(slot, exit_code, time.monotonic())
+            if delay is None:
+                print(f"[PreforkServer] Worker {pid} failed {_MAX_FAST_FAILURES} times right after start "
+                      f"(exit code {exit_code}), stopping")
+                self._failed = True
+                self._stop(signal.SIGTERM, None)
+                continue
+            print(f"[PreforkServer] Worker {pid} exited with code {exit_code}, restarting in {delay:.1f}s")
+            time.sleep(delay)
+            if not self._stopping:
+                self._spawn(slot, sock)
+
+        sock.close()
+        if self._failed:
+            sys.exit(_EXIT_ERROR)
+
+    def _restart_delay(self, slot: int, exit_code: int, now: float) -> Optional[float]:
+        """
+        Seconds to wait before restarting the worker of `slot`, None to give up.
+        Only errors shortly after spawn count as fast failures, a clean exit or a long-lived worker resets them.
+        """
+        if exit_code == 0 or now - self._spawned_at.get(slot, now) >= _FAST_FAILURE_SECONDS:
+            self._fast_failures[slot] = 0
+            return 0.0
+        failures = self._fast_failures.get(slot, 0) + 1
+        self._fast_failures[slot] = failures
+        if failures >= _MAX_FAST_FAILURES:
+            return None
+        return min(_MAX_RESTART_DELAY, 0.5 * 2 ** (failures - 1))
+
+    def _spawn(self, slot: int, sock: socket.socket) -> None:
+        self._spawned_at[slot] = time.monotonic()
+        pid = os.fork()
+        if pid:
+            self._children[pid] = slot
+            return
+
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        exit_code = _EXIT_ERROR
+        try:
+            exit_code = self._serve(sock)
+        finally:
+            # Skips atexit handlers and buffers inherited from the parent, so flush our own output first
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+    def _serve(self, sock: socket.socket) -> int:
+        """Runs the app in a worker, returns its exit code; errors are logged with their traceback."""
+        try:
+            import torch
+            torch.set_num_threads(max(1, (os.cpu_count() or 1) // self.workers))
+
+            config = uvicorn.Config("task.app:app", host=self.host, port=self.port)
+            server = uvicorn.Server(config)
+            server.run(sockets=[sock])
+            return 0 if server.started else _EXIT_STARTUP_FAILURE
+        except SystemExit as e:
+            # uvicorn exits this way on startup failures (app not found, lifespan error), after logging them
+            return e.code if isinstance(e.code, int) else _EXIT_ERROR
+        except BaseException:
+            print(f"[PreforkServer] Worker {os.getpid()} failed:", file=sys.stderr)
+            traceback.print_exc()
+            return _EXIT_ERROR
+
+    def _stop(self, signum, frame) -> None:
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+
+if __name__ == "__main__":
+    PreforkServer(HOST, PORT, SERVER_WORKERS).run()
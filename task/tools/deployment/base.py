@@ -1,9 +1,9 @@
+import asyncio
 import json
 from abc import ABC, abstractmethod
 from typing import Any
 
-from aidial_client import AsyncDial
-from aidial_sdk.chat_completion import Message, Role, CustomContent, MessageContentTextPart
+from aidial_sdk.chat_completion import Message, Role, CustomContent, MessageContentTextPart, Stage
 from pydantic import StrictStr
 
 from task.tools.base import BaseTool
@@ -11,9 +11,16 @@ from task.tools.models import ToolCallParams
 
 
 class DeploymentTool(BaseTool, ABC):
+    """
+    Streaming passthrough to a DIAL deployment: content deltas are forwarded into the stage as they arrive.
+    Each attempt is bounded by `timeout` seconds; failed attempts are retried up to `max_retries` times
+    as long as nothing has been streamed to the user yet.
+    """
 
-    def __init__(self, endpoint: str):
+    def __init__(self, endpoint: str, timeout: float | None = None, max_retries: int = 0):
         self.endpoint = endpoint
+        self.timeout = timeout
+        self.max_retries = max_retries
 
     @property
     @abstractmethod
@@ -32,38 +39,9 @@ class DeploymentTool(BaseTool, ABC):
         arguments = json.loads(tool_call_params.tool_call.function.arguments)
         prompt = arguments.pop("prompt")
 
-        dial = AsyncDial(
-            base_url=self.endpoint,
-            api_key=tool_call_params.api_key
+        content, attachments = await self._call_deployment(
+            tool_call_params, prompt, arguments, stage=tool_call_params.stage
         )
-
-        messages = []
-        if self.system_prompt:
-            messages.append({"role": "system", "content": self.system_prompt})
-        messages.append({"role": "user", "content": prompt})
-
-        content = ""
-        attachments = []
-        try:
-            async for chunk in await dial.chat.completions.create(
-                    deployment_name=self.deployment_name,
-                    messages=messages,
-                    stream=True,
-                    extra_body={
-                        "custom_fields": {
-                            "configuration": {**arguments}
-                        }
-                    },
-                    **self.tool_parameters,
-            ):
-                if chunk.choices and chunk.choices[0].delta.content:
-                    content += chunk.choices[0].delta.content
-                if chunk.choices and chunk.choices[0].delta.custom_content and chunk.choices[
-                    0].delta.custom_content.attachments:
-                    attachments.extend(chunk.choices[0].delta.custom_content.attachments)
-        except Exception as e:
-            print(StrictStr(f"Error: {e}"))
-
         custom_content = CustomContent(attachments=attachments) if attachments else None
 
         return Message(
@@ -72,3 +50,60 @@ class DeploymentTool(BaseTool, ABC):
             custom_content=custom_content,
             tool_call_id=StrictStr(tool_call_params.tool_call.id)
         )
+
+    async def _call_deployment(self, tool_call_params: ToolCallParams, prompt: str,
+                               configuration: dict[str, Any], stage: Stage | None = None) -> tuple[str, list[Any]]:
+        """
+        Runs a single completion against the deployment, returns its content and attachments.
+        If `stage` is given, content deltas are streamed into it.
+        """
+        messages = []
+        if self.system_prompt:
+            messages.append({"role": "system", "content": self.system_prompt})
+        messages.append({"role": "user", "content": prompt})
+
+        attempt = 0
+        while True:
+            content_parts: list[str] = []
+            attachments: list[Any] = []
+            try:
+                await asyncio.wait_for(
+                    self._stream(tool_call_params, messages, configuration, stage, content_parts, attachments),
+                    timeout=self.timeout
+                )
+                return "".join(content_parts), attachments
+            except Exception as e:
+                # Streamed content can't be taken back, so only retry clean failures
+                if attempt >= self.max_retries or content_parts:
+                    if isinstance(e, asyncio.TimeoutError):
+                        message = f"Deployment '{self.deployment_name}' timed out after {self.timeout}s"
+                        raise TimeoutError(message) from e
+                    raise
+                attempt += 1
+                print(f"[{self.deployment_name}] Attempt {attempt} failed, retrying: {e}")
+                await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+
+    async def _stream(self, tool_call_params: ToolCallParams, messages: list[dict[str, Any]],
+                      configuration: dict[str, Any], stage: Stage | None,
+                      content_parts: list[str], attachments: list[Any]) -> None:
+        dial = tool_call_params.client_registry.get(self.endpoint, tool_call_params.api_key)
+        async for chunk in await dial.chat.completions.create(
+                deployment_name=self.deployment_name,
+                messages=messages,
+                stream=True,
+                extra_body={
+                    "custom_fields": {
+                        "configuration": {**configuration}
+                    }
+                },
+                **self.tool_parameters,
+        ):
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                content_parts.append(delta.content)
+                if stage:
+                    stage.append_content(delta.content)
+            if delta.custom_content and delta.custom_content.attachments:
+                attachments.extend(delta.custom_content.attachments)
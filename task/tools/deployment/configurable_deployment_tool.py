@@ -0,0 +1,87 @@
+import json
+from pathlib import Path
+from typing import Any, Iterable
+
+from task.tools.deployment.base import DeploymentTool
+
+_DEFAULT_PARAMETERS = {
+    "type": "object",
+    "properties": {
+        "prompt": {
+            "type": "string",
+            "description": "The input that should be sent to the model.",
+        },
+    },
+    "required": ["prompt"],
+}
+
+
+class ConfigurableDeploymentTool(DeploymentTool):
+    """
+    Exposes any DIAL deployment (summarizer, translator, ...) as a tool described purely by configuration:
+
+        {
+            "name": "translate_text",
+            "deployment_name": "gpt-4o-mini",
+            "description": "Translates text to the requested language.",
+            "system_prompt": "You are a professional translator...",
+            "parameters": {...},           # optional JSON schema, must have a `prompt` property
+            "tool_parameters": {...},      # optional extra completion parameters, e.g. temperature
+            "timeout": 60,                 # optional, seconds per attempt
+            "max_retries": 1               # optional
+        }
+    """
+
+    def __init__(self, endpoint: str, config: dict[str, Any]):
+        super().__init__(endpoint, config.get("timeout"), config.get("max_retries", 0))
+        self._name = config["name"]
+        self._deployment_name = config["deployment_name"]
+        self._description = config["description"]
+        self._system_prompt = config.get("system_prompt")
+        self._parameters = config.get("parameters") or _DEFAULT_PARAMETERS
+        self._tool_parameters = config.get("tool_parameters") or {}
+        if "prompt" not in (self._parameters.get("properties") or {}):
+            raise ValueError(f"Deployment tool '{self._name}': `parameters` must have a `prompt` property")
+
+    @classmethod
+    def load_all(cls, endpoint: str, config_path: str,
+                 registered_names: Iterable[str] = ()) -> list['ConfigurableDeploymentTool']:
+        """
+        Creates tools from a JSON file with a list of tool configurations.
+
+        :param registered_names: names of the tools already registered, configured names must not repeat them
+        """
+        configs = json.loads(Path(config_path).read_text(encoding='utf-8'))
+        names = set(registered_names)
+        tools = []
+        for config in configs:
+            tool = cls(endpoint, config)
+            if tool.name in names:
+                raise ValueError(f"Deployment tool '{tool.name}' clashes with another tool of the same name")
+            names.add(tool.name)
+            tools.append(tool)
+        return tools
+
+    @property
+    def deployment_name(self) -> str:
+        return self._deployment_name
+
+    @property
+    def tool_parameters(self) -> dict[str, Any]:
+        return self._tool_parameters
+
+    @property
+    def system_prompt(self) -> str | None:
+        return self._system_prompt
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def description(self) -> str:
+        return self._description
+
+    @property
+    def parameters(self) -> dict[str, Any]:
+        return self._parameters
@@ -1,27 +1,85 @@
+import asyncio
+import json
+import weakref
 from typing import Any
 
-from aidial_sdk.chat_completion import Message
+from aidial_sdk.chat_completion import Message, Role, CustomContent, MessageContentTextPart
 from pydantic import StrictStr
 
 from task.tools.deployment.base import DeploymentTool
 from task.tools.models import ToolCallParams
 
+_MAX_IMAGES = 4
+
 
 class ImageGenerationTool(DeploymentTool):
+    """
+    Generates one or several images per call. Multiple prompts (or `n` variations of one prompt) are sent
+    to the deployment concurrently, limited per user by `max_concurrency_per_user`, and every image is shown
+    to the user as soon as it is ready.
+    """
+
+    def __init__(self, endpoint: str, max_concurrency_per_user: int = 2,
+                 timeout: float | None = 120.0, max_retries: int = 1):
+        super().__init__(endpoint, timeout, max_retries)
+        self.max_concurrency_per_user = max_concurrency_per_user
+        self._user_semaphores: weakref.WeakValueDictionary[str, asyncio.Semaphore] = weakref.WeakValueDictionary()
 
     async def _execute(self, tool_call_params: ToolCallParams) -> str | Message:
-        msg = await super()._execute(tool_call_params)
+        arguments = json.loads(tool_call_params.tool_call.function.arguments)
+        prompt = arguments.pop("prompt", None)
+        prompts = arguments.pop("prompts", None) or []
+        n = arguments.pop("n", 1)
+        if not prompts:
+            if not prompt:
+                raise ValueError("Either 'prompt' or 'prompts' must be provided")
+            prompts = [prompt] * max(1, min(int(n), _MAX_IMAGES))
+        prompts = prompts[:_MAX_IMAGES]
+
+        semaphore = self._user_semaphores.get(tool_call_params.api_key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency_per_user)
+            self._user_semaphores[tool_call_params.api_key] = semaphore
+
+        # Deltas of concurrent generations would interleave, so only a single one is streamed into the stage
+        stage = tool_call_params.stage if len(prompts) == 1 else None
 
-        if msg.custom_content and msg.custom_content.attachments:
-            for attachment in msg.custom_content.attachments:
+        async def _generate(i: int, image_prompt: str) -> tuple[int, str, list[Any]]:
+            async with semaphore:
+                try:
+                    content, attachments = await self._call_deployment(
+                        tool_call_params, image_prompt, arguments, stage=stage
+                    )
+                except Exception as e:
+                    content, attachments = f"Error: {e}", []
+                return i, content, attachments
+
+        results: dict[int, tuple[str, list[Any]]] = {}
+        for next_result in asyncio.as_completed([_generate(i, p) for i, p in enumerate(prompts)]):
+            i, content, attachments = await next_result
+            results[i] = (content, attachments)
+            for attachment in attachments:
                 if attachment.type in ("image/png", "image/jpeg"):
                     tool_call_params.choice.append_content(f"\n\r![image]({attachment.url})\n\r")
 
-            if not msg.content:
-                msg.content = StrictStr(
-                    'The image has been successfully generated according to request and shown to user!')
+        all_attachments = []
+        summary = []
+        for i in range(len(prompts)):
+            content, attachments = results[i]
+            all_attachments.extend(attachments)
+            images = sum(1 for attachment in attachments if attachment.type in ("image/png", "image/jpeg"))
+            if images:
+                status = content or "The image has been successfully generated according to request and shown to user!"
+            else:
+                status = f"Image was not generated. {content}".strip()
+            summary.append(f"Image #{i + 1}: {status}" if len(prompts) > 1 else status)
 
-        return msg
+        return Message(
+            role=Role.TOOL,
+            content=[MessageContentTextPart(type='text', text=StrictStr("\n".join(summary)))],
+            custom_content=CustomContent(attachments=all_attachments) if all_attachments else None,
+            tool_call_id=StrictStr(tool_call_params.tool_call.id)
+        )
 
     @property
     def deployment_name(self) -> str:
@@ -33,7 +91,11 @@ class ImageGenerationTool(DeploymentTool):
 
     @property
     def description(self) -> str:
-        return "Generates an image based on a textual description. Use this tool when the user asks to create, draw, or generate an image."
+        return (
+            "Generates images based on a textual description. Use this tool when the user asks to create, draw, "
+            "or generate an image. To get several images in one call, pass `n` for variations of one prompt or "
+            f"`prompts` for different images (up to {_MAX_IMAGES}); they are generated in parallel."
+        )
 
     @property
     def parameters(self) -> dict[str, Any]:
@@ -44,6 +106,20 @@ class ImageGenerationTool(DeploymentTool):
                     "type": "string",
                     "description": "Extensive description of the image that should be generated.",
                 },
+                "prompts": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "maxItems": _MAX_IMAGES,
+                    "description": "Extensive descriptions of several different images to generate at once. "
+                                   "Use instead of `prompt` when the user asks for multiple distinct images.",
+                },
+                "n": {
+                    "type": "integer",
+                    "minimum": 1,
+                    "maximum": _MAX_IMAGES,
+                    "default": 1,
+                    "description": "Number of variations of `prompt` to generate.",
+                },
                 "quality": {
                     "type": "string",
                     "enum": ["standard", "hd"],
@@ -60,5 +136,5 @@ class ImageGenerationTool(DeploymentTool):
                     "description": "The size of the generated images.",
                 },
             },
-            "required": ["prompt"],
+            "required": [],
         }
@@ -70,8 +70,12 @@ class FileContentExtractionTool(BaseTool):
             stage.append_content(f"```text\n\r{content}\n\r```\n\r")
             return content
 
-        extractor = DialFileContentExtractor(self.endpoint, tool_call_params.api_key)
-        content = extractor.extract_text(file_url)
+        extractor = DialFileContentExtractor(
+            self.endpoint,
+            tool_call_params.api_key,
+            tool_call_params.client_registry.http_client(self.endpoint)
+        )
+        content = await extractor.extract_text_async(file_url)
 
         if not content:
             content = "Error: File content not found."
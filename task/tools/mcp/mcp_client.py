@@ -9,6 +9,11 @@ from pydantic import AnyUrl
 from task.tools.mcp.mcp_tool_model import MCPToolModel
 
 
+class MCPToolError(Exception):
+    """The MCP server reported a failed tool call (`isError`), the message is the error text it returned."""
+    pass
+
+
 class MCPClient:
     """Handles MCP server connection and tool execution"""
 
@@ -52,9 +57,16 @@ class MCPClient:
         ]
 
     async def call_tool(self, tool_name: str, tool_args: dict[str, Any]) -> Any:
-        """Call a tool on the MCP server"""
+        """
+        Call a tool on the MCP server
+
+        :raises MCPToolError: if the server reports the call as failed
+        """
         result: CallToolResult = await self.session.call_tool(tool_name, tool_args)
         content = result.content
+        if result.isError:
+            message = " ".join(part.text for part in content or () if isinstance(part, TextContent))
+            raise MCPToolError(message or f"Tool '{tool_name}' failed")
         if not content:
             return None
 
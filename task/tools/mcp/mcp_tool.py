@@ -1,26 +1,77 @@
+import asyncio
 import json
-from typing import Any
+from typing import Any, Optional
 
 from aidial_sdk.chat_completion import Message
 
 from task.tools.base import BaseTool
 from task.tools.mcp.mcp_client import MCPClient
 from task.tools.mcp.mcp_tool_model import MCPToolModel
+from task.tools.mcp.result_store import CachePolicy, MCPResultStore
 from task.tools.models import ToolCallParams
+from task.utils.single_flight import SingleFlight
+
+# Replies the DuckDuckGo MCP server returns as regular (non-error) results when a search or fetch fails
+# or finds nothing; they are passed to the model but never cached
+_UNCACHEABLE_PREFIXES = ("Error:", "An error occurred", "No results were found")
 
 
 class MCPTool(BaseTool):
+    """
+    Wraps a tool of an MCP server. With a `result_store` and `cache_policy` (opt-in per tool) text results are
+    cached by canonical arguments: fresh hits skip the server, stale hits are served while being refreshed
+    in the background (stale-while-revalidate). Failed calls and empty or error replies are never cached.
+    """
 
-    def __init__(self, client: MCPClient, mcp_tool_model: MCPToolModel):
+    def __init__(
+            self,
+            client: MCPClient,
+            mcp_tool_model: MCPToolModel,
+            result_store: Optional[MCPResultStore] = None,
+            cache_policy: Optional[CachePolicy] = None,
+    ):
         self.client = client
         self.mcp_tool_model = mcp_tool_model
+        self.result_store = result_store if cache_policy else None
+        self.cache_policy = cache_policy
+        self._calls: SingleFlight[Any] = SingleFlight()
+        self._refreshes: set[asyncio.Task] = set()
 
     async def _execute(self, tool_call_params: ToolCallParams) -> str | Message:
         args = json.loads(tool_call_params.tool_call.function.arguments)
-        content = await self.client.call_tool(self.name, args)
+
+        if self.result_store:
+            content = await self._execute_cached(args)
+        else:
+            content = await self.client.call_tool(self.name, args)
+
         tool_call_params.stage.append_content(content)
         return content
 
+    async def _execute_cached(self, args: dict[str, Any]) -> Any:
+        key = MCPResultStore.make_key(self.name, args)
+        cached = await asyncio.to_thread(self.result_store.get, key)
+        if cached:
+            value, is_fresh = cached
+            if not is_fresh and not self._calls.in_flight(key):
+                task = asyncio.create_task(self._refresh(key, args))
+                self._refreshes.add(task)
+                task.add_done_callback(self._refreshes.discard)
+            return value
+        return await self._calls.do(key, lambda: self._call_and_store(key, args))
+
+    async def _call_and_store(self, key: str, args: dict[str, Any]) -> Any:
+        content = await self.client.call_tool(self.name, args)
+        if isinstance(content, str) and content.strip() and not content.lstrip().startswith(_UNCACHEABLE_PREFIXES):
+            await asyncio.to_thread(self.result_store.set, key, content, self.cache_policy)
+        return content
+
+    async def _refresh(self, key: str, args: dict[str, Any]) -> None:
+        try:
+            await self._calls.do(key, lambda: self._call_and_store(key, args))
+        except Exception as e:
+            print(f"[MCPTool] Unable to refresh cached result of '{self.name}': {e}")
+
     @property
     def name(self) -> str:
         return self.mcp_tool_model.name
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+
+@dataclass
+class CachePolicy:
+    """
+    :param ttl: seconds a result is fresh
+    :param stale_ttl: seconds after expiry a stale result may still be served while it is being refreshed
+    """
+    ttl: float
+    stale_ttl: float = 0.0
+
+
+class MCPResultStore:
+    """
+    Persistent, size-bounded store of MCP tool results keyed by tool name and canonical (sorted) arguments.
+
+    A small in-memory LRU sits in front of a SQLite file. Values above `compress_threshold` bytes
+    (e.g. fetched page bodies) are stored zlib-compressed. The least recently used rows are evicted
+    once the stored size exceeds `max_bytes`. Access times of hits are kept in memory and written in batches
+    (with the next `set`, or once `access_flush_size` are pending), so a hit does not write to the database.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            max_bytes: int = 256 * 1024 * 1024,
+            memory_entries: int = 256,
+            compress_threshold: int = 1024,
+            access_flush_size: int = 256,
+    ):
+        self.max_bytes = max_bytes
+        self.compress_threshold = compress_threshold
+        self.access_flush_size = access_flush_size
+        self._accessed: dict[str, float] = {}
+        self._memory: OrderedDict[str, tuple[str, float, float]] = OrderedDict()
+        self._memory_entries = memory_entries
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, tool TEXT, value BLOB, compressed INTEGER, "
+            "expires_at REAL, stale_until REAL, accessed_at REAL, size INTEGER)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(tool_name: str, arguments: dict[str, Any]) -> str:
+        canonical = json.dumps(arguments, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return f"{tool_name}:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+    def get(self, key: str) -> Optional[tuple[str, bool]]:
+        """Returns `(value, is_fresh)`, or None if missing or past its stale window."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                row = self._db.execute(
+                    "SELECT value, compressed, expires_at, stale_until FROM results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                value, compressed, expires_at, stale_until = row
+                if compressed:
+                    value = zlib.decompress(value)
+                entry = (value.decode('utf-8'), expires_at, stale_until)
+                self._remember(key, entry)
+            else:
+                self._memory.move_to_end(key)
+
+            value, expires_at, stale_until = entry
+            if now >= stale_until:
+                self._delete(key)
+                return None
+            self._accessed[key] = now
+            if len(self._accessed) >= self.access_flush_size:
+                self._flush_accessed()
+                self._db.commit()
+            return value, now < expires_at
+
+    def set(self, key: str, value: str, policy: CachePolicy) -> None:
+        now = time.time()
+        expires_at = now + policy.ttl
+        stale_until = expires_at + policy.stale_ttl
+        data = value.encode('utf-8')
+        compressed = len(data) > self.compress_threshold
+        if compressed:
+            data = zlib.compress(data, 6)
+
+        with self._lock:
+            self._remember(key, (value, expires_at, stale_until))
+            self._accessed.pop(key, None)
+            self._flush_accessed()
+            self._db.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, key.split(":", 1)[0], data, int(compressed), expires_at, stale_until, now, len(data))
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def _remember(self, key: str, entry: tuple[str, float, float]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_entries:
+            self._memory.popitem(last=False)
+
+    def _flush_accessed(self) -> None:
+        if self._accessed:
+            self._db.executemany(
+                "UPDATE results SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._accessed.items()]
+            )
+            self._accessed.clear()
+
+    def _delete(self, key: str) -> None:
+        self._memory.pop(key, None)
+        self._accessed.pop(key, None)
+        self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+        self._db.commit()
+
+    def _evict(self, now: float) -> None:
+        self._db.execute("DELETE FROM results WHERE stale_until <= ?", (now,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM results ORDER BY accessed_at").fetchall():
+            self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_accessed()
+            self._db.commit()
+            self._db.close()
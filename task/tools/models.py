@@ -2,6 +2,8 @@ from dataclasses import dataclass
 from aidial_sdk.chat_completion import Stage, Choice
 from aidial_client.types.chat.legacy.chat_completion import ToolCall
 
+from task.utils.dial_client_registry import DialClientRegistry
+
 
 @dataclass
 class ToolCallParams:
@@ -11,3 +13,4 @@ class ToolCallParams:
     api_key: str
     api_version: str
     conversation_id: str
+    client_registry: DialClientRegistry
@@ -1,16 +1,82 @@
 import base64
+import copy
 import json
+import re
+import time
+from pathlib import PurePosixPath
 from typing import Any, Optional
+from urllib.parse import unquote, urlparse
 
-from aidial_client import Dial
-from aidial_sdk.chat_completion import Message, Attachment
 from aidial_sdk.chat_completion import Message, Attachment
 
 from task.tools.base import BaseTool
 from task.tools.py_interpreter._response import _ExecutionResult
-from task.tools.mcp.mcp_client import MCPClient
+from task.tools.mcp.mcp_client import MCPClient, MCPToolError
 from task.tools.mcp.mcp_tool_model import MCPToolModel
 from task.tools.models import ToolCallParams
+from task.tools.py_interpreter.session_manager import InterpreterSessionManager, WARM_UP_CODE
+from task.utils.admission import stage_slot
+from task.utils.dial_file_downloader import DialFileDownloader
+
+
+_MAX_TRACEBACK_LINES = 20
+_ATTACHMENTS_DIR = "attachments"
+_STAGE_CHUNK_BYTES = 512 * 1024
+_UNKNOWN_SESSION = re.compile(
+    r"session\b.*\b(not found|unknown|does not exist|expired|no longer)|\b(unknown|invalid) session", re.IGNORECASE
+)
+
+
+class _SessionLost(Exception):
+    """The interpreter server does not know the session the files were being copied into."""
+
+
+def _head_and_tail(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    head = max_chars * 3 // 5
+    tail = max_chars - head
+    return f"{text[:head]}\n... [{len(text) - max_chars} chars truncated] ...\n{text[-tail:]}"
+
+
+def _write_file_code(path: str, data: bytes, append: bool) -> str:
+    return (
+        "import base64, os\n"
+        f"os.makedirs({_ATTACHMENTS_DIR!r}, exist_ok=True)\n"
+        f"with open({path!r}, {'ab' if append else 'wb'!r}) as _f:\n"
+        f"    _f.write(base64.b64decode({base64.b64encode(data).decode('ascii')!r}))\n"
+        "del _f"
+    )
+
+
+def _local_path(file_url: str, taken: set[str]) -> str:
+    """`attachments/<file name>`, with a numeric suffix if a different file of that name is already in the session."""
+    name = PurePosixPath(unquote(urlparse(file_url).path)).name or "file"
+    path = f"{_ATTACHMENTS_DIR}/{name}"
+    n = 2
+    while path in taken:
+        path = f"{_ATTACHMENTS_DIR}/{PurePosixPath(name).stem}_{n}{PurePosixPath(name).suffix}"
+        n += 1
+    return path
+
+
+def _is_unknown_session(error: Optional[str]) -> bool:
+    return bool(error and _UNKNOWN_SESSION.search(error))
+
+
+def _lost_session(execution_result: _ExecutionResult) -> bool:
+    """Failure reported by the server itself (no Python traceback) about an unknown session."""
+    return (
+            not execution_result.success
+            and not execution_result.traceback
+            and _is_unknown_session(execution_result.error)
+    )
+
+
+def _spill_note(text: str, url: str | None) -> str:
+    if url:
+        return f"\n[Full output ({len(text)} chars) is saved to file: {url}]"
+    return f"\n[Full output ({len(text)} chars) was truncated]"
 
 
 class PythonCodeInterpreterTool(BaseTool):
@@ -18,6 +84,11 @@ class PythonCodeInterpreterTool(BaseTool):
     Uses https://github.com/khshanovskyi/mcp-python-code-interpreter PyInterpreter MCP Server.
 
     ⚠️ Pay attention that this tool will wrap all the work with PyInterpreter MCP Server.
+
+    Sessions are tracked per conversation by `InterpreterSessionManager`: calls without `session_id` continue
+    in the conversation's kernel, or get a pre-warmed one from the pool. Idle bindings expire, kernels themselves
+    are reclaimed by the server. When the server reports that it lost a session, the binding is dropped and
+    the code runs once more in a new session.
     """
 
     def __init__(
@@ -26,13 +97,24 @@ class PythonCodeInterpreterTool(BaseTool):
             mcp_tool_models: list[MCPToolModel],
             tool_name: str,
             dial_endpoint: str,
+            warm_pool_size: int = 0,
+            session_idle_timeout: float = 1800.0,
+            output_budget: int = 16000,
+            spill_threshold: int = 8000,
     ):
         """
         :param tool_name: it must be actual name of tool that executes code. It is 'execute_code'.
             https://github.com/khshanovskyi/mcp-python-code-interpreter/blob/main/interpreter/server.py#L303
+        :param warm_pool_size: number of kernels with common imports kept ready for new conversations
+        :param session_idle_timeout: seconds after which an unused conversation session is forgotten
+        :param output_budget: max size in bytes of the execution result sent to the LLM
+        :param spill_threshold: stdout/result larger than this (bytes) is uploaded to DIAL storage as a file
         """
         self.dial_endpoint = dial_endpoint
+        self.output_budget = output_budget
+        self.spill_threshold = spill_threshold
         self.mcp_client = mcp_client
+        self.sessions = InterpreterSessionManager(self._start_warm_session, warm_pool_size, session_idle_timeout)
         self._code_execute_tool: Optional[MCPToolModel] = None
         for tool_model in mcp_tool_models:
             if tool_model.name == tool_name:
@@ -48,11 +130,26 @@ class PythonCodeInterpreterTool(BaseTool):
             mcp_url: str,
             tool_name: str,
             dial_endpoint: str,
+            warm_pool_size: int = 0,
+            session_idle_timeout: float = 1800.0,
     ) -> 'PythonCodeInterpreterTool':
         """Async factory method to create PythonCodeInterpreterTool"""
         mcp_client = await MCPClient.create(mcp_url)
         tools = await mcp_client.get_tools()
-        return cls(mcp_client, tools, tool_name, dial_endpoint)
+        tool = cls(mcp_client, tools, tool_name, dial_endpoint, warm_pool_size, session_idle_timeout)
+        tool.sessions.refill()
+        return tool
+
+    async def _start_warm_session(self) -> str:
+        response_str = await self.mcp_client.call_tool(self.name, {"code": WARM_UP_CODE})
+        execution_result = _ExecutionResult.model_validate(json.loads(response_str))
+        if not execution_result.session_info:
+            raise ValueError(f"No session info in warm up response: {execution_result.error}")
+        return execution_result.session_info.session_id
+
+    async def close(self) -> None:
+        """Stops background session work (sweep, warm-ups)."""
+        await self.sessions.close()
 
     @property
     def show_in_stage(self) -> bool:
@@ -70,33 +167,65 @@ class PythonCodeInterpreterTool(BaseTool):
     def parameters(self) -> dict[str, Any]:
         params = self._code_execute_tool.parameters
         if not params or "properties" not in params:
-            return {"type": "object", "properties": {}}
+            params = {"type": "object", "properties": {}}
+        params = copy.deepcopy(params)
+        params["properties"]["attachment_urls"] = {
+            "type": "array",
+            "items": {"type": "string"},
+            "description": (
+                "URLs of attached files the code needs. They are copied into the session before the code runs "
+                f"and are available as local files `{_ATTACHMENTS_DIR}/<file name>` (files with the same name get "
+                "a numeric suffix, reported in the output). Prefer this over reading file content with other tools "
+                "and pasting it into the code."
+            ),
+        }
         return params
 
     async def _execute(self, tool_call_params: ToolCallParams) -> str | Message:
         args = json.loads(tool_call_params.tool_call.function.arguments)
         code = args["code"]
+        attachment_urls = args.pop("attachment_urls", None) or []
         session_id = args.get("session_id")
         stage = tool_call_params.stage
+        conversation_id = tool_call_params.conversation_id
+
+        from_pool = False
+        if not session_id:
+            session_id, from_pool = self.sessions.acquire(conversation_id)
+            if session_id:
+                args["session_id"] = session_id
 
         stage.append_content("## Request arguments: \n")
         stage.append_content(f"```python\n{code}\n```\n")
         if session_id:
-            stage.append_content(f"**session_id**: {session_id}\n\r")
+            stage.append_content(f"**session_id**: {session_id}{' (pre-warmed)' if from_pool else ''}\n\r")
         else:
             stage.append_content("New session will be created\n\r")
 
-        response_str = await self.mcp_client.call_tool(self.name, args)
-        response_data = json.loads(response_str)
-        execution_result = _ExecutionResult.model_validate(response_data)
+        async with stage_slot("interpreter"):
+            execution_result, elapsed = await self._stage_and_run(tool_call_params, args, attachment_urls)
+            if args.get("session_id") and _lost_session(execution_result):
+                # The server lost the session (restart, its own expiry): copy the files again into a new one
+                lost_session_id = args.pop("session_id")
+                self.sessions.release(conversation_id)
+                stage.append_content(f"*Session {lost_session_id} is gone, running in a new session*\n\r")
+                execution_result, elapsed = await self._stage_and_run(tool_call_params, args, attachment_urls)
+            cold_start = not args.get("session_id")
+
+        if execution_result.session_info:
+            self.sessions.bind(conversation_id, execution_result.session_info.session_id)
+        if cold_start:
+            # Cold start: kernel startup + execution
+            self.sessions.record_startup(elapsed)
+            stage.append_content(f"*Kernel cold start and execution took {elapsed:.2f}s*\n\r")
 
         if execution_result.files:
-            dial = Dial(self.dial_endpoint, tool_call_params.api_key)
-            files_home = await dial.get_files_home()
+            dial = tool_call_params.client_registry.get(self.dial_endpoint, tool_call_params.api_key)
+            files_home = await dial.my_files_home()
             for file in execution_result.files:
                 file_name = file.name
                 mime_type = file.mime_type
-                resource_content = await self.mcp_client.get_resource(file.url)
+                resource_content = await self.mcp_client.get_resource(file.uri)
 
                 if mime_type.startswith("text/") or mime_type in ['application/json', 'application/xml']:
                     file_content = resource_content.encode('utf-8')
@@ -104,18 +233,146 @@ class PythonCodeInterpreterTool(BaseTool):
                     file_content = base64.b64decode(resource_content)
 
                 upload_path = files_home / file_name
-                await dial.upload(upload_path.as_posix(), file_content, mime_type)
+                await dial.files.upload(upload_path.as_posix(), (file_name, file_content, mime_type))
 
                 attachment = Attachment(type=mime_type, title=file_name, url=upload_path.as_posix())
                 stage.append_content(f"Generated file: {file_name}")
                 tool_call_params.choice.add_attachment(attachment)
 
-        if execution_result.output:
-            for i, out in enumerate(execution_result.output):
-                if len(out) > 1000:
-                    execution_result.output[i] = out[:1000] + "..."
+        await self._apply_output_budget(execution_result, tool_call_params)
+
+        stage.append_content(f"```json\n{execution_result.model_dump_json(indent=2)}\n```\n")
+
+        return execution_result.model_dump_json()
+
+    async def _call_execute(self, args: dict[str, Any]) -> _ExecutionResult:
+        try:
+            response_str = await self.mcp_client.call_tool(self.name, args)
+        except MCPToolError as e:
+            if not _is_unknown_session(str(e)):
+                raise
+            return _ExecutionResult(success=False, error=str(e))
+        return _ExecutionResult.model_validate(json.loads(response_str))
+
+    async def _stage_and_run(self, tool_call_params: ToolCallParams, args: dict[str, Any],
+                             attachment_urls: list[str]) -> tuple[_ExecutionResult, float]:
+        """
+        Copies the attachments into the session (`args['session_id']` is set to it) and runs the code.
+        Returns the execution result and the execution time.
+        """
+        renamed = {}
+        if attachment_urls:
+            try:
+                args["session_id"], paths = await self._stage_attachments(
+                    tool_call_params, attachment_urls, args.get("session_id")
+                )
+            except _SessionLost as e:
+                return _ExecutionResult(success=False, error=str(e)), 0.0
+            self.sessions.bind(tool_call_params.conversation_id, args["session_id"])
+            renamed = {url: path for url, path in paths.items() if path != _local_path(url, set())}
+
+        started = time.perf_counter()
+        execution_result = await self._call_execute(args)
+        elapsed = time.perf_counter() - started
+        if renamed:
+            execution_result.output.insert(0, "Attached files with the same name are available as: " + ", ".join(
+                f"{url} -> {path}" for url, path in renamed.items()
+            ))
+        return execution_result, elapsed
+
+    async def _stage_attachments(self, tool_call_params: ToolCallParams, attachment_urls: list[str],
+                                 session_id: Optional[str]) -> tuple[str, dict[str, str]]:
+        """
+        Streams files from DIAL storage straight into the interpreter session (in chunks, through code execution),
+        so that file content never travels through the LLM. Returns the session id, creating the session if needed,
+        and the local path of every file.
+        """
+        downloader = DialFileDownloader(
+            self.dial_endpoint,
+            tool_call_params.api_key,
+            http_client=tool_call_params.client_registry.http_client(self.dial_endpoint),
+        )
+        paths = {}
+        for url in attachment_urls:
+            local_path = self.sessions.staged_path(session_id, url) if session_id else None
+            if local_path:
+                paths[url] = local_path
+                tool_call_params.stage.append_content(f"**File**: `{local_path}` (already in session)\n\r")
+                continue
+
+            local_path = _local_path(url, self.sessions.staged_paths(session_id) if session_id else set())
+
+            with await downloader.download(url) as file:
+                body = file.open()
+                append = False
+                while True:
+                    data = body.read(_STAGE_CHUNK_BYTES)
+                    if append and not data:
+                        break
+                    session_id = await self._run_code(_write_file_code(local_path, data, append), session_id)
+                    append = True
+
+            self.sessions.mark_staged(session_id, url, local_path)
+            paths[url] = local_path
+            tool_call_params.stage.append_content(f"**File**: `{local_path}` ({file.size} bytes)\n\r")
+        return session_id, paths
+
+    async def _run_code(self, code: str, session_id: Optional[str]) -> str:
+        args = {"code": code}
+        if session_id:
+            args["session_id"] = session_id
+        execution_result = await self._call_execute(args)
+        if _lost_session(execution_result):
+            raise _SessionLost(execution_result.error)
+        if not execution_result.success:
+            raise ValueError(f"Unable to copy file into interpreter session: {execution_result.error}")
+        return execution_result.session_info.session_id if execution_result.session_info else session_id
+
+    async def _apply_output_budget(self, execution_result: _ExecutionResult, tool_call_params: ToolCallParams) -> None:
+        """
+        Keeps what is sent to the LLM within `output_budget` bytes: stdout or result larger than
+        `spill_threshold` bytes is uploaded to DIAL storage as an attachment and replaced by its head, tail and URL;
+        the traceback keeps its last lines; anything still over budget is cut proportionally.
+        """
+        stdout = "\n".join(execution_result.output)
+        if len(stdout.encode('utf-8')) > self.spill_threshold:
+            url = await self._spill(tool_call_params, "stdout", stdout)
+            execution_result.output = [_head_and_tail(stdout, self.spill_threshold) + _spill_note(stdout, url)]
+
+        if execution_result.result and len(execution_result.result.encode('utf-8')) > self.spill_threshold:
+            url = await self._spill(tool_call_params, "result", execution_result.result)
+            execution_result.result = (
+                    _head_and_tail(execution_result.result, self.spill_threshold)
+                    + _spill_note(execution_result.result, url)
+            )
+
+        if len(execution_result.traceback) > _MAX_TRACEBACK_LINES:
+            execution_result.traceback = ["..."] + execution_result.traceback[-_MAX_TRACEBACK_LINES:]
 
-        result_json = execution_result.model_dump_json(indent=2)
-        stage.append_content(f"```json\n{result_json}\n```\n")
+        overflow = len(execution_result.model_dump_json().encode('utf-8')) - self.output_budget
+        if overflow > 0:
+            texts = execution_result.output + ([execution_result.result] if execution_result.result else [])
+            total = sum(len(text) for text in texts) or 1
+            execution_result.output = [
+                _head_and_tail(text, max(200, len(text) - overflow * len(text) // total - 64))
+                for text in execution_result.output
+            ]
+            if execution_result.result:
+                result = execution_result.result
+                execution_result.result = _head_and_tail(
+                    result, max(200, len(result) - overflow * len(result) // total - 64)
+                )
 
-        return result_json
+    async def _spill(self, tool_call_params: ToolCallParams, kind: str, content: str) -> str | None:
+        """Uploads full output to DIAL storage and attaches it to the response, returns its URL."""
+        try:
+            dial = tool_call_params.client_registry.get(self.dial_endpoint, tool_call_params.api_key)
+            files_home = await dial.my_files_home()
+            file_name = f"{tool_call_params.tool_call.id}_{kind}.txt"
+            upload_path = (files_home / "interpreter-output" / file_name).as_posix()
+            await dial.files.upload(upload_path, (file_name, content.encode('utf-8'), "text/plain"))
+            tool_call_params.choice.add_attachment(Attachment(type="text/plain", title=file_name, url=upload_path))
+            return upload_path
+        except Exception as e:
+            print(f"Unable to upload interpreter {kind} to DIAL storage: {e}")
+            return None
@@ -0,0 +1,162 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+WARM_UP_CODE = (
+    "import numpy as np\nimport pandas as pd\nimport matplotlib\nmatplotlib.use('Agg')\nimport matplotlib.pyplot as plt"
+)
+
+
+class InterpreterSessionManager:
+    """
+    Conversation-scoped affinity for interpreter sessions (Jupyter kernels) and a pool of pre-warmed kernels.
+
+    - Every conversation is bound to the session its code last ran in, so follow-up calls reuse
+      the kernel state (variables, imports) even when the model does not pass `session_id`.
+    - Up to `pool_size` kernels with common imports are started ahead of time and handed to new conversations.
+    - Bindings unused for `idle_timeout` seconds expire (checked on every `acquire` and by a background sweep).
+      Only the binding is dropped: the interpreter server exposes no API to close a session, so kernel lifetime
+      is left to the server. A kernel it has reclaimed is detected on the next call and replaced
+      (see `PythonCodeInterpreterTool`), which also covers warm kernels that waited in the pool too long.
+    - Kernel startup times and session counts are reported by `stats`.
+    """
+
+    def __init__(
+            self,
+            start_session: Callable[[], Awaitable[str]],
+            pool_size: int = 0,
+            idle_timeout: float = 1800.0,
+    ):
+        """
+        :param start_session: starts a new warmed-up kernel and returns its session id
+        """
+        self._start_session = start_session
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self._sessions: dict[str, tuple[str, float]] = {}
+        # session id -> {file url: local path}
+        self._staged_files: dict[str, dict[str, str]] = {}
+        self._warm_pool: list[tuple[str, float]] = []
+        self._warming = 0
+        self._startup_times: list[float] = []
+        self._startups = 0
+        self._expired = 0
+        self._tasks: set[asyncio.Task] = set()
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def acquire(self, conversation_id: str) -> tuple[Optional[str], bool]:
+        """
+        Returns `(session_id, from_pool)`: the session bound to the conversation, a warm one from the pool
+        (bound right away), or `(None, False)` when a new kernel has to be started by the call itself.
+        """
+        now = time.monotonic()
+        self._expire(now)
+
+        if conversation_id in self._sessions:
+            session_id, _ = self._sessions[conversation_id]
+            self._sessions[conversation_id] = (session_id, now)
+            return session_id, False
+
+        session_id = None
+        if self._warm_pool:
+            session_id, _ = self._warm_pool.pop(0)
+            self._sessions[conversation_id] = (session_id, now)
+        self.refill()
+        return session_id, session_id is not None
+
+    def bind(self, conversation_id: str, session_id: str) -> None:
+        self._sessions[conversation_id] = (session_id, time.monotonic())
+
+    def release(self, conversation_id: str) -> None:
+        """Drops the binding, e.g. when the server does not know the session anymore."""
+        binding = self._sessions.pop(conversation_id, None)
+        if binding:
+            self._staged_files.pop(binding[0], None)
+
+    def staged_path(self, session_id: str, file_url: str) -> Optional[str]:
+        """Local path the file was copied to in the session, None if it is not there."""
+        return self._staged_files.get(session_id, {}).get(file_url)
+
+    def staged_paths(self, session_id: str) -> set[str]:
+        return set(self._staged_files.get(session_id, {}).values())
+
+    def mark_staged(self, session_id: str, file_url: str, local_path: str) -> None:
+        self._staged_files.setdefault(session_id, {})[file_url] = local_path
+
+    def record_startup(self, seconds: float) -> None:
+        self._startup_times.append(seconds)
+        del self._startup_times[:-100]
+        self._startups += 1
+
+    @property
+    def average_startup_time(self) -> Optional[float]:
+        """Average kernel startup time over the last 100 startups (warm-ups and cold starts)."""
+        if not self._startup_times:
+            return None
+        return sum(self._startup_times) / len(self._startup_times)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "bound_sessions": len(self._sessions),
+            "warm_pool": len(self._warm_pool),
+            "warming": self._warming,
+            "startups": self._startups,
+            "average_startup_seconds": self.average_startup_time,
+            "expired": self._expired,
+        }
+
+    def refill(self) -> None:
+        """Starts warm kernels in the background until the pool is full, and the idle session sweep."""
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep())
+        missing = self.pool_size - len(self._warm_pool) - self._warming
+        for _ in range(max(0, missing)):
+            self._warming += 1
+            self._spawn(self._warm_up())
+
+    async def close(self) -> None:
+        """Stops the sweep and pending warm-ups and forgets all sessions."""
+        if self._sweeper:
+            self._sweeper.cancel()
+            self._sweeper = None
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._sessions.clear()
+        self._warm_pool.clear()
+        self._staged_files.clear()
+
+    def _spawn(self, coroutine: Awaitable[None]) -> None:
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _sweep(self) -> None:
+        while True:
+            await asyncio.sleep(min(60.0, self.idle_timeout / 2))
+            self._expire(time.monotonic())
+
+    async def _warm_up(self) -> None:
+        try:
+            started = time.perf_counter()
+            session_id = await self._start_session()
+            elapsed = time.perf_counter() - started
+            self.record_startup(elapsed)
+            self._warm_pool.append((session_id, time.monotonic()))
+            print(f"[InterpreterSessionManager] Warmed up kernel {session_id} in {elapsed:.2f}s")
+        except Exception as e:
+            print(f"[InterpreterSessionManager] Unable to warm up kernel: {e}")
+        finally:
+            self._warming -= 1
+
+    def _expire(self, now: float) -> None:
+        for conversation_id, (_, last_used) in list(self._sessions.items()):
+            if now - last_used >= self.idle_timeout:
+                del self._sessions[conversation_id]
+                self._expired += 1
+
+        live_sessions = {session_id for session_id, _ in self._sessions.values()}
+        for session_id in list(self._staged_files):
+            if session_id not in live_sessions:
+                del self._staged_files[session_id]
@@ -0,0 +1,128 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+import numpy as np
+
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU of query text -> embedding, bounded by `max_entries`."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        with self._lock:
+            embedding = self._entries.get(query)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(query)
+            self.hits += 1
+            return embedding
+
+    def set(self, query: str, embedding: np.ndarray) -> None:
+        with self._lock:
+            self._entries[query] = embedding
+            self._entries.move_to_end(query)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class AnswerCache:
+    """
+    Cache of synthesized RAG answers, grouped by document version key and the set of retrieved chunk ids.
+
+    Within a group a question hits when its normalized text (case and whitespace folded) equals a cached one.
+    Matching by meaning is opt-in with `similarity_threshold`: a question then also hits when the cosine similarity
+    of its embedding to a cached question is at least the threshold. It is off by default because questions that
+    embed alike can ask different things ("max" vs "min" value, another year).
+    The document key must identify the document itself (e.g. `conversation:url:version`), not only its version
+    validator: the cache is shared by all users, and unrelated files can have the same ETag or Last-Modified.
+    Tracks hit rate and the LLM time saved by hits. Bounded by `max_entries` groups (LRU).
+    """
+
+    def __init__(self, max_entries: int = 512, similarity_threshold: Optional[float] = None,
+                 answers_per_entry: int = 8):
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.answers_per_entry = answers_per_entry
+        self._entries: OrderedDict[tuple[str, frozenset[int]], list[tuple[str, np.ndarray, str, float]]] = \
+            OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.llm_seconds_saved = 0.0
+
+    def get(self, document_key: str, chunk_ids: list[int], query: str,
+            query_embedding: np.ndarray) -> Optional[tuple[str, float]]:
+        """Returns `(answer, similarity)` of the matching cached question (similarity 1.0 for the same text)."""
+        normalized_query = _normalize_query(query)
+        query_embedding = _normalize(query_embedding)
+        with self._lock:
+            key = (document_key, frozenset(chunk_ids))
+            best: Optional[tuple[str, float, float]] = None
+            for cached_query, embedding, answer, llm_seconds in self._entries.get(key, ()):
+                if cached_query == normalized_query:
+                    best = (answer, 1.0, llm_seconds)
+                    break
+                if self.similarity_threshold is None:
+                    continue
+                similarity = float(np.dot(embedding, query_embedding))
+                if similarity >= self.similarity_threshold and (best is None or similarity > best[1]):
+                    best = (answer, similarity, llm_seconds)
+
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.llm_seconds_saved += best[2]
+            return best[0], best[1]
+
+    def set(self, document_key: str, chunk_ids: list[int], query: str, query_embedding: np.ndarray,
+            answer: str, llm_seconds: float) -> None:
+        with self._lock:
+            key = (document_key, frozenset(chunk_ids))
+            answers = self._entries.setdefault(key, [])
+            answers.append((_normalize_query(query), _normalize(query_embedding), answer, llm_seconds))
+            del answers[:-self.answers_per_entry]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "llm_seconds_saved": self.llm_seconds_saved,
+                "similarity_threshold": self.similarity_threshold,
+            }
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.casefold().split())
+
+
+def _normalize(embedding: np.ndarray) -> np.ndarray:
+    embedding = np.asarray(embedding, dtype='float32').reshape(-1)
+    norm = np.linalg.norm(embedding)
+    return embedding / norm if norm else embedding
@@ -0,0 +1,113 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_SUB_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercase tokenizer that keeps compound identifiers (model numbers, error codes like `E-12`, `v1.2`)
+    as a single token and additionally emits their alphanumeric parts.
+    """
+    tokens: list[str] = []
+    for match in _TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group(0)
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(_SUB_TOKEN_PATTERN.findall(token))
+    return tokens
+
+
+class BM25Index:
+    """
+    Sparse Okapi BM25 index over document chunks, kept next to the FAISS index in the DocumentCache.
+    Catches exact identifiers, error codes and model numbers that dense embeddings tend to miss.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        self._doc_lengths: list[int] = []
+        self._total_length = 0
+
+    @classmethod
+    def from_chunks(cls, chunks: list[str]) -> 'BM25Index':
+        index = cls()
+        index.add(chunks)
+        return index
+
+    def to_arrays(self) -> tuple[list[str], dict[str, np.ndarray]]:
+        """
+        Terms and flat postings arrays (for serialization): postings of `terms[i]` are
+        `doc_ids[term_offsets[i]:term_offsets[i + 1]]` with the matching `frequencies`.
+        """
+        terms = list(self._postings)
+        lengths = [len(self._postings[term]) for term in terms]
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=term_offsets[1:])
+        postings = np.array(
+            [posting for term in terms for posting in self._postings[term]], dtype=np.int64
+        ).reshape(-1, 2)
+        return terms, {
+            "term_offsets": term_offsets,
+            "doc_ids": postings[:, 0],
+            "frequencies": postings[:, 1],
+            "doc_lengths": np.array(self._doc_lengths, dtype=np.int64),
+        }
+
+    @classmethod
+    def from_arrays(cls, terms: list[str], arrays: dict[str, np.ndarray], k1: float = 1.5,
+                    b: float = 0.75) -> 'BM25Index':
+        """Restores an index from the output of `to_arrays`."""
+        index = cls(k1, b)
+        term_offsets = arrays["term_offsets"].tolist()
+        doc_ids, frequencies = arrays["doc_ids"].tolist(), arrays["frequencies"].tolist()
+        for i, term in enumerate(terms):
+            start, end = term_offsets[i], term_offsets[i + 1]
+            index._postings[term] = list(zip(doc_ids[start:end], frequencies[start:end]))
+        index._doc_lengths = arrays["doc_lengths"].tolist()
+        index._total_length = sum(index._doc_lengths)
+        return index
+
+    @property
+    def size(self) -> int:
+        return len(self._doc_lengths)
+
+    def add(self, chunks: list[str]) -> None:
+        """Append chunks to the index. Chunk ids continue from the current size."""
+        for chunk in chunks:
+            doc_id = len(self._doc_lengths)
+            term_frequencies = Counter(tokenize(chunk))
+            for term, frequency in term_frequencies.items():
+                self._postings[term].append((doc_id, frequency))
+            length = sum(term_frequencies.values())
+            self._doc_lengths.append(length)
+            self._total_length += length
+
+    def search(self, query: str, k: int) -> list[tuple[int, float]]:
+        """
+        Returns up to `k` `(chunk_id, score)` pairs sorted by descending BM25 score.
+        Chunks without any query term are not returned.
+        """
+        if not self._doc_lengths or k <= 0:
+            return []
+
+        doc_count = len(self._doc_lengths)
+        avg_length = self._total_length / doc_count or 1.0
+        scores: dict[int, float] = defaultdict(float)
+
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings:
+                norm = 1 - self.b + self.b * self._doc_lengths[doc_id] / avg_length
+                scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
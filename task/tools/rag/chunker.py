@@ -0,0 +1,129 @@
+import re
+from typing import Any, Callable, Optional, Sequence
+
+DEFAULT_SEPARATORS = ("\n\n", "\n", ". ", " ", "")
+
+
+class TextChunker:
+    """
+    Splits text into chunks of at most `chunk_size` with `chunk_overlap`, trying separators in order
+    (paragraphs, lines, sentences, words, characters).
+
+    Works on `(start, end)` offsets into the original string: pieces are never copied or re-joined,
+    a chunk is materialized only when `split_text` returns it. Sizes are measured in characters,
+    or with `length_function` (e.g. tokens of the embedding model's tokenizer, see `from_tokenizer`).
+
+    With `compat=True` the chunks are the same as those of langchain's
+    `RecursiveCharacterTextSplitter(chunk_size, chunk_overlap, separators=...)` (separator kept at the start
+    of the following piece, chunks stripped). With `compat=False` a separator stays with the piece it ends,
+    so chunks don't start with the tail of the previous sentence (e.g. '. ').
+    """
+
+    def __init__(
+            self,
+            chunk_size: int = 500,
+            chunk_overlap: int = 50,
+            separators: Sequence[str] = DEFAULT_SEPARATORS,
+            length_function: Optional[Callable[[str], int]] = None,
+            compat: bool = True,
+    ):
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"Chunk overlap ({chunk_overlap}) is larger than chunk size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = tuple(separators)
+        self.length_function = length_function
+        self.compat = compat
+        self._patterns = {separator: re.compile(re.escape(separator)) for separator in self.separators if separator}
+
+    @classmethod
+    def from_tokenizer(cls, tokenizer: Any, **kwargs) -> 'TextChunker':
+        """Chunker sized in tokens of a Hugging Face tokenizer (e.g. `SentenceTransformer.tokenizer`)."""
+        return cls(
+            length_function=lambda text: len(tokenizer.encode(text, add_special_tokens=False)),
+            **kwargs
+        )
+
+    def split_text(self, text: str) -> list[str]:
+        return [text[start:end] for start, end in self.split_offsets(text)]
+
+    def split_offsets(self, text: str, start: int = 0, end: Optional[int] = None) -> list[tuple[int, int]]:
+        """Returns `(start, end)` offsets of chunks of `text[start:end]` into `text`."""
+        chunks: list[tuple[int, int]] = []
+        self._split(text, start, len(text) if end is None else end, 0, chunks)
+        return chunks
+
+    def _split(self, text: str, start: int, end: int, level: int, chunks: list[tuple[int, int]]) -> None:
+        # First separator present in the span; the empty one (single characters) always matches
+        separator = self.separators[-1]
+        next_level = len(self.separators)
+        for i in range(level, len(self.separators)):
+            if not self.separators[i]:
+                separator = ""
+                break
+            if text.find(self.separators[i], start, end) != -1:
+                separator = self.separators[i]
+                next_level = i + 1
+                break
+
+        bounds = self._boundaries(text, start, end, separator)
+        if self.length_function is None:
+            lengths = [piece_end - piece_start for piece_start, piece_end in zip(bounds, bounds[1:])]
+        else:
+            lengths = [self.length_function(text[a:b]) for a, b in zip(bounds, bounds[1:])]
+
+        # Runs of pieces below chunk size are merged, larger pieces are split with the next separators
+        first_pending = None
+        for i, length in enumerate(lengths):
+            if length < self.chunk_size:
+                if first_pending is None:
+                    first_pending = i
+                continue
+            if first_pending is not None:
+                self._merge(text, bounds, lengths, first_pending, i, chunks)
+                first_pending = None
+            if next_level < len(self.separators):
+                self._split(text, bounds[i], bounds[i + 1], next_level, chunks)
+            else:
+                chunks.append((bounds[i], bounds[i + 1]))
+        if first_pending is not None:
+            self._merge(text, bounds, lengths, first_pending, len(lengths), chunks)
+
+    def _boundaries(self, text: str, start: int, end: int, separator: str) -> list[int]:
+        """Offsets cutting the span into non-empty pieces at separator occurrences, including `start` and `end`."""
+        if not separator:
+            return list(range(start, end + 1))
+
+        if end <= start:
+            return [start]
+        shift = 0 if self.compat else len(separator)
+        positions = [match.start() + shift for match in self._patterns[separator].finditer(text, start, end)]
+        if positions and positions[0] == start:
+            del positions[0]
+        if positions and positions[-1] == end:
+            del positions[-1]
+        return [start, *positions, end]
+
+    def _merge(self, text: str, bounds: list[int], lengths: list[int], first: int, stop: int,
+               chunks: list[tuple[int, int]]) -> None:
+        """Greedily merges pieces `first..stop-1` into chunks, keeping up to `chunk_overlap` of the previous chunk."""
+        total = 0
+        for i in range(first, stop):
+            length = lengths[i]
+            if total + length > self.chunk_size and i > first:
+                self._emit(text, bounds[first], bounds[i], chunks)
+                while total > self.chunk_overlap or (total + length > self.chunk_size and total > 0):
+                    total -= lengths[first]
+                    first += 1
+            total += length
+        if first < stop:
+            self._emit(text, bounds[first], bounds[stop], chunks)
+
+    @staticmethod
+    def _emit(text: str, start: int, end: int, chunks: list[tuple[int, int]]) -> None:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if end > start:
+            chunks.append((start, end))
@@ -0,0 +1,150 @@
+import os
+import tempfile
+import weakref
+from typing import Any, Iterator, Optional
+
+import faiss
+import numpy as np
+
+
+class ChunkStore:
+    """
+    Read-only list of chunks packed into one contiguous UTF-8 buffer with an offsets array.
+    Costs roughly the encoded text size instead of a Python `str` object (+ list slot) per chunk.
+    """
+
+    def __init__(self, buffer: bytes, offsets: np.ndarray):
+        self._buffer = buffer
+        self._offsets = offsets
+
+    @classmethod
+    def from_chunks(cls, chunks: list[str]) -> 'ChunkStore':
+        encoded = [chunk.encode('utf-8') for chunk in chunks]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(item) for item in encoded], out=offsets[1:])
+        return cls(b"".join(encoded), offsets)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    @property
+    def buffer(self) -> bytes:
+        return self._buffer
+
+    @property
+    def offsets(self) -> np.ndarray:
+        """Byte offsets of the chunks in `buffer`, chunk `i` is `buffer[offsets[i]:offsets[i + 1]]`."""
+        return self._offsets
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("chunk index out of range")
+        return self._buffer[self._offsets[i]:self._offsets[i + 1]].decode('utf-8')
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._buffer) + self._offsets.nbytes
+
+
+class CompactIndex:
+    """
+    Quantized FAISS index (int8 scalar or product quantization) with optional exact re-ranking.
+    Exact float32 vectors are kept in a memory-mapped file on disk, so only the candidates of a query are paged in.
+    Exposes the same `search(query, k)` contract as a FAISS index.
+    """
+
+    def __init__(self, index: Any, vectors_path: Optional[str] = None, rerank_factor: int = 4):
+        self._index = index
+        self._rerank_factor = rerank_factor
+        self._vectors: Optional[np.memmap] = None
+        if vectors_path:
+            self._vectors = np.memmap(vectors_path, dtype='float32', mode='r',
+                                      shape=(index.ntotal, index.d))
+            weakref.finalize(self, _remove_file, vectors_path)
+
+    @classmethod
+    def from_vectors(cls, index: Any, vectors: Optional[np.ndarray], rerank_factor: int = 4) -> 'CompactIndex':
+        """Wraps a quantized index, writing exact `vectors` (if any) to a temp file for re-ranking."""
+        return cls(index, _write_vectors(vectors) if vectors is not None else None, rerank_factor)
+
+    @property
+    def quantized_index(self) -> Any:
+        return self._index
+
+    @property
+    def rerank_factor(self) -> int:
+        return self._rerank_factor
+
+    @property
+    def ntotal(self) -> int:
+        return self._index.ntotal
+
+    @property
+    def d(self) -> int:
+        return self._index.d
+
+    @property
+    def exact_vectors(self) -> Optional[np.ndarray]:
+        """Exact float32 vectors when re-ranking is enabled, None otherwise."""
+        return self._vectors
+
+    def search(self, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        if self._vectors is None:
+            return self._index.search(query, k)
+
+        candidates = min(self.ntotal, k * self._rerank_factor)
+        _, candidate_ids = self._index.search(query, candidates)
+        all_distances = np.full((len(query), k), np.inf, dtype='float32')
+        all_indices = np.full((len(query), k), -1, dtype='int64')
+        for row, ids in enumerate(candidate_ids):
+            ids = ids[ids >= 0]
+            exact = np.sum((self._vectors[ids] - query[row]) ** 2, axis=1)
+            order = np.argsort(exact)[:k]
+            all_distances[row, :len(order)] = exact[order]
+            all_indices[row, :len(order)] = ids[order]
+        return all_distances, all_indices
+
+
+def compact_index(flat_index: Any, storage_mode: str, rerank: bool = False,
+                  pq_subquantizers: int = 48) -> CompactIndex:
+    """
+    Re-encodes vectors of a flat FAISS index into a quantized one.
+
+    :param storage_mode: 'sq8' for int8 scalar quantization, 'pq' for product quantization.
+        PQ needs enough vectors to train its codebooks, smaller documents fall back to 'sq8'.
+    :param rerank: keep exact vectors on disk and re-rank quantized candidates with them
+    """
+    vectors = flat_index.reconstruct_n(0, flat_index.ntotal)
+    dimension = vectors.shape[1]
+
+    if storage_mode == 'pq' and dimension % pq_subquantizers == 0 and len(vectors) >= 256 * 39:
+        index = faiss.IndexPQ(dimension, pq_subquantizers, 8)
+    elif storage_mode in ('sq8', 'pq'):
+        index = faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit)
+    else:
+        raise ValueError(f"Unsupported storage mode '{storage_mode}'")
+
+    index.train(vectors)
+    index.add(vectors)
+
+    return CompactIndex.from_vectors(index, vectors if rerank else None)
+
+
+def _write_vectors(vectors: np.ndarray) -> str:
+    fd, vectors_path = tempfile.mkstemp(prefix="rag-vectors-", suffix=".f32")
+    with os.fdopen(fd, 'wb') as f:
+        f.write(np.ascontiguousarray(vectors, dtype='float32').tobytes())
+    return vectors_path
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -1,28 +1,51 @@
+import io
+import json
+from collections import OrderedDict
 from datetime import datetime, time, timedelta
-from typing import Any, Tuple
+from time import sleep
+from typing import Any, Optional, Tuple
 import threading
 
+import faiss
+import numpy as np
+
+from task.tools.rag.bm25_index import BM25Index
+from task.tools.rag.compact_store import ChunkStore, CompactIndex
+from task.tools.rag.shared_store import SharedStore
+
+_TTL = timedelta(hours=24)
+_CLAIM_TTL_SECONDS = 600
+_FORMAT_VERSION = 1
+
 
 class DocumentCache:
     """
     Thread-safe document cache with automatic cleanup at midnight.
     Removes entries older than 24 hours.
+
+    The in-process part is an LRU bounded by `max_entries`. When a `SharedStore` is given, entries are also
+    serialized to it, so other workers/replicas load an index instead of re-downloading and re-embedding the file.
+    Entries are stored as a numpy `.npz` archive (FAISS index bytes, packed chunks, BM25 postings and a JSON header)
+    and loaded with `allow_pickle=False`, so a writable store can't be used to run code in the workers.
+    `get_or_claim` coalesces concurrent misses for the same key across the whole cluster.
     """
 
-    def __init__(self):
-        self._cache: dict[str, Tuple[Any, Any, datetime]] = {}
+    def __init__(self, max_entries: Optional[int] = None, shared_store: Optional[SharedStore] = None):
+        self._cache: OrderedDict[str, Tuple[Any, Any, Any, Any, datetime]] = OrderedDict()
+        self._max_entries = max_entries
+        self._shared_store = shared_store
         self._lock = threading.Lock()
         self._cleanup_thread = None
         self._stop_event = threading.Event()
         self._running = False
 
     @classmethod
-    def create(cls) ->'DocumentCache':
-        instance = cls()
+    def create(cls, max_entries: Optional[int] = None, shared_store: Optional[SharedStore] = None) ->'DocumentCache':
+        instance = cls(max_entries, shared_store)
         instance.start_cleanup_task()
         return instance
 
-    def get(self, key: str) -> Tuple[Any, Any] | None:
+    def get(self, key: str) -> Tuple[Any, Any, Any, Any] | None:
         """
         Retrieve a cached entry.
 
@@ -30,28 +53,86 @@ class DocumentCache:
             key: Cache key
 
         Returns:
-            Tuple of (index, chunks) if found and not expired, None otherwise
+            Tuple of (index, chunks, lexical_index, spans) if found and not expired, None otherwise
         """
         with self._lock:
             if key in self._cache:
-                index, chunks, timestamp = self._cache[key]
-                if datetime.now() - timestamp < timedelta(hours=24):
-                    return (index, chunks)
+                index, chunks, lexical_index, spans, timestamp = self._cache[key]
+                if datetime.now() - timestamp < _TTL:
+                    self._cache.move_to_end(key)
+                    return (index, chunks, lexical_index, spans)
                 else:
                     del self._cache[key]
-            return None
 
-    def set(self, key: str, index: Any, chunks: Any) -> None:
+        if self._shared_store:
+            data = self._shared_store.get(key)
+            if data:
+                try:
+                    index, chunks, lexical_index, spans = _deserialize_entry(data)
+                except Exception as e:
+                    print(f"[DocumentCache] Ignoring unreadable shared entry '{key}': {e}")
+                    return None
+                self._set_local(key, index, chunks, lexical_index, spans)
+                return (index, chunks, lexical_index, spans)
+        return None
+
+    def get_or_claim(self, key: str, wait_timeout: float = 300,
+                     poll_interval: float = 0.25) -> Tuple[Any, Any, Any, Any] | None:
         """
-        Store an entry in the cache.
+        Retrieve a cached entry or claim the right to build it.
+
+        While another worker holds the claim for the key, waits (up to `wait_timeout` seconds) for its result.
+
+        Returns:
+            Tuple of (index, chunks, lexical_index, spans) if found, None if the caller has to build the entry.
+            In the latter case the caller must call `set` or `release_claim`.
+        """
+        deadline = datetime.now() + timedelta(seconds=wait_timeout)
+        while True:
+            entry = self.get(key)
+            if entry is not None:
+                return entry
+            if not self._shared_store or self._shared_store.try_lock(key, _CLAIM_TTL_SECONDS):
+                return None
+            if datetime.now() > deadline:
+                print(f"[DocumentCache] Timed out waiting for '{key}' to be indexed by another worker")
+                return None
+            sleep(poll_interval)
+
+    def release_claim(self, key: str) -> None:
+        """Release a claim taken by `get_or_claim` without storing an entry."""
+        if self._shared_store:
+            self._shared_store.unlock(key)
+
+    def set(self, key: str, index: Any, chunks: Any, lexical_index: Any = None, spans: Any = None) -> None:
+        """
+        Store an entry in the cache (and in the shared store, releasing the claim for the key).
 
         Args:
             key: Cache key
             index: FAISS index
             chunks: Document chunks
+            lexical_index: Sparse (BM25) index over the same chunks
+            spans: `(start, end)` offsets of the chunks in the document text, array of shape (n, 2)
         """
+        self._set_local(key, index, chunks, lexical_index, spans)
+        if self._shared_store:
+            try:
+                self._shared_store.set(
+                    key,
+                    _serialize_entry(index, chunks, lexical_index, spans),
+                    int(_TTL.total_seconds())
+                )
+            finally:
+                self._shared_store.unlock(key)
+
+    def _set_local(self, key: str, index: Any, chunks: Any, lexical_index: Any, spans: Any) -> None:
         with self._lock:
-            self._cache[key] = (index, chunks, datetime.now())
+            self._cache[key] = (index, chunks, lexical_index, spans, datetime.now())
+            self._cache.move_to_end(key)
+            if self._max_entries:
+                while len(self._cache) > self._max_entries:
+                    self._cache.popitem(last=False)
 
     def clear(self) -> None:
         """Clear all cached entries."""
@@ -66,11 +147,11 @@ class DocumentCache:
             Number of entries removed
         """
         now = datetime.now()
-        cutoff_time = now - timedelta(hours=24)
+        cutoff_time = now - _TTL
 
         with self._lock:
             keys_to_remove = [
-                key for key, (_, _, timestamp) in self._cache.items()
+                key for key, (_, _, _, _, timestamp) in self._cache.items()
                 if timestamp < cutoff_time
             ]
 
@@ -126,4 +207,66 @@ class DocumentCache:
 
     def __contains__(self, key: str) -> bool:
         """Check if a key exists in the cache (and is not expired)."""
-        return self.get(key) is not None
\ No newline at end of file
+        return self.get(key) is not None
+
+
+def _serialize_entry(index: Any, chunks: Any, lexical_index: Any, spans: Any) -> bytes:
+    header: dict[str, Any] = {
+        "version": _FORMAT_VERSION,
+        "chunks": "store" if isinstance(chunks, ChunkStore) else "list",
+    }
+    arrays: dict[str, np.ndarray] = {}
+    if isinstance(index, CompactIndex):
+        header["index"] = "compact"
+        header["rerank_factor"] = index.rerank_factor
+        arrays["index"] = faiss.serialize_index(index.quantized_index)
+        if index.exact_vectors is not None:
+            arrays["vectors"] = np.asarray(index.exact_vectors)
+    else:
+        header["index"] = "faiss"
+        arrays["index"] = faiss.serialize_index(index)
+
+    store = chunks if isinstance(chunks, ChunkStore) else ChunkStore.from_chunks(list(chunks))
+    arrays["chunk_buffer"] = np.frombuffer(store.buffer, dtype=np.uint8)
+    arrays["chunk_offsets"] = store.offsets
+    if spans is not None:
+        arrays["chunk_spans"] = np.asarray(spans, dtype=np.int64).reshape(-1, 2)
+
+    if lexical_index is not None:
+        terms, postings = lexical_index.to_arrays()
+        header["bm25"] = {"k1": lexical_index.k1, "b": lexical_index.b, "terms": terms}
+        arrays.update({f"bm25_{name}": value for name, value in postings.items()})
+
+    arrays["header"] = np.frombuffer(json.dumps(header, ensure_ascii=False).encode('utf-8'), dtype=np.uint8)
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def _deserialize_entry(data: bytes) -> Tuple[Any, Any, Any, Any]:
+    with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+        header = json.loads(arrays["header"].tobytes().decode('utf-8'))
+        if header.get("version") != _FORMAT_VERSION:
+            raise ValueError(f"unsupported entry format {header.get('version')}")
+
+        index = faiss.deserialize_index(arrays["index"])
+        if header["index"] == "compact":
+            index = CompactIndex.from_vectors(
+                index, arrays["vectors"] if "vectors" in arrays else None, header["rerank_factor"]
+            )
+
+        chunks = ChunkStore(arrays["chunk_buffer"].tobytes(), arrays["chunk_offsets"])
+        if header["chunks"] == "list":
+            chunks = list(chunks)
+        spans = arrays["chunk_spans"] if "chunk_spans" in arrays else None
+
+        lexical_index = None
+        if "bm25" in header:
+            bm25 = header["bm25"]
+            lexical_index = BM25Index.from_arrays(
+                bm25["terms"],
+                {name[len("bm25_"):]: arrays[name] for name in arrays.files if name.startswith("bm25_")},
+                bm25["k1"],
+                bm25["b"],
+            )
+    return index, chunks, lexical_index, spans
@@ -0,0 +1,98 @@
+import os
+import platform
+import threading
+from pathlib import Path
+from typing import Optional
+
+from sentence_transformers import SentenceTransformer
+
+DEFAULT_EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+EMBEDDING_BACKENDS = ('torch', 'onnx', 'onnx-int8', 'openvino')
+
+_DEFAULT_CACHE_DIR = os.path.join(Path.home(), '.cache', 'gpa-embedding-models')
+
+_models: dict[tuple[str, str], SentenceTransformer] = {}
+_lock = threading.Lock()
+
+
+def load_embedding_model(
+        name: str = DEFAULT_EMBEDDING_MODEL,
+        backend: str = 'torch',
+        cache_dir: Optional[str] = None,
+) -> SentenceTransformer:
+    """
+    Process-wide SentenceTransformer instance per model name and backend.
+
+    The pre-fork server (`task.server`) calls this before forking workers, so the weights are loaded once
+    and shared copy-on-write by all workers instead of being loaded again in each of them.
+
+    :param backend: 'torch' (default), 'onnx' (ONNX Runtime), 'onnx-int8' (dynamically int8-quantized ONNX)
+        or 'openvino'. Non-torch backends need `optimum[onnxruntime]` / `optimum[openvino]` and are exported
+        once into `cache_dir` by `export_embedding_model`
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unsupported embedding backend '{backend}', expected one of {EMBEDDING_BACKENDS}")
+
+    with _lock:
+        model = _models.get((name, backend))
+        if model is None:
+            if backend == 'torch':
+                model = SentenceTransformer(
+                    model_name_or_path=name
+                    # device='cpu'
+                )
+            else:
+                path = export_embedding_model(name, backend, cache_dir)
+                model = SentenceTransformer(
+                    model_name_or_path=path,
+                    backend='onnx' if backend.startswith('onnx') else backend,
+                    model_kwargs=_model_kwargs(backend),
+                )
+            _models[(name, backend)] = model
+        return model
+
+
+def export_embedding_model(name: str, backend: str, cache_dir: Optional[str] = None) -> str:
+    """
+    Converts the model for a non-torch backend and saves it under `cache_dir`, returns the directory.
+    The conversion runs only when the cached files are missing.
+    """
+    path = os.path.join(cache_dir or _DEFAULT_CACHE_DIR, name.replace('/', '--'), backend)
+    model_file = os.path.join(path, _model_kwargs(backend).get('file_name', ''))
+    if os.path.isfile(model_file):
+        return path
+
+    print(f"[EmbeddingModel] Exporting '{name}' for '{backend}' backend to {path}")
+    base_backend = 'onnx' if backend.startswith('onnx') else backend
+    model = SentenceTransformer(model_name_or_path=name, backend=base_backend)
+    model.save_pretrained(path)
+    if backend == 'onnx-int8':
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        export_dynamic_quantized_onnx_model(model, _quantization_config(), path)
+    return path
+
+
+def _model_kwargs(backend: str) -> dict[str, str]:
+    if backend == 'onnx':
+        return {'file_name': 'onnx/model.onnx'}
+    if backend == 'onnx-int8':
+        return {'file_name': f'onnx/model_qint8_{_quantization_config()}.onnx'}
+    if backend == 'openvino':
+        return {'file_name': 'openvino/openvino_model.xml'}
+    return {}
+
+
+def _quantization_config() -> str:
+    """Best dynamic quantization preset for the current CPU."""
+    if platform.machine().lower() in ('arm64', 'aarch64'):
+        return 'arm64'
+    try:
+        with open('/proc/cpuinfo') as cpuinfo:
+            flags = cpuinfo.read()
+    except OSError:
+        return 'avx2'
+    if 'avx512_vnni' in flags:
+        return 'avx512_vnni'
+    if 'avx512' in flags:
+        return 'avx512'
+    return 'avx2'
@@ -0,0 +1,231 @@
+import asyncio
+import fcntl
+import hashlib
+import os
+import tempfile
+import threading
+import zlib
+from typing import Any, Iterator, Optional
+
+import faiss
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from task.tools.rag.bm25_index import BM25Index
+from task.tools.rag.chunker import TextChunker
+from task.utils.admission import stage_slot
+
+_CUT_CONTEXT = 32
+_POOL_LOCK_PATH = os.path.join(tempfile.gettempdir(), "gpa-embedding-pool.lock")
+
+
+def iter_segments(text: str, segment_size: int) -> Iterator[tuple[int, int]]:
+    """
+    Yields `(start, end)` offsets of consecutive pieces of `text` of `segment_size / 2 .. 2 * segment_size` chars,
+    cut at paragraph/line boundaries. Cut points are content-defined: among the boundaries in the window the one
+    with the smallest hash of the surrounding text wins, so after an edit the following cuts (and chunks) stay
+    the same.
+    """
+    start = 0
+    length = len(text)
+    while start < length:
+        end = length
+        if start + segment_size < length:
+            end = min(start + segment_size, length)
+            window_start, window_end = start + segment_size // 2, min(start + 2 * segment_size, length)
+            for separator in ("\n\n", "\n", ". ", " "):
+                cuts = []
+                position = text.find(separator, window_start, window_end)
+                while position != -1:
+                    cuts.append(position + len(separator))
+                    position = text.find(separator, position + len(separator), window_end)
+                if cuts:
+                    end = min(cuts, key=lambda cut: _cut_rank(text, cut))
+                    break
+        yield start, end
+        start = end
+
+
+def _cut_rank(text: str, cut: int) -> int:
+    return zlib.crc32(text[max(0, cut - _CUT_CONTEXT):cut + _CUT_CONTEXT].encode('utf-8'))
+
+
+def chunk_hash(chunk: str) -> bytes:
+    return hashlib.blake2b(chunk.encode('utf-8'), digest_size=16).digest()
+
+
+class IndexingJob:
+    """
+    Index of a single document that is being built batch by batch.
+    `index`, `chunks`, `spans` (`(start, end)` offsets of the chunks in the document text) and `lexical_index`
+    grow together and are always consistent between awaits, so they can be searched while the rest of
+    the document is still being embedded.
+    """
+
+    def __init__(self, dimension: int, early_answer_batches: int):
+        self.index = faiss.IndexFlatL2(dimension)
+        self.chunks: list[str] = []
+        self.spans: list[tuple[int, int]] = []
+        self.lexical_index = BM25Index()
+        self.batches_done = 0
+        self.reused_chunks = 0
+        self.early_answer_batches = early_answer_batches
+        self.task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.task is not None and self.task.done()
+
+    def add_batch(self, chunks: list[str], spans: list[tuple[int, int]], embeddings: Any) -> None:
+        self.index.add(np.asarray(embeddings, dtype='float32'))
+        self.chunks.extend(chunks)
+        self.spans.extend(spans)
+        self.lexical_index.add(chunks)
+        self.batches_done += 1
+        if self.early_answer_batches and self.batches_done >= self.early_answer_batches:
+            self._ready.set()
+
+    def finish(self) -> None:
+        self._ready.set()
+
+    async def wait_ready(self) -> None:
+        """Waits for the first `early_answer_batches` batches (or the whole document when early answer is off)."""
+        await self._ready.wait()
+        if not self.done:
+            return
+        if self.task.cancelled():
+            raise RuntimeError("Indexing of the document was cancelled")
+        if self.task.exception():
+            raise self.task.exception()
+
+
+class DocumentIndexer:
+    """
+    Pipelined indexer: the text is cut into segments, each segment is chunked and embedded as one batch
+    while the next one is being chunked, and every finished batch is appended to the index right away.
+
+    With `workers > 1` embedding is spread across CPU cores through a SentenceTransformer multi-process pool.
+    The pool is started on the first encode, and by one process per host only: pre-fork workers compete for
+    an exclusive lock on `pool_lock_path`, the others encode in-process (and try again on their next batch,
+    so a restarted owner is replaced).
+    """
+
+    def __init__(
+            self,
+            model: SentenceTransformer,
+            text_splitter: TextChunker,
+            chunk_size: int,
+            batch_size: int = 64,
+            workers: int = 1,
+            early_answer_batches: int = 0,
+            pool_lock_path: str = _POOL_LOCK_PATH,
+    ):
+        """
+        :param batch_size: approximate number of chunks embedded per batch
+        :param workers: number of embedding processes, 1 means in-process encoding
+        :param early_answer_batches: if > 0, searches are allowed once that many batches are indexed
+        :param pool_lock_path: host-wide lock file held by the process that owns the embedding pool
+        """
+        self.model = model
+        self.text_splitter = text_splitter
+        self.segment_size = chunk_size * batch_size
+        self.early_answer_batches = early_answer_batches
+        self.workers = workers
+        self.pool_lock_path = pool_lock_path
+        self._pool = None
+        self._pool_lock_file = None
+        self._pool_guard = threading.Lock()
+
+    def start(self, text: str, known_embeddings: Optional[dict[bytes, np.ndarray]] = None) -> IndexingJob:
+        """
+        :param known_embeddings: embeddings by `chunk_hash`, e.g. of a previous version of the document;
+            chunks found there are not encoded again
+        """
+        job = IndexingJob(self.model.get_sentence_embedding_dimension(), self.early_answer_batches)
+        job.task = asyncio.create_task(self._run(job, text, known_embeddings or {}))
+        return job
+
+    async def _run(self, job: IndexingJob, text: str, known_embeddings: dict[bytes, np.ndarray]) -> None:
+        try:
+            pending: Optional[tuple[list[str], list[tuple[int, int]], asyncio.Future]] = None
+            for segment_start, segment_end in iter_segments(text, self.segment_size):
+                spans = self.text_splitter.split_offsets(text, segment_start, segment_end)
+                if not spans:
+                    continue
+                chunks = [text[start:end] for start, end in spans]
+                future = asyncio.ensure_future(self._embed(job, chunks, known_embeddings))
+                if pending:
+                    job.add_batch(pending[0], pending[1], await pending[2])
+                pending = (chunks, spans, future)
+                # Let searches on the partial index run between batches
+                await asyncio.sleep(0)
+            if pending:
+                job.add_batch(pending[0], pending[1], await pending[2])
+        finally:
+            job.finish()
+
+    async def _embed(self, job: IndexingJob, chunks: list[str], known_embeddings: dict[bytes, np.ndarray]) -> Any:
+        if not known_embeddings:
+            return await self._encode_async(chunks)
+
+        known = [known_embeddings.get(chunk_hash(chunk)) for chunk in chunks]
+        missing = [i for i, embedding in enumerate(known) if embedding is None]
+        job.reused_chunks += len(chunks) - len(missing)
+        if len(missing) == len(chunks):
+            return await self._encode_async(chunks)
+
+        embeddings = np.empty((len(chunks), job.index.d), dtype='float32')
+        for i, embedding in enumerate(known):
+            if embedding is not None:
+                embeddings[i] = embedding
+        if missing:
+            embeddings[missing] = await self._encode_async([chunks[i] for i in missing])
+        return embeddings
+
+    async def _encode_async(self, chunks: list[str]) -> Any:
+        async with stage_slot("embedding"):
+            return await asyncio.to_thread(self._encode, chunks)
+
+    def _encode(self, chunks: list[str]) -> Any:
+        pool = self._get_pool()
+        if pool:
+            return self.model.encode(chunks, pool=pool)
+        return self.model.encode(chunks)
+
+    def _get_pool(self) -> Optional[dict[str, Any]]:
+        if self.workers <= 1:
+            return None
+        with self._pool_guard:
+            if self._pool is None and self._try_lock_pool():
+                try:
+                    self._pool = self.model.start_multi_process_pool(target_devices=['cpu'] * self.workers)
+                    print(f"[DocumentIndexer] Started embedding pool of {self.workers} processes")
+                except Exception as e:
+                    print(f"[DocumentIndexer] Unable to start embedding pool, encoding in-process: {e}")
+                    self.workers = 1
+                    self._unlock_pool()
+            return self._pool
+
+    def _try_lock_pool(self) -> bool:
+        if self._pool_lock_file is None:
+            self._pool_lock_file = open(self.pool_lock_path, "a")
+        try:
+            fcntl.flock(self._pool_lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _unlock_pool(self) -> None:
+        # Closing the file releases the lock, it is also released when the process dies
+        if self._pool_lock_file is not None:
+            self._pool_lock_file.close()
+            self._pool_lock_file = None
+
+    def close(self) -> None:
+        """Stops the multi-process embedding pool, if any, and lets another process start one."""
+        with self._pool_guard:
+            if self._pool:
+                self.model.stop_multi_process_pool(self._pool)
+                self._pool = None
+            self._unlock_pool()
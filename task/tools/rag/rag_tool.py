@@ -1,17 +1,25 @@
+import asyncio
+import hashlib
 import json
-from typing import Any
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable
 
-import faiss
 import numpy as np
-from aidial_client import AsyncDial
 from aidial_sdk.chat_completion import Message, Role
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
 
 from task.tools.base import BaseTool
 from task.tools.models import ToolCallParams
+from task.tools.rag.answer_cache import AnswerCache, QueryEmbeddingCache
+from task.tools.rag.bm25_index import BM25Index
+from task.tools.rag.chunker import TextChunker
+from task.tools.rag.compact_store import ChunkStore, CompactIndex, compact_index
 from task.tools.rag.document_cache import DocumentCache
+from task.tools.rag.embedding_model import load_embedding_model
+from task.tools.rag.indexer import DocumentIndexer, IndexingJob, chunk_hash
 from task.utils.dial_file_conent_extractor import DialFileContentExtractor
+from task.utils.single_flight import SingleFlight
 
 _SYSTEM_PROMPT = """
 You are an AI assistant that answers questions based on the provided context.
@@ -25,27 +33,126 @@ Context:
 ---
 """
 
+_RRF_K = 60
+_CHUNK_SIZE = 500
+_MAX_TRACKED_VERSIONS = 4096
+# How long a known document version is trusted before the file is checked for a new one
+_VERSION_CHECK_SECONDS = 60.0
+# Rough size of a token of the orchestration model, used for the retrieval-only token budget
+_CHARS_PER_TOKEN = 4
+
+
+@dataclass
+class _DocumentVersion:
+    key: str
+    validator: str | None
+    checked_at: float
+
 
 class RagTool(BaseTool):
     """
     Performs semantic search on documents to find and answer questions based on relevant content.
     Supports: PDF, TXT, CSV, HTML.
+
+    Retrieval is hybrid: dense (FAISS) and sparse (BM25) rankings are fused with Reciprocal Rank Fusion,
+    and the number of returned chunks adapts between `min_k` and `max_k` based on how fast fused scores drop.
+
+    Documents are indexed by a pipelined `DocumentIndexer`; with `early_answer_batches` the first query is answered
+    from the partial index while the rest of the document is still being embedded.
+
+    With a compact `storage_mode` ('sq8' or 'pq') finished documents are cached with quantized vectors and chunks
+    packed into a single UTF-8 buffer, optionally re-ranked with exact vectors kept on disk.
+
+    Documents are cached per file version (ETag / Last-Modified from a HEAD request, content hash if the server
+    reports neither). A known version is trusted for `_VERSION_CHECK_SECONDS`, after that a re-uploaded file under
+    the same URL is detected as a new version without downloading it again if it is unchanged. Chunks of a new
+    version that are unchanged reuse the embeddings of the previous version, only new chunks are encoded.
+
+    Query embeddings are cached (LRU), and synthesized answers are cached per document hash and retrieved chunk set:
+    the same question (or, opted in with `answer_similarity_threshold`, a near-identical one) is answered without
+    an LLM call.
+
+    With `retrieval_only` there is no nested synthesis completion at all: the ranked chunks with their scores and
+    character offsets in the extracted text (recorded at indexing) are returned to the agent,
+    within `retrieval_token_budget`.
     """
 
-    def __init__(self, endpoint: str, deployment_name: str, document_cache: DocumentCache):
+    def __init__(
+            self,
+            endpoint: str,
+            deployment_name: str,
+            document_cache: DocumentCache,
+            min_k: int = 3,
+            max_k: int = 8,
+            score_cutoff: float = 0.7,
+            embedding_batch_size: int = 64,
+            embedding_workers: int = 1,
+            early_answer_batches: int = 0,
+            storage_mode: str = 'flat',
+            exact_rerank: bool = False,
+            embedding_backend: str = 'torch',
+            embedding_cache_dir: str | None = None,
+            query_cache_size: int = 1024,
+            answer_cache_size: int = 512,
+            answer_similarity_threshold: float | None = None,
+            retrieval_only: bool = False,
+            retrieval_token_budget: int = 2000,
+    ):
+        """
+        :param min_k: minimal number of chunks passed to the synthesis step
+        :param max_k: maximal number of chunks passed to the synthesis step
+        :param score_cutoff: chunks beyond `min_k` are kept while their fused score is at least
+            `score_cutoff` of the best fused score. With RRF (k=60) and the default 16 candidates per retriever,
+            a chunk found by one retriever scores at most 1/61 and one found by both at least 2/77, so the default
+            0.7 drops single-retriever chunks whenever the best chunk is found by both, and keeps chunks found by
+            both. When the two rankings don't overlap at all, nothing is dropped
+        :param embedding_batch_size: approximate number of chunks embedded per pipeline batch
+        :param embedding_workers: number of embedding processes, 1 means in-process encoding
+        :param early_answer_batches: if > 0, the first query on a new document searches the partial index
+            as soon as that many batches are embedded
+        :param storage_mode: 'flat' keeps float32 vectors, 'sq8'/'pq' store int8 scalar / product quantized ones
+        :param exact_rerank: with a compact storage mode, re-rank candidates with exact vectors stored on disk
+        :param embedding_backend: 'torch', 'onnx', 'onnx-int8' or 'openvino', see `load_embedding_model`
+        :param embedding_cache_dir: directory of exported non-torch embedding models
+        :param query_cache_size: max number of cached query embeddings, 0 disables the cache
+        :param answer_cache_size: max number of cached (document, chunk set) answer groups, 0 disables the cache
+        :param answer_similarity_threshold: min cosine similarity of questions to reuse a cached answer,
+            None reuses answers of the same (normalized) question only
+        :param retrieval_only: return ranked chunks to the agent instead of an answer synthesized by a nested LLM call
+        :param retrieval_token_budget: approximate max number of tokens of chunks returned in retrieval-only mode
+        """
         self.endpoint = endpoint
         self.deployment_name = deployment_name
         self.document_cache = document_cache
-        self.model = SentenceTransformer(
-            model_name_or_path='all-MiniLM-L6-v2'
-            # device='cpu'
-        )
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
+        self.min_k = min_k
+        self.max_k = max(max_k, min_k)
+        self.score_cutoff = score_cutoff
+        self.storage_mode = storage_mode
+        self.exact_rerank = exact_rerank
+        self.retrieval_only = retrieval_only
+        self.retrieval_token_budget = retrieval_token_budget
+        self.model = load_embedding_model(backend=embedding_backend, cache_dir=embedding_cache_dir)
+        self.text_splitter = TextChunker(
+            chunk_size=_CHUNK_SIZE,
             chunk_overlap=50,
-            length_function=len,
-            separators=["\n\n", "\n", ". ", " ", ""]
         )
+        self.indexer = DocumentIndexer(
+            model=self.model,
+            text_splitter=self.text_splitter,
+            chunk_size=_CHUNK_SIZE,
+            batch_size=embedding_batch_size,
+            workers=embedding_workers,
+            early_answer_batches=early_answer_batches,
+        )
+        self._indexing_jobs: dict[str, IndexingJob] = {}
+        # Latest indexed version per conversation document
+        self._versions: OrderedDict[str, _DocumentVersion] = OrderedDict()
+        self._documents: SingleFlight[tuple[Any, Any, Any, Any] | IndexingJob | None] = SingleFlight()
+        self.query_cache = QueryEmbeddingCache(query_cache_size) if query_cache_size else None
+        self.answer_cache = AnswerCache(
+            answer_cache_size,
+            answer_similarity_threshold
+        ) if answer_cache_size else None
 
     @property
     def show_in_stage(self) -> bool:
@@ -57,6 +164,13 @@ class RagTool(BaseTool):
 
     @property
     def description(self) -> str:
+        if self.retrieval_only:
+            return (
+                "Performs a semantic search within a specified document and returns the most relevant excerpts, "
+                "best first, with relevance scores and character offsets in the document. "
+                "Use this tool when you need to answer a question based on the content of a file. "
+                "Provide the user's question or search query and the URL of the file."
+            )
         return (
             "Performs a semantic search within a specified document to find answers to questions. "
             "Use this tool when you need to answer a question based on the content of a file. "
@@ -91,28 +205,57 @@ class RagTool(BaseTool):
         stage.append_content(f"**File URL**: {file_url}\n\r")
 
         cache_document_key = f"{tool_call_params.conversation_id}:{file_url}"
-        cached_data = self.document_cache.get(cache_document_key)
+        extractor = DialFileContentExtractor(
+            self.endpoint,
+            tool_call_params.api_key,
+            tool_call_params.client_registry.http_client(self.endpoint)
+        )
+        document = await self._documents.do(
+            cache_document_key,
+            lambda: self._open_document(cache_document_key, file_url, extractor)
+        )
 
-        if cached_data:
-            index, chunks = cached_data
-        else:
-            extractor = DialFileContentExtractor(self.endpoint, tool_call_params.api_key)
-            text_content = extractor.extract_text(file_url)
+        if document is None:
+            stage.append_content("Could not extract content from the file.\n\r")
+            return "Error: File content not found or could not be extracted."
 
-            if not text_content:
-                stage.append_content("Could not extract content from the file.\n\r")
-                return "Error: File content not found or could not be extracted."
+        complete = True
+        if isinstance(document, IndexingJob):
+            await document.wait_ready()
+            index, chunks, spans = document.index, document.chunks, document.spans
+            lexical_index = document.lexical_index
+            complete = document.done
+            if not document.done:
+                stage.append_content(f"*Document is still being indexed, searched first {len(chunks)} chunks.*\n\r")
+            if document.reused_chunks:
+                stage.append_content(f"*Reused embeddings of {document.reused_chunks} unchanged chunks.*\n\r")
+        else:
+            index, chunks, lexical_index, spans = document
 
-            chunks = self.text_splitter.split_text(text_content)
-            embeddings = self.model.encode(chunks)
-            index = faiss.IndexFlatL2(embeddings.shape[1])
-            index.add(np.array(embeddings, dtype='float32'))
-            self.document_cache.set(cache_document_key, index, chunks)
+        query_embedding = self._embed_query(request)
+        retrieved = self._retrieve(request, query_embedding, index, chunks, lexical_index)
+        retrieved_chunks = [chunks[i] for i, _ in retrieved]
 
-        query_embedding = self.model.encode([request])
-        distances, indices = index.search(np.array(query_embedding, dtype='float32'), k=3)
+        if self.retrieval_only:
+            result = self._format_excerpts(retrieved, retrieved_chunks, spans)
+            stage.append_content("## Response: \n")
+            stage.append_content(f"```text\n\r{result}\n\r```\n\r")
+            return result
 
-        retrieved_chunks = [chunks[i] for i in indices[0]]
+        # Answers from a partial index are neither served from nor put into the answer cache
+        version = self._versions.get(cache_document_key)
+        # Full version key (conversation, file url and version), a validator alone is shared by unrelated files
+        document_key = version.key if version and complete else None
+        chunk_ids = [i for i, _ in retrieved]
+        if self.answer_cache and document_key:
+            cached_answer = self.answer_cache.get(document_key, chunk_ids, request, query_embedding)
+            if cached_answer:
+                answer, similarity = cached_answer
+                source = "the same question" if similarity >= 1.0 else f"a similar question ({similarity:.2f})"
+                stage.append_content(f"*Answer of {source} from cache.*\n\r")
+                stage.append_content("## Response: \n")
+                stage.append_content(answer)
+                return answer
 
         augmented_prompt = self.__augmentation(request, retrieved_chunks)
 
@@ -120,10 +263,10 @@ class RagTool(BaseTool):
         stage.append_content(f"```text\n\r{augmented_prompt}\n\r```\n\r")
         stage.append_content("## Response: \n")
 
-        dial = AsyncDial(
-            base_url=self.endpoint,
-            api_key=tool_call_params.api_key,
-            api_version=tool_call_params.api_version,
+        dial = tool_call_params.client_registry.get(
+            self.endpoint,
+            tool_call_params.api_key,
+            tool_call_params.api_version
         )
 
         messages = [
@@ -132,6 +275,7 @@ class RagTool(BaseTool):
         ]
 
         full_response = ""
+        started = time.perf_counter()
         async for chunk in await dial.chat.completions.create(
             deployment_name=self.deployment_name,
             messages=messages,
@@ -141,7 +285,207 @@ class RagTool(BaseTool):
                 stage.append_content(chunk.choices[0].delta.content)
                 full_response += chunk.choices[0].delta.content
 
+        if self.answer_cache and document_key and full_response:
+            self.answer_cache.set(
+                document_key, chunk_ids, request, query_embedding, full_response, time.perf_counter() - started
+            )
         return full_response
 
+    async def prefetch(self, conversation_id: str, file_url: str, extractor: DialFileContentExtractor) -> None:
+        """Starts indexing of a document ahead of the first search (no-op if it is cached or being indexed)."""
+        key = f"{conversation_id}:{file_url}"
+        await self._documents.do(key, lambda: self._open_document(key, file_url, extractor))
+
+    async def _open_document(self, key: str, file_url: str,
+                             extractor: DialFileContentExtractor) -> tuple[Any, Any, Any, Any] | IndexingJob | None:
+        """
+        Returns cached `(index, chunks, lexical_index, spans)` or a started indexing job, None if file has no content.
+        Runs under single-flight per key, so concurrent calls for one document never index it twice.
+
+        The file is downloaded and parsed only when its version is not cached yet.
+        """
+        previous = self._versions.get(key)
+        if previous and time.monotonic() - previous.checked_at < _VERSION_CHECK_SECONDS:
+            version = previous
+        else:
+            validator = await extractor.downloader.validator(file_url)
+            if previous and validator and validator == previous.validator:
+                version = previous
+            elif validator:
+                version = _DocumentVersion(_version_key(key, validator), validator, time.monotonic())
+            else:
+                version = None
+        text_content = None
+        if version is None:
+            # The server reports no version, the hash of the (revalidated) extracted text identifies it
+            text_content = await extractor.extract_text_async(file_url, revalidate=previous is not None)
+            if not text_content:
+                return None
+            version = _DocumentVersion(_version_key(key, text_content), None, time.monotonic())
+
+        job = self._indexing_jobs.get(version.key)
+        if job:
+            return job
+
+        # Waits while another worker indexes the same document, otherwise claims the key for this one
+        cached_data = await asyncio.to_thread(self.document_cache.get_or_claim, version.key)
+        if cached_data:
+            self._record_version(key, version)
+            return cached_data
+
+        try:
+            if text_content is None:
+                # The version is new to this worker, a text cached for the file may be of an older one
+                text_content = await extractor.extract_text_async(file_url, revalidate=True)
+        except BaseException:
+            self.document_cache.release_claim(version.key)
+            raise
+        if not text_content:
+            self.document_cache.release_claim(version.key)
+            return None
+
+        known_embeddings = None
+        if previous and previous.key != version.key:
+            try:
+                known_embeddings = await asyncio.to_thread(self._known_embeddings, previous.key)
+            except Exception as e:
+                print(f"[RagTool] Unable to reuse embeddings of '{previous.key}': {e}")
+        return self._start_indexing(
+            version.key, text_content, known_embeddings, lambda: self._record_version(key, version)
+        )
+
+    def _record_version(self, key: str, version: _DocumentVersion) -> None:
+        """Remembers the version of a document once its index is stored."""
+        version.checked_at = time.monotonic()
+        self._versions[key] = version
+        self._versions.move_to_end(key)
+        while len(self._versions) > _MAX_TRACKED_VERSIONS:
+            self._versions.popitem(last=False)
+
+    def _known_embeddings(self, version_key: str) -> dict[bytes, np.ndarray] | None:
+        """Exact embeddings by chunk hash of a cached document version, None if not available."""
+        cached_data = self.document_cache.get(version_key)
+        if not cached_data:
+            return None
+        index, chunks, _, _ = cached_data
+        if isinstance(index, CompactIndex):
+            vectors = index.exact_vectors
+        else:
+            vectors = index.reconstruct_n(0, index.ntotal)
+        if vectors is None:
+            return None
+        return {chunk_hash(chunk): np.array(vectors[i]) for i, chunk in enumerate(chunks)}
+
+    def _start_indexing(self, key: str, text_content: str,
+                        known_embeddings: dict[bytes, np.ndarray] | None = None,
+                        on_stored: Callable[[], None] | None = None) -> IndexingJob:
+        job = self.indexer.start(text_content, known_embeddings)
+        self._indexing_jobs[key] = job
+
+        def _on_done(task: asyncio.Task) -> None:
+            succeeded = not task.cancelled() and task.exception() is None
+            store = asyncio.ensure_future(asyncio.to_thread(self._store_document, key, job, succeeded))
+
+            def _on_stored(stored: asyncio.Future) -> None:
+                self._indexing_jobs.pop(key, None)
+                if on_stored and not stored.cancelled() and stored.exception() is None and stored.result():
+                    on_stored()
+
+            store.add_done_callback(_on_stored)
+
+        job.task.add_done_callback(_on_done)
+        return job
+
+    def _store_document(self, key: str, job: IndexingJob, succeeded: bool) -> bool:
+        """
+        Puts a finished document into the cache (compacting it if configured) and releases its claim.
+        Returns whether the document was stored.
+        """
+        if not succeeded:
+            self.document_cache.release_claim(key)
+            return False
+        try:
+            index, chunks = job.index, job.chunks
+            if self.storage_mode != 'flat' and chunks:
+                index = compact_index(index, self.storage_mode, self.exact_rerank)
+                chunks = ChunkStore.from_chunks(chunks)
+            spans = np.array(job.spans, dtype=np.int64).reshape(-1, 2)
+            self.document_cache.set(key, index, chunks, job.lexical_index, spans)
+            return True
+        except Exception as e:
+            self.document_cache.release_claim(key)
+            print(f"[RagTool] Unable to cache document '{key}': {e}")
+            return False
+
+    def _embed_query(self, request: str) -> np.ndarray:
+        """Query embedding of shape (1, d), from the query cache when possible."""
+        if self.query_cache:
+            embedding = self.query_cache.get(request)
+            if embedding is not None:
+                return embedding
+        embedding = np.array(self.model.encode([request]), dtype='float32')
+        if self.query_cache:
+            self.query_cache.set(request, embedding)
+        return embedding
+
+    def cache_stats(self) -> dict[str, Any]:
+        return {
+            "query_embeddings": self.query_cache.stats() if self.query_cache else None,
+            "answers": self.answer_cache.stats() if self.answer_cache else None,
+        }
+
+    def _retrieve(self, request: str, query_embedding: np.ndarray, index: Any, chunks: list[str] | ChunkStore,
+                  lexical_index: BM25Index | None) -> list[tuple[int, float]]:
+        """Hybrid retrieval. Returns `(chunk_id, fused_score)` pairs, best first."""
+        candidates = min(len(chunks), self.max_k * 2)
+        if candidates == 0:
+            return []
+
+        _, indices = index.search(query_embedding, k=candidates)
+        dense_ranking = [int(i) for i in indices[0] if i >= 0]
+
+        if lexical_index is None:
+            lexical_index = BM25Index.from_chunks(chunks)
+        sparse_ranking = [chunk_id for chunk_id, _ in lexical_index.search(request, k=candidates)]
+
+        fused: dict[int, float] = {}
+        for ranking in (dense_ranking, sparse_ranking):
+            for rank, chunk_id in enumerate(ranking):
+                fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (_RRF_K + rank + 1)
+
+        ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+        if not ranked:
+            return []
+
+        top_score = ranked[0][1]
+        selected = ranked[:self.min_k]
+        for chunk_id, score in ranked[self.min_k:self.max_k]:
+            if score < top_score * self.score_cutoff:
+                break
+            selected.append((chunk_id, score))
+        return selected
+
+    def _format_excerpts(self, retrieved: list[tuple[int, float]], retrieved_chunks: list[str],
+                         spans: Any) -> str:
+        """Ranked chunks with scores and `[start, end)` offsets in the extracted text, cut to the token budget."""
+        budget = self.retrieval_token_budget * _CHARS_PER_TOKEN
+        excerpts = []
+        for rank, ((chunk_id, score), chunk) in enumerate(zip(retrieved, retrieved_chunks), start=1):
+            if budget <= 0:
+                break
+            location = f"chars {spans[chunk_id][0]}-{spans[chunk_id][1]}" if spans is not None else "offset unknown"
+            if len(chunk) > budget:
+                chunk = chunk[:budget] + "…"
+            budget -= len(chunk)
+            excerpts.append(f"[{rank}] score={score:.4f}, {location}\n{chunk}")
+
+        if not excerpts:
+            return "No relevant excerpts found in the document."
+        return "Most relevant excerpts of the document, best first:\n\n" + "\n---\n".join(excerpts)
+
     def __augmentation(self, request: str, chunks: list[str]) -> str:
         return f"Question: {request}\n\nContext:\n" + "\n---\n".join(chunks)
+
+
+def _version_key(key: str, version: str) -> str:
+    return f"{key}:{hashlib.sha256(version.encode('utf-8')).hexdigest()[:16]}"
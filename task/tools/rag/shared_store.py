@@ -0,0 +1,225 @@
+import hashlib
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+# Lock and temp files older than this were left by dead workers (locks themselves expire much sooner)
+_ABANDONED_FILE_SECONDS = 3600
+
+
+class SharedStore(ABC):
+    """
+    Byte store shared between workers/replicas with a simple mutual-exclusion primitive.
+    Used by DocumentCache as the second tier behind its in-process LRU.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl_seconds: int) -> None:
+        pass
+
+    def exists(self, key: str) -> bool:
+        """Checks for a live entry without reading its value."""
+        return self.get(key) is not None
+
+    @abstractmethod
+    def try_lock(self, key: str, ttl_seconds: int) -> bool:
+        """Non-blocking lock acquisition. The lock expires after `ttl_seconds` if its owner dies."""
+        pass
+
+    @abstractmethod
+    def unlock(self, key: str) -> None:
+        pass
+
+
+class RedisSharedStore(SharedStore):
+    """Redis backed store, e.g. the `redis` service from docker-compose.yml."""
+
+    _UNLOCK_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, url: str, prefix: str = "gpa:rag:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("RedisSharedStore requires `redis` package to be installed") from e
+
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+        self._lock_tokens: dict[str, str] = {}
+        self._unlock = self._redis.register_script(self._UNLOCK_SCRIPT)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._redis.get(self._prefix + key)
+
+    def set(self, key: str, value: bytes, ttl_seconds: int) -> None:
+        self._redis.set(self._prefix + key, value, ex=ttl_seconds)
+
+    def exists(self, key: str) -> bool:
+        return bool(self._redis.exists(self._prefix + key))
+
+    def try_lock(self, key: str, ttl_seconds: int) -> bool:
+        token = uuid.uuid4().hex
+        if self._redis.set(f"{self._prefix}lock:{key}", token, nx=True, ex=ttl_seconds):
+            self._lock_tokens[key] = token
+            return True
+        return False
+
+    def unlock(self, key: str) -> None:
+        token = self._lock_tokens.pop(key, None)
+        if token:
+            self._unlock(keys=[f"{self._prefix}lock:{key}"], args=[token])
+
+
+class FileSharedStore(SharedStore):
+    """
+    Local stand-in for Redis: files in a directory shared by all workers of one host.
+    Writes are atomic (temp file + rename), locks are `O_EXCL` lock files that expire by mtime and hold
+    the token of their owner, so a worker only ever removes its own lock.
+
+    The directory is created private to the current user; an existing one owned by another user or writable
+    by others is rejected, since anyone who can write to it can change the cached documents.
+
+    At most every `sweep_interval` seconds a `set` sweeps the directory: expired entries, abandoned locks and
+    temp files are removed, and while the entries take more than `max_bytes`, the ones closest to expiration are
+    evicted. Workers sweep independently, a file removed by another worker in the meantime is skipped.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 2 * 1024 ** 3, sweep_interval: float = 60.0):
+        self._directory = Path(directory)
+        self._directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self._lock_tokens: dict[str, str] = {}
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._last_sweep = 0.0
+        stat = self._directory.stat()
+        if hasattr(os, "getuid") and (stat.st_uid != os.getuid() or stat.st_mode & 0o022):
+            raise PermissionError(
+                f"Shared store directory '{directory}' must be owned by the current user and not writable by others"
+            )
+
+    def _path(self, key: str, suffix: str) -> Path:
+        return self._directory / (hashlib.sha256(key.encode('utf-8')).hexdigest() + suffix)
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key, ".bin")
+        try:
+            expires_at = path.stat().st_mtime
+            if expires_at < time.time():
+                path.unlink(missing_ok=True)
+                return None
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, value: bytes, ttl_seconds: int) -> None:
+        path = self._path(key, ".bin")
+        tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        tmp_path.write_bytes(value)
+        # mtime stores expiration time of the entry
+        expires_at = time.time() + ttl_seconds
+        os.utime(tmp_path, (expires_at, expires_at))
+        os.replace(tmp_path, path)
+
+        if time.monotonic() - self._last_sweep >= self.sweep_interval:
+            self.sweep()
+
+    def exists(self, key: str) -> bool:
+        try:
+            return self._path(key, ".bin").stat().st_mtime >= time.time()
+        except FileNotFoundError:
+            return False
+
+    def try_lock(self, key: str, ttl_seconds: int) -> bool:
+        path = self._path(key, ".lock")
+        try:
+            if path.stat().st_mtime + ttl_seconds < time.time():
+                path.unlink(missing_ok=True)
+        except FileNotFoundError:
+            pass
+        token = uuid.uuid4().hex
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as file:
+            file.write(token)
+        self._lock_tokens[key] = token
+        return True
+
+    def unlock(self, key: str) -> None:
+        token = self._lock_tokens.pop(key, None)
+        if not token:
+            return
+        path = self._path(key, ".lock")
+        try:
+            if path.read_text() == token:
+                path.unlink(missing_ok=True)
+        except FileNotFoundError:
+            pass
+
+    def sweep(self) -> None:
+        """Removes expired entries, abandoned locks and temp files, then evicts entries beyond `max_bytes`."""
+        self._last_sweep = time.monotonic()
+        now = time.time()
+        entries: list[tuple[float, int, str]] = []
+        removed = 0
+        for entry in os.scandir(self._directory):
+            try:
+                stat = entry.stat()
+                if entry.name.endswith(".bin"):
+                    # mtime of an entry is its expiration time
+                    if stat.st_mtime < now:
+                        os.unlink(entry.path)
+                        removed += 1
+                    else:
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                elif entry.name.endswith((".lock", ".tmp")) and stat.st_mtime + _ABANDONED_FILE_SECONDS < now:
+                    os.unlink(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+
+        total = sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        if removed:
+            print(f"[FileSharedStore] Swept {removed} files, {total} bytes of entries left")
+
+
+def create_shared_store(url: Optional[str]) -> Optional[SharedStore]:
+    """
+    Creates store by URL: `redis://...`/`rediss://...` for Redis, `file:///path` for the local stand-in
+    (`file:///path?max_bytes=N` sets its size budget).
+    Returns None when url is empty (per-process cache only).
+    """
+    if not url:
+        return None
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSharedStore(url)
+    if url.startswith("file://"):
+        parsed = urlparse(url)
+        max_bytes = parse_qs(parsed.query).get("max_bytes")
+        if max_bytes:
+            return FileSharedStore(parsed.path, max_bytes=int(max_bytes[0]))
+        return FileSharedStore(parsed.path)
+    raise ValueError(f"Unsupported shared store url '{url}'")
@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Optional
+
+from aidial_sdk.exceptions import HTTPException as DIALException
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class FairScheduler:
+    """
+    Limits concurrency to `capacity` slots. Waiters are queued per tenant and served by weighted fair queuing:
+    the tenant with the smallest virtual time (slots received / weight) goes next, so one busy tenant
+    can't starve the others. Records queue-wait metrics.
+    """
+
+    def __init__(self, name: str, capacity: int, max_queued_per_tenant: Optional[int] = None,
+                 weights: Optional[dict[str, float]] = None):
+        self.name = name
+        self.capacity = capacity
+        self.max_queued_per_tenant = max_queued_per_tenant
+        self.weights = weights or {}
+        self._in_use = 0
+        self._queues: dict[str, deque[asyncio.Future]] = {}
+        self._virtual_times: dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._waits = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._rejected = 0
+
+    async def acquire(self, tenant: str) -> float:
+        """Waits for a slot, returns seconds spent in queue. Raises QueueFullError if tenant queue is full."""
+        if self._in_use < self.capacity and not self._queues:
+            self._grant(tenant)
+            return 0.0
+
+        queue = self._queues.setdefault(tenant, deque())
+        if self.max_queued_per_tenant is not None and len(queue) >= self.max_queued_per_tenant:
+            if not queue:
+                del self._queues[tenant]
+            self._rejected += 1
+            raise QueueFullError(f"{self.name} queue of tenant is full")
+
+        future = asyncio.get_running_loop().create_future()
+        queue.append(future)
+        started = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted right before cancellation, give it back
+                self.release()
+            else:
+                self._discard(tenant, future)
+            raise
+
+        waited = time.monotonic() - started
+        self._waits += 1
+        self._total_wait += waited
+        self._max_wait = max(self._max_wait, waited)
+        return waited
+
+    def release(self) -> None:
+        self._in_use -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, tenant: str) -> AsyncIterator[float]:
+        waited = await self.acquire(tenant)
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    def _grant(self, tenant: str) -> None:
+        self._in_use += 1
+        start = max(self._virtual_times.get(tenant, 0.0), self._virtual_time)
+        self._virtual_time = start
+        self._virtual_times[tenant] = start + 1.0 / self.weights.get(tenant, 1.0)
+
+    def _dispatch(self) -> None:
+        while self._in_use < self.capacity and self._queues:
+            tenant = min(self._queues, key=lambda t: max(self._virtual_times.get(t, 0.0), self._virtual_time))
+            queue = self._queues[tenant]
+            future = queue.popleft()
+            if not queue:
+                del self._queues[tenant]
+            if future.done():
+                continue
+            self._grant(tenant)
+            future.set_result(None)
+
+        # Forget tenants that are idle and not ahead of the others
+        idle = [t for t, vt in self._virtual_times.items() if vt <= self._virtual_time and t not in self._queues]
+        for tenant in idle:
+            del self._virtual_times[tenant]
+
+    def _discard(self, tenant: str, future: asyncio.Future) -> None:
+        queue = self._queues.get(tenant)
+        if queue and future in queue:
+            queue.remove(future)
+            if not queue:
+                del self._queues[tenant]
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "in_use": self._in_use,
+            "queued": {tenant: len(queue) for tenant, queue in self._queues.items()},
+            "waits": self._waits,
+            "avg_wait_seconds": self._total_wait / self._waits if self._waits else 0.0,
+            "max_wait_seconds": self._max_wait,
+            "rejected": self._rejected,
+        }
+
+
+_current: ContextVar[Optional[tuple['AdmissionController', str]]] = ContextVar("admission", default=None)
+
+
+def tenant_id(api_key: str) -> str:
+    """Stable, non-secret tenant identifier derived from api key."""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12]
+
+
+class AdmissionController:
+    """
+    Per-worker admission control: at most `max_in_flight` requests run at once, the rest wait in per-tenant
+    queues (fairly scheduled) and are rejected with 429 + Retry-After once their tenant queue is full.
+
+    Expensive stages (e.g. 'extraction', 'embedding', 'interpreter') get their own fair schedulers; code
+    running on behalf of an admitted request (including background tasks it spawns) enters them with `stage_slot`.
+    """
+
+    def __init__(
+            self,
+            max_in_flight: int = 32,
+            max_queued_per_tenant: int = 8,
+            stage_concurrency: Optional[dict[str, int]] = None,
+            tenant_weights: Optional[dict[str, float]] = None,
+            retry_after_seconds: int = 5,
+    ):
+        self.retry_after_seconds = retry_after_seconds
+        self.requests = FairScheduler("requests", max_in_flight, max_queued_per_tenant, tenant_weights)
+        self.stages = {
+            name: FairScheduler(name, capacity, weights=tenant_weights)
+            for name, capacity in (stage_concurrency or {}).items()
+        }
+
+    @asynccontextmanager
+    async def admit(self, api_key: str) -> AsyncIterator[None]:
+        tenant = tenant_id(api_key)
+        try:
+            waited = await self.requests.acquire(tenant)
+        except QueueFullError:
+            raise DIALException(
+                message="Too many requests, please retry later",
+                status_code=429,
+                type="rate_limit_exceeded",
+                headers={"Retry-After": str(self.retry_after_seconds)},
+            )
+        if waited > 1.0:
+            print(f"[AdmissionController] Tenant {tenant} waited {waited:.2f}s for admission")
+
+        token = _current.set((self, tenant))
+        try:
+            yield
+        finally:
+            _current.reset(token)
+            self.requests.release()
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests.metrics(),
+            "stages": {name: scheduler.metrics() for name, scheduler in self.stages.items()},
+        }
+
+
+@asynccontextmanager
+async def stage_slot(stage: str) -> AsyncIterator[None]:
+    """Fair-scheduled slot of an expensive stage for the current tenant, no-op outside admission control."""
+    current = _current.get()
+    scheduler = current[0].stages.get(stage) if current else None
+    if scheduler is None:
+        yield
+        return
+    async with scheduler.slot(current[1]):
+        yield
@@ -1,2 +1,4 @@
 TOOL_CALL_HISTORY_KEY = "tool_call_history"
-CUSTOM_CONTENT = "custom_content"
\ No newline at end of file
+CUSTOM_CONTENT = "custom_content"
+STATE_VERSION_KEY = "version"
+CONTENT_REF_KEY = "content_ref"
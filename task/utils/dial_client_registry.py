@@ -0,0 +1,97 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import httpx
+from aidial_client import AsyncDial
+# Private API of aidial-client==0.3.0 (pinned in requirements.txt), the public `AsyncDialClientPool` can't be used:
+# its `create_client` takes no `api_version`, and it neither exposes its httpx client (shared here with raw file
+# downloads) nor closes it. Check these two imports and `AsyncHTTPClient(internal_http_client=...)` on upgrade.
+from aidial_client._auth import process_auth
+from aidial_client._http_client import AsyncHTTPClient
+
+_DEFAULT_TIMEOUT = httpx.Timeout(timeout=600.0, connect=5.0)
+
+
+class DialClientRegistry:
+    """
+    Shared AsyncDial clients keyed by (endpoint, api_key, api_version).
+
+    All clients of one endpoint send requests through a single httpx connection pool with bounded
+    keep-alive connections, so tool calls reuse warm connections instead of paying connect/TLS setup.
+
+    Clients unused for `idle_ttl` seconds are evicted. This only bounds the number of `AsyncDial` wrappers
+    (one per api key), evicted clients hold no connections of their own: idle connections of the shared pool
+    are closed by httpx after `keepalive_expiry`, and `close` releases all pools on app shutdown.
+    """
+
+    def __init__(
+            self,
+            max_connections: int = 100,
+            max_keepalive_connections: int = 20,
+            keepalive_expiry: float = 30.0,
+            idle_ttl: float = 600.0,
+            max_retries: int = 2,
+    ):
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._idle_ttl = idle_ttl
+        self._max_retries = max_retries
+        self._http_clients: dict[str, httpx.AsyncClient] = {}
+        self._clients: OrderedDict[tuple[str, str, Optional[str]], tuple[AsyncDial, float]] = OrderedDict()
+
+    def http_client(self, endpoint: str) -> httpx.AsyncClient:
+        """Pooled raw httpx client for an endpoint, e.g. for streaming file downloads."""
+        client = self._http_clients.get(endpoint)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(limits=self._limits, timeout=_DEFAULT_TIMEOUT)
+            self._http_clients[endpoint] = client
+        return client
+
+    def get(self, endpoint: str, api_key: str, api_version: Optional[str] = None) -> AsyncDial:
+        now = time.monotonic()
+        self._evict_idle(now)
+
+        key = (endpoint, api_key, api_version)
+        entry = self._clients.get(key)
+        if entry is None:
+            auth_type, auth_value = process_auth(api_key=api_key, bearer_token=None)
+            client = AsyncDial(
+                base_url=endpoint,
+                api_key=api_key,
+                api_version=api_version,
+                http_client=AsyncHTTPClient(
+                    base_url=endpoint,
+                    auth_value=auth_value,
+                    auth_type=auth_type,
+                    max_retries=self._max_retries,
+                    timeout=_DEFAULT_TIMEOUT,
+                    internal_http_client=self.http_client(endpoint),
+                ),
+            )
+        else:
+            client = entry[0]
+
+        self._clients[key] = (client, now)
+        self._clients.move_to_end(key)
+        return client
+
+    def _evict_idle(self, now: float) -> None:
+        # Entries are ordered by last use, so the idle ones are at the beginning
+        while self._clients:
+            key, (_, last_used) = next(iter(self._clients.items()))
+            if now - last_used < self._idle_ttl:
+                break
+            del self._clients[key]
+
+    def size(self) -> int:
+        return len(self._clients)
+
+    async def close(self) -> None:
+        self._clients.clear()
+        for client in self._http_clients.values():
+            await client.aclose()
+        self._http_clients.clear()
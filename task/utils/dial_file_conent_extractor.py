@@ -1,45 +1,136 @@
+import asyncio
 import io
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from pathlib import Path
+from typing import IO, Optional
 
+import httpx
 import pdfplumber
 import pandas as pd
-from aidial_client import Dial
-from bs4 import BeautifulSoup
+
+from task.utils.admission import stage_slot
+from task.utils.dial_file_downloader import DialFileDownloader
+from task.utils.html_text import extract_html_text
+from task.utils.single_flight import SingleFlight
+
+
+class ExtractedTextCache:
+    """
+    Thread-safe LRU of extracted texts, bounded by total number of characters.
+    Entries are fresh for `ttl`; stale entries with an ETag are kept up to `max_age` so they can be revalidated.
+    """
+
+    def __init__(
+            self,
+            max_chars: int = 50_000_000,
+            ttl: timedelta = timedelta(minutes=15),
+            max_age: timedelta = timedelta(hours=24),
+    ):
+        self._entries: OrderedDict[str, tuple[str, Optional[str], datetime]] = OrderedDict()
+        self._max_chars = max_chars
+        self._ttl = ttl
+        self._max_age = max_age
+        self._total_chars = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[tuple[str, Optional[str], bool]]:
+        """Returns `(text, etag, is_fresh)` or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            text, etag, timestamp = entry
+            age = datetime.now() - timestamp
+            if age >= self._max_age or (age >= self._ttl and not etag):
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return text, etag, age < self._ttl
+
+    def set(self, key: str, text: str, etag: Optional[str] = None) -> None:
+        if len(text) > self._max_chars:
+            return
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (text, etag, datetime.now())
+            self._total_chars += len(text)
+            while self._total_chars > self._max_chars:
+                self._pop(next(iter(self._entries)))
+
+    def touch(self, key: str) -> None:
+        """Marks an entry as fresh again, e.g. after the server confirmed it with 304 Not Modified."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries[key] = (entry[0], entry[1], datetime.now())
+
+    def _pop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._total_chars -= len(entry[0])
+
+
+# Shared by all tools, so parallel tool calls on the same file download and parse it once,
+# and follow-up calls (pagination, prefetched attachments) hit the text cache
+_extractions: SingleFlight[str] = SingleFlight()
+_extracted_texts = ExtractedTextCache()
 
 
 class DialFileContentExtractor:
 
-    def __init__(self, endpoint: str, api_key: str):
-        self.dial = Dial(base_url=endpoint, api_key=api_key)
+    def __init__(self, endpoint: str, api_key: str, http_client: Optional[httpx.AsyncClient] = None):
+        self.api_key = api_key
+        self.downloader = DialFileDownloader(endpoint, api_key, http_client=http_client)
+
+    async def extract_text_async(self, file_url: str, revalidate: bool = False) -> str:
+        """
+        Downloads (streaming, size-limited) and extracts text off the event loop. Concurrent extractions of
+        the same file with the same api key are coalesced into one download and parse. Results are cached,
+        stale ones are revalidated with their ETag instead of being downloaded again.
+
+        :param revalidate: revalidate a cached text even if it is still fresh, e.g. when the file is known to have
+            a new version
+        """
+        key = f"{self.api_key}:{file_url}"
+        cached = _extracted_texts.get(key)
+        if cached and cached[2] and not revalidate:
+            return cached[0]
+        return await _extractions.do(key, lambda: self._extract_and_cache(key, file_url, cached))
+
+    async def _extract_and_cache(self, key: str, file_url: str,
+                                 cached: Optional[tuple[str, Optional[str], bool]]) -> str:
+        file = await self.downloader.download(file_url, etag=cached[1] if cached else None)
+        with file:
+            if file.not_modified:
+                _extracted_texts.touch(key)
+                return cached[0]
+            file_extension = Path(file.filename).suffix.lower()
+            async with stage_slot("extraction"):
+                text = await asyncio.to_thread(self.__extract_text, file.open(), file_extension, file.filename)
 
-    def extract_text(self, file_url: str) -> str:
-        content = self.dial.files.download(file_url)
-        filename = content.filename
-        file_extension = Path(filename).suffix.lower()
-        return self.__extract_text(content.get_content(), file_extension, filename)
+        if text:
+            _extracted_texts.set(key, text, file.etag)
+        return text
 
-    def __extract_text(self, file_content: bytes, file_extension: str, filename: str) -> str:
+    def __extract_text(self, file: IO[bytes], file_extension: str, filename: str) -> str:
         """Extract text content based on file type."""
         try:
             if file_extension == '.txt':
-                return file_content.decode('utf-8', errors='ignore')
+                return file.read().decode('utf-8', errors='ignore')
             elif file_extension == '.pdf':
-                with pdfplumber.open(io.BytesIO(file_content)) as pdf:
+                with pdfplumber.open(file) as pdf:
                     pages = [page.extract_text() for page in pdf.pages]
                     return "\n".join(filter(None, pages))
             elif file_extension == '.csv':
-                decoded_text_content = file_content.decode('utf-8', errors='ignore')
-                csv_buffer = io.StringIO(decoded_text_content)
+                csv_buffer = io.TextIOWrapper(file, encoding='utf-8', errors='ignore')
                 df = pd.read_csv(csv_buffer)
                 return df.to_markdown(index=False)
             elif file_extension in ['.html', '.htm']:
-                decoded_html_content = file_content.decode('utf-8', errors='ignore')
-                soup = BeautifulSoup(decoded_html_content, 'html.parser')
-                for script in soup(["script", "style"]):
-                    script.decompose()
-                return soup.get_text(separator='\n', strip=True)
+                return extract_html_text(file)
             else:
-                return file_content.decode('utf-8', errors='ignore')
+                return file.read().decode('utf-8', errors='ignore')
         except Exception as e:
             print(f"Error extracting text from {filename}: {e}")
             return ""
@@ -0,0 +1,145 @@
+import tempfile
+from dataclasses import dataclass, field
+from typing import IO, Optional
+from urllib.parse import unquote, urlparse
+
+import httpx
+
+
+class FileTooLargeError(Exception):
+    pass
+
+
+@dataclass
+class DownloadedFile:
+    """
+    Downloaded file body. Small bodies stay in memory, larger ones are spooled to a temp file.
+    `not_modified` is set when the server answered 304 to a conditional request, the body is empty then.
+    """
+    filename: str
+    size: int = 0
+    etag: Optional[str] = None
+    not_modified: bool = False
+    body: Optional[IO[bytes]] = field(default=None, repr=False)
+
+    def open(self) -> IO[bytes]:
+        """Returns a binary file object positioned at the beginning of the body."""
+        self.body.seek(0)
+        return self.body
+
+    def read(self) -> bytes:
+        return self.open().read()
+
+    def close(self) -> None:
+        if self.body:
+            self.body.close()
+
+    def __enter__(self) -> 'DownloadedFile':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+class DialFileDownloader:
+    """
+    Async streaming download of files from DIAL storage.
+
+    - The body is streamed and the download is aborted as soon as it exceeds `max_bytes`
+      (before reading anything if `Content-Length` already says so).
+    - Bodies above `spool_threshold` bytes are spooled to a temp file instead of RAM.
+    - `etag` turns the request into a conditional one (If-None-Match), a 304 is reported as `not_modified`.
+    - `validator` reads the version (ETag / Last-Modified) of a file with a HEAD request.
+    - `timeout` is passed with every request, so it also applies to a shared `http_client`.
+
+    HTTP Range requests are deliberately not supported: every caller needs the whole body (text extraction parses
+    complete PDF/CSV/HTML files, interpreter staging copies whole files), and pagination of extracted text is by
+    characters of the parsed text, which don't map to byte offsets of the file.
+    """
+
+    def __init__(
+            self,
+            endpoint: str,
+            api_key: str,
+            max_bytes: int = 100 * 1024 * 1024,
+            spool_threshold: int = 8 * 1024 * 1024,
+            timeout: float = 60.0,
+            http_client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.endpoint = endpoint.rstrip('/')
+        self.api_key = api_key
+        self.max_bytes = max_bytes
+        self.spool_threshold = spool_threshold
+        self.timeout = timeout
+        self._http_client = http_client
+
+    def _resolve_url(self, file_url: str) -> str:
+        if file_url.startswith(("http://", "https://")):
+            return file_url
+        return f"{self.endpoint}/v1/{file_url.lstrip('/')}"
+
+    async def validator(self, file_url: str) -> Optional[str]:
+        """
+        ETag (or Last-Modified) of the current file version from a HEAD request, without downloading the body.
+        None if the server reports neither or the request fails.
+        """
+        client = self._http_client or httpx.AsyncClient(timeout=self.timeout)
+        try:
+            response = await client.head(
+                self._resolve_url(file_url), headers={"Api-Key": self.api_key}, timeout=self.timeout
+            )
+            if response.is_success:
+                return response.headers.get("ETag") or response.headers.get("Last-Modified")
+        except httpx.HTTPError as e:
+            print(f"[DialFileDownloader] Unable to check version of '{file_url}': {e}")
+        finally:
+            if self._http_client is None:
+                await client.aclose()
+        return None
+
+    async def download(self, file_url: str, etag: Optional[str] = None) -> DownloadedFile:
+        """
+        :param etag: ETag of a previously downloaded version, to revalidate it
+        :raises FileTooLargeError: if the body exceeds `max_bytes`
+        """
+        headers = {"Api-Key": self.api_key}
+        if etag:
+            headers["If-None-Match"] = etag
+
+        filename = unquote(urlparse(file_url).path.rsplit('/', 1)[-1])
+        client = self._http_client or httpx.AsyncClient(timeout=self.timeout)
+        try:
+            async with client.stream(
+                    "GET", self._resolve_url(file_url), headers=headers, timeout=self.timeout
+            ) as response:
+                if response.status_code == 304:
+                    return DownloadedFile(filename=filename, etag=etag, not_modified=True)
+                response.raise_for_status()
+
+                content_length = response.headers.get("Content-Length")
+                if content_length and int(content_length) > self.max_bytes:
+                    raise FileTooLargeError(
+                        f"File '{filename}' is {int(content_length)} bytes, limit is {self.max_bytes} bytes"
+                    )
+
+                body = tempfile.SpooledTemporaryFile(max_size=self.spool_threshold)
+                size = 0
+                try:
+                    async for data in response.aiter_bytes():
+                        if size + len(data) > self.max_bytes:
+                            raise FileTooLargeError(f"File '{filename}' exceeds limit of {self.max_bytes} bytes")
+                        body.write(data)
+                        size += len(data)
+                except Exception:
+                    body.close()
+                    raise
+
+                return DownloadedFile(
+                    filename=filename,
+                    size=size,
+                    etag=response.headers.get("ETag"),
+                    body=body,
+                )
+        finally:
+            if self._http_client is None:
+                await client.aclose()
@@ -0,0 +1,79 @@
+import asyncio
+from pathlib import Path
+from typing import Optional
+
+from aidial_sdk.chat_completion import Request, Role
+
+from task.tools.rag.rag_tool import RagTool
+from task.utils.dial_client_registry import DialClientRegistry
+from task.utils.dial_file_conent_extractor import DialFileContentExtractor
+
+_PREFETCH_EXTENSIONS = {'.pdf', '.txt', '.csv', '.html', '.htm'}
+_PREFETCH_MIME_TYPES = {'application/pdf', 'text/plain', 'text/csv', 'text/html'}
+
+
+class FilePrefetcher:
+    """
+    Speculatively downloads and extracts files attached to the latest user message in the background,
+    while the first completion is streaming, so that the first tool call on them hits a warm cache.
+    Optionally starts RAG indexing of them as well.
+    """
+
+    def __init__(
+            self,
+            endpoint: str,
+            client_registry: DialClientRegistry,
+            rag_tool: Optional[RagTool] = None,
+            max_files: int = 5,
+            max_concurrency: int = 2,
+            max_index_chars: int = 2_000_000,
+    ):
+        """
+        :param rag_tool: if provided, prefetched documents are indexed for RAG too
+        :param max_files: max number of attachments prefetched per request
+        :param max_concurrency: max number of files prefetched at the same time (per worker)
+        :param max_index_chars: documents with more extracted text are not indexed speculatively
+        """
+        self.endpoint = endpoint
+        self.client_registry = client_registry
+        self.rag_tool = rag_tool
+        self.max_files = max_files
+        self.max_index_chars = max_index_chars
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: set[asyncio.Task] = set()
+
+    def start(self, request: Request) -> None:
+        """Schedules prefetch of new attachments, never blocks or fails the request."""
+        if not request.messages:
+            return
+        message = request.messages[-1]
+        if message.role != Role.USER or not message.custom_content or not message.custom_content.attachments:
+            return
+
+        conversation_id = request.headers.get("x-conversation-id")
+        file_urls = [
+            attachment.url for attachment in message.custom_content.attachments
+            if attachment.url and self._is_supported(attachment.url, attachment.type)
+        ]
+        for file_url in file_urls[:self.max_files]:
+            task = asyncio.create_task(self._prefetch(file_url, request.api_key, conversation_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _prefetch(self, file_url: str, api_key: str, conversation_id: Optional[str]) -> None:
+        try:
+            async with self._semaphore:
+                extractor = DialFileContentExtractor(
+                    self.endpoint,
+                    api_key,
+                    self.client_registry.http_client(self.endpoint)
+                )
+                text = await extractor.extract_text_async(file_url)
+                if text and self.rag_tool and conversation_id and len(text) <= self.max_index_chars:
+                    await self.rag_tool.prefetch(conversation_id, file_url, extractor)
+        except Exception as e:
+            print(f"[FilePrefetcher] Unable to prefetch {file_url}: {e}")
+
+    @staticmethod
+    def _is_supported(file_url: str, mime_type: Optional[str]) -> bool:
+        return Path(file_url).suffix.lower() in _PREFETCH_EXTENSIONS or mime_type in _PREFETCH_MIME_TYPES
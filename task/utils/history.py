@@ -1,12 +1,15 @@
 import copy
-from typing import Any
+from typing import Any, Optional
 
 from aidial_sdk.chat_completion import Message, Role
 
-from task.utils.constants import TOOL_CALL_HISTORY_KEY, CUSTOM_CONTENT
+from task.utils.constants import CONTENT_REF_KEY, CUSTOM_CONTENT
+from task.utils.state_codec import StateCodec
 
 
-def unpack_messages(messages: list[Message], state_history: list[dict[str, Any]]) -> list[dict[str, Any]]:
+def unpack_messages(messages: list[Message], state_history: list[dict[str, Any]],
+                    state_codec: Optional[StateCodec] = None) -> list[dict[str, Any]]:
+    state_codec = state_codec or StateCodec()
     result: list[dict[str, Any]] = []
     for message in messages:
         if message.role == Role.ASSISTANT:
@@ -14,17 +17,19 @@ def unpack_messages(messages: list[Message], state_history: list[dict[str, Any]]
                 # Unpack tool call history from Assistant message State
                 state = custom_content.state
                 if state and isinstance(state, dict):
-                    tool_call_history = state.get(TOOL_CALL_HISTORY_KEY)
-                    if tool_call_history and isinstance(tool_call_history, list):
+                    tool_call_history = state_codec.decode(state)
+                    if tool_call_history:
                         for history_msg in tool_call_history:
                             if history_msg.get("role") == Role.TOOL.value:
-                                result.append(
-                                    {
-                                        "role": Role.TOOL.value,
-                                        "content": history_msg.get("content"),
-                                        "tool_call_id": history_msg.get("tool_call_id"),
-                                    }
-                                )
+                                tool_message = {
+                                    "role": Role.TOOL.value,
+                                    "content": history_msg.get("content"),
+                                    "tool_call_id": history_msg.get("tool_call_id"),
+                                }
+                                # Blob reference is resolved by `StateCodec.resolve` once the context is built
+                                if CONTENT_REF_KEY in history_msg:
+                                    tool_message[CONTENT_REF_KEY] = history_msg[CONTENT_REF_KEY]
+                                result.append(tool_message)
                             else:
                                 result.append(history_msg)
 
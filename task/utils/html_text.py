@@ -0,0 +1,110 @@
+import codecs
+from html.parser import HTMLParser
+from typing import IO
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+_SKIPPED_TAGS = frozenset({"script", "style", "nav", "noscript", "template"})
+_READ_SIZE = 64 * 1024
+
+
+class _TextCollector:
+    """
+    Streaming collector of visible text: SAX-style start/end/data callbacks, content of script, style, nav etc.
+    is dropped as it is parsed. Works as lxml parser target and as stdlib HTMLParser callbacks.
+    """
+
+    def __init__(self):
+        self._parts: list[str] = []
+        self._skip_depth = 0
+        # Text of one node can arrive in several callbacks (e.g. across fed blocks)
+        self._pending: list[str] = []
+
+    def start(self, tag: str, attrib=None, nsmap=None) -> None:
+        self._flush()
+        if tag.lower() in _SKIPPED_TAGS:
+            self._skip_depth += 1
+
+    def end(self, tag: str) -> None:
+        self._flush()
+        if tag.lower() in _SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+
+    def data(self, data: str) -> None:
+        if not self._skip_depth:
+            self._pending.append(data)
+
+    def close(self) -> str:
+        self._flush()
+        return '\n'.join(self._parts)
+
+    def _flush(self) -> None:
+        data = ''.join(self._pending).strip()
+        self._pending.clear()
+        if data:
+            self._parts.append(data)
+
+
+class _StdlibParser(HTMLParser):
+
+    def __init__(self, collector: _TextCollector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+
+    def handle_starttag(self, tag, attrs):
+        self.collector.start(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag.lower() not in _SKIPPED_TAGS:
+            self.collector.start(tag)
+
+    def handle_endtag(self, tag):
+        self.collector.end(tag)
+
+    def handle_data(self, data):
+        self.collector.data(data)
+
+
+def _iter_decoded(file: IO[bytes]):
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    while data := file.read(_READ_SIZE):
+        yield decoder.decode(data)
+    yield decoder.decode(b'', final=True)
+
+
+def _extract_streaming(file: IO[bytes]) -> str:
+    collector = _TextCollector()
+    if etree is not None:
+        parser = etree.HTMLParser(target=collector)
+    else:
+        parser = _StdlibParser(collector)
+    for text in _iter_decoded(file):
+        parser.feed(text)
+    result = parser.close()
+    return result if isinstance(result, str) else collector.close()
+
+
+def _extract_with_soup(html: str) -> str:
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup(list(_SKIPPED_TAGS)):
+        tag.decompose()
+    return soup.get_text(separator='\n', strip=True)
+
+
+def extract_html_text(file: IO[bytes]) -> str:
+    """
+    Extracts visible text from HTML in one streaming pass (lxml when installed, stdlib tokenizer otherwise),
+    without building a document tree. Falls back to BeautifulSoup if the streaming parser fails.
+    The text has one text node per line, like BeautifulSoup `get_text('\\n', strip=True)`.
+    """
+    try:
+        return _extract_streaming(file)
+    except Exception as e:
+        print(f"[HtmlText] Streaming HTML parsing failed, falling back to BeautifulSoup: {e}")
+        file.seek(0)
+        return _extract_with_soup(file.read().decode('utf-8', errors='ignore'))
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import threading
+from typing import Any, Iterable, Optional
+
+from aidial_sdk.chat_completion import Role
+
+from task.tools.base import BaseTool
+
+
+class PromptPrefix:
+    """
+    Static head of every completion call: the system message and the tool schemas, built once at startup.
+
+    Tool schemas are ordered by name and round-tripped through sorted-key JSON, so the serialized prompt is
+    byte-identical across turns, users and MCP listing orders and provider-side prompt caching can reuse it.
+    Dynamic content (history, attachments, tool results) always goes after this prefix.
+    """
+
+    def __init__(self, system_prompt: str, tools: list[BaseTool]):
+        self.system_message: dict[str, Any] = {"role": Role.SYSTEM.value, "content": system_prompt}
+        self._tool_schemas: dict[str, dict[str, Any]] = {
+            tool.name: json.loads(_canonical_json(tool.schema)) for tool in sorted(tools, key=lambda t: t.name)
+        }
+        self.fingerprint = self.fingerprint_for(self.tool_schemas())
+        print(f"[PromptPrefix] {len(self._tool_schemas)} tool schemas, fingerprint {self.fingerprint}")
+
+    def messages(self, dynamic_messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        return [self.system_message, *dynamic_messages]
+
+    def tool_schemas(self, names: Optional[Iterable[str]] = None) -> list[dict[str, Any]]:
+        """
+        :param names: subset of tools to send (e.g. picked by `ToolSelector`), all tools when None
+        :return: schemas in canonical order
+        """
+        if names is None:
+            return list(self._tool_schemas.values())
+        names = set(names)
+        return [schema for name, schema in self._tool_schemas.items() if name in names]
+
+    def fingerprint_for(self, tool_schemas: Optional[list[dict[str, Any]]]) -> str:
+        """
+        :param tool_schemas: schemas actually sent with the request, as returned by `tool_schemas`
+        :return: hash of the system message and these schemas, requests with equal fingerprints share a prefix
+        """
+        return hashlib.sha256(
+            _canonical_json([self.system_message, tool_schemas or []]).encode('utf-8')
+        ).hexdigest()[:16]
+
+
+class PromptCacheStats:
+    """Thread-safe counters of prompt tokens served from the provider's prompt cache, per prefix fingerprint."""
+
+    def __init__(self):
+        self._stats: dict[str, dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, fingerprint: str, usage: Any) -> None:
+        """
+        :param usage: `usage` of the last streamed chunk; cached tokens are read from
+            `prompt_tokens_details.cached_tokens` (OpenAI) or `cache_read_input_tokens` (Anthropic)
+        """
+        if usage is None:
+            return
+        prompt_tokens = _field(usage, "prompt_tokens") or 0
+        cached_tokens = _field(_field(usage, "prompt_tokens_details"), "cached_tokens")
+        if cached_tokens is None:
+            cached_tokens = _field(usage, "cache_read_input_tokens") or 0
+
+        with self._lock:
+            stats = self._stats.setdefault(fingerprint, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0})
+            stats["calls"] += 1
+            stats["prompt_tokens"] += prompt_tokens
+            stats["cached_tokens"] += cached_tokens
+        print(f"[PromptCacheStats] {fingerprint}: {cached_tokens} of {prompt_tokens} prompt tokens cached")
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                fingerprint: {
+                    **stats,
+                    "hit_ratio": stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0,
+                }
+                for fingerprint, stats in self._stats.items()
+            }
+
+
+def _canonical_json(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def _field(value: Any, name: str) -> Any:
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        return value.get(name)
+    return getattr(value, name, None)
@@ -0,0 +1,173 @@
+import base64
+import binascii
+import hashlib
+import zlib
+from collections import OrderedDict
+from typing import Any, Optional
+
+from task.tools.rag.shared_store import SharedStore
+from task.utils.constants import CONTENT_REF_KEY, TOOL_CALL_HISTORY_KEY, STATE_VERSION_KEY
+
+STATE_VERSION = 2
+
+_CONTENT_ZLIB_KEY = "content_zlib"
+_MISSING_CONTENT = "[Tool output is no longer available]"
+_INVALID_CONTENT = "[Tool output could not be decoded]"
+
+
+class BlobStore:
+    """
+    Content-addressed store for large tool outputs, on top of a SharedStore (Redis or local directory).
+
+    Blobs are keyed by scope (conversation id) and sha256 of the content. Digests come back from the client
+    in the conversation state, so the scope keeps a forged or copied digest from reading another
+    conversation's tool outputs.
+    """
+
+    def __init__(self, shared_store: SharedStore, ttl_seconds: int = 30 * 24 * 3600):
+        self._shared_store = shared_store
+        self._ttl_seconds = ttl_seconds
+
+    def put(self, scope: str, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        key = self._key(scope, digest)
+        if not self._shared_store.exists(key):
+            self._shared_store.set(key, data, self._ttl_seconds)
+        return digest
+
+    def get(self, scope: str, digest: str) -> Optional[bytes]:
+        return self._shared_store.get(self._key(scope, digest))
+
+    @staticmethod
+    def _key(scope: str, digest: str) -> str:
+        return f"blob:{hashlib.sha256(scope.encode('utf-8')).hexdigest()[:32]}:{digest}"
+
+
+class StateCodec:
+    """
+    Encodes tool call history for `choice.set_state` in a compact, versioned format:
+        {"version": 2, "tool_call_history": [...]}
+
+    String contents of history messages are stored as is when small, zlib-compressed (base64) when that
+    pays off, and, with a blob store and a conversation id to scope blobs by, moved out of the state and
+    referenced by sha256 when larger than `blob_threshold`.
+    `decode` leaves references in place (`content_ref`), `resolve` loads them once the LLM context is built,
+    so only messages that end up in the context are fetched.
+    States without a version are the plain (v1) history and are passed through.
+    """
+
+    def __init__(
+            self,
+            blob_store: Optional[BlobStore] = None,
+            compress_threshold: int = 2048,
+            blob_threshold: int = 16384,
+            blob_cache_size: int = 256,
+            max_content_bytes: int = 16 * 1024 * 1024,
+    ):
+        self.blob_store = blob_store
+        self.compress_threshold = compress_threshold
+        self.blob_threshold = blob_threshold
+        self._blob_cache: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self._blob_cache_size = blob_cache_size
+        self.max_content_bytes = max_content_bytes
+
+    def encode(self, history: list[dict[str, Any]], scope: Optional[str] = None) -> dict[str, Any]:
+        """
+        :param scope: conversation id, large contents are kept inline (compressed) without it
+        """
+        return {
+            STATE_VERSION_KEY: STATE_VERSION,
+            TOOL_CALL_HISTORY_KEY: [self._encode_message(message, scope) for message in history],
+        }
+
+    def decode(self, state: dict[str, Any]) -> list[dict[str, Any]]:
+        """Returns history messages with inline contents decompressed and blob references left in place."""
+        history = state.get(TOOL_CALL_HISTORY_KEY)
+        if not history or not isinstance(history, list):
+            return []
+        if state.get(STATE_VERSION_KEY) != STATE_VERSION:
+            return history
+        return [self._decode_message(message) for message in history]
+
+    def resolve(self, messages: list[dict[str, Any]], scope: Optional[str] = None) -> list[dict[str, Any]]:
+        """
+        Replaces blob references with their contents.
+
+        :param scope: conversation id the state was encoded with
+        """
+        resolved = []
+        for message in messages:
+            if isinstance(message, dict) and CONTENT_REF_KEY in message:
+                digest = message[CONTENT_REF_KEY]
+                message = {key: value for key, value in message.items() if key != CONTENT_REF_KEY}
+                message["content"] = self._load_blob(scope, digest)
+            resolved.append(message)
+        return resolved
+
+    def _encode_message(self, message: dict[str, Any], scope: Optional[str]) -> dict[str, Any]:
+        content = message.get("content")
+        if not isinstance(content, str) or len(content) < self.compress_threshold:
+            return message
+
+        encoded = dict(message)
+        data = content.encode('utf-8')
+        if self.blob_store and scope and len(data) >= self.blob_threshold:
+            try:
+                del encoded["content"]
+                encoded[CONTENT_REF_KEY] = self.blob_store.put(scope, data)
+                return encoded
+            except Exception as e:
+                print(f"[StateCodec] Unable to store blob, keeping content inline: {e}")
+                encoded["content"] = content
+
+        compressed = base64.b64encode(zlib.compress(data, 6)).decode('ascii')
+        if len(compressed) < len(content):
+            del encoded["content"]
+            encoded[_CONTENT_ZLIB_KEY] = compressed
+        return encoded
+
+    def _decode_message(self, message: dict[str, Any]) -> dict[str, Any]:
+        if _CONTENT_ZLIB_KEY in message:
+            decoded = {key: value for key, value in message.items() if key != _CONTENT_ZLIB_KEY}
+            decoded["content"] = self._decompress(message[_CONTENT_ZLIB_KEY])
+            return decoded
+        return message
+
+    def _decompress(self, value: Any) -> str:
+        """
+        Inflates content sent back by the client, at most `max_content_bytes` of it, so a decompression bomb can't
+        exhaust memory. Oversized or corrupt content is replaced by a placeholder instead of failing the request.
+        """
+        try:
+            decompressor = zlib.decompressobj()
+            data = decompressor.decompress(base64.b64decode(value, validate=True), self.max_content_bytes)
+            if decompressor.unconsumed_tail or not decompressor.eof:
+                print(f"[StateCodec] Compressed content is truncated or larger than {self.max_content_bytes} bytes")
+                return _INVALID_CONTENT
+            return data.decode('utf-8')
+        except (binascii.Error, zlib.error, UnicodeDecodeError, TypeError, ValueError) as e:
+            print(f"[StateCodec] Unable to decode compressed content: {e}")
+            return _INVALID_CONTENT
+
+    def _load_blob(self, scope: Optional[str], digest: str) -> str:
+        if not scope or not isinstance(digest, str):
+            return _MISSING_CONTENT
+        cache_key = (scope, digest)
+        if cache_key in self._blob_cache:
+            self._blob_cache.move_to_end(cache_key)
+            return self._blob_cache[cache_key]
+
+        data = None
+        if self.blob_store:
+            try:
+                data = self.blob_store.get(scope, digest)
+            except Exception as e:
+                print(f"[StateCodec] Unable to load blob {digest}: {e}")
+        if data is None:
+            return _MISSING_CONTENT
+
+        content = data.decode('utf-8')
+        self._blob_cache[cache_key] = content
+        if len(self._blob_cache) > self._blob_cache_size:
+            self._blob_cache.popitem(last=False)
+        return content
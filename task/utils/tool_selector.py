@@ -0,0 +1,104 @@
+import asyncio
+import threading
+from typing import Any, Callable, Optional
+
+import numpy as np
+from aidial_sdk.chat_completion import Message, Role
+from sentence_transformers import SentenceTransformer
+
+from task.tools.base import BaseTool
+
+_FILE_PARAMETERS = ("file_url", "attachment_urls")
+
+
+class ToolSelector:
+    """
+    Picks the tools whose schemas are sent with a completion call, so prompts don't grow with every MCP tool.
+
+    - Tools called earlier in the conversation are always kept.
+    - When the conversation has attachments, tools that take file URLs are kept.
+    - The remaining slots up to `max_tools` go to tools ranked by embedding similarity of their name and
+      description to the last user message.
+
+    Falls back to the full set when selection is off (`max_tools` <= 0), there are not more than `max_tools` tools,
+    no tool reaches `min_similarity`, or ranking fails. If the embedding model can't be loaded, selection is turned
+    off for the lifetime of the selector.
+    """
+
+    def __init__(self, tools: list[BaseTool], max_tools: int, load_model: Callable[[], SentenceTransformer],
+                 min_similarity: float = 0.2):
+        """
+        :param load_model: returns the embedding model, called on the first selection (off the event loop)
+        """
+        self.tools = tools
+        self.max_tools = max_tools
+        self.min_similarity = min_similarity
+        self._load_model = load_model
+        self._model: Optional[SentenceTransformer] = None
+        self._model_unavailable = False
+        self._tool_embeddings: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    async def select(self, messages: list[Message], prepared_messages: list[dict[str, Any]]) -> list[BaseTool]:
+        """
+        :param messages: request messages (to find attachments and the last user question)
+        :param prepared_messages: messages sent to the model, including unpacked tool call history
+        """
+        if self.max_tools <= 0 or len(self.tools) <= self.max_tools or self._model_unavailable:
+            return self.tools
+
+        try:
+            query = next(
+                (message.content for message in reversed(messages)
+                 if message.role == Role.USER and isinstance(message.content, str) and message.content.strip()),
+                None
+            )
+            if not query:
+                return self.tools
+
+            similarities = await asyncio.to_thread(self._similarities, query)
+            if float(similarities.max()) < self.min_similarity:
+                return self.tools
+
+            selected = self._pinned(messages, prepared_messages)
+            for i in np.argsort(-similarities):
+                if len(selected) >= self.max_tools:
+                    break
+                selected.add(self.tools[i].name)
+        except Exception as e:
+            print(f"[ToolSelector] Unable to select tools, sending all of them: {e}")
+            return self.tools
+
+        # Registration order is kept; the agent sends the schemas in the canonical order of its prompt prefix
+        tools = [tool for tool in self.tools if tool.name in selected]
+        print(f"[ToolSelector] Sending {len(tools)} of {len(self.tools)} tool schemas")
+        return tools
+
+    def _pinned(self, messages: list[Message], prepared_messages: list[dict[str, Any]]) -> set[str]:
+        pinned = {
+            tool_call.get("function", {}).get("name")
+            for message in prepared_messages if message.get("role") == Role.ASSISTANT.value
+            for tool_call in message.get("tool_calls") or ()
+        }
+        if any(message.custom_content and message.custom_content.attachments for message in messages):
+            pinned.update(
+                tool.name for tool in self.tools
+                if any(parameter in tool.parameters.get("properties", {}) for parameter in _FILE_PARAMETERS)
+            )
+        return {name for name in pinned if name}
+
+    def _similarities(self, query: str) -> np.ndarray:
+        with self._lock:
+            if self._model is None:
+                try:
+                    self._model = self._load_model()
+                except Exception:
+                    self._model_unavailable = True
+                    raise
+            if self._tool_embeddings is None:
+                self._tool_embeddings = self._model.encode(
+                    [f"{tool.name}: {tool.description}" for tool in self.tools],
+                    normalize_embeddings=True
+                )
+        query_embedding = self._model.encode([query], normalize_embeddings=True)[0]
+        return self._tool_embeddings @ query_embedding
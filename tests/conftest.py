@@ -0,0 +1,10 @@
+import pytest
+
+from tests.fakes import HashingEmbeddingModel
+
+
+@pytest.fixture
+def embedding_model(monkeypatch) -> HashingEmbeddingModel:
+    model = HashingEmbeddingModel()
+    monkeypatch.setattr("task.tools.rag.rag_tool.load_embedding_model", lambda **kwargs: model)
+    return model
@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import json
+import re
+from types import SimpleNamespace
+
+import numpy as np
+from aidial_client.types.chat.legacy.chat_completion import ToolCall
+
+from task.tools.models import ToolCallParams
+
+_DIMENSION = 64
+
+
+class HashingEmbeddingModel:
+    """Deterministic bag-of-words encoder with the `SentenceTransformer` methods the tools use."""
+
+    def __init__(self):
+        self.encoded = 0
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return _DIMENSION
+
+    def encode(self, sentences, normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        self.encoded += len(sentences)
+        embeddings = np.zeros((len(sentences), _DIMENSION), dtype='float32')
+        for i, sentence in enumerate(sentences):
+            for word in re.findall(r"\w+", sentence.lower()):
+                embeddings[i, hashlib.md5(word.encode()).digest()[0] % _DIMENSION] += 1.0
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.where(norms == 0, 1, norms)
+        return embeddings
+
+
+class FakeDownloader:
+
+    def __init__(self, validator: str | None):
+        self.current_validator = validator
+        self.validator_calls = 0
+
+    async def validator(self, file_url: str) -> str | None:
+        self.validator_calls += 1
+        return self.current_validator
+
+
+class FakeExtractor:
+    """Stands in for `DialFileContentExtractor`: serves `text` and counts extractions."""
+
+    def __init__(self, text: str, validator: str | None = "v1"):
+        self.text = text
+        self.downloader = FakeDownloader(validator)
+        self.extractions: list[bool] = []
+
+    async def extract_text_async(self, file_url: str, revalidate: bool = False) -> str:
+        self.extractions.append(revalidate)
+        return self.text
+
+
+async def wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise TimeoutError("condition was not met")
+        await asyncio.sleep(0.01)
+
+
+class FakeStage:
+    """Collects what a tool writes to its stage."""
+
+    def __init__(self):
+        self.content = ""
+        self.attachments: list = []
+
+    def append_content(self, content: str) -> None:
+        self.content += content
+
+    def add_attachment(self, attachment=None, **kwargs) -> None:
+        """Keeps an `Attachment` passed positionally, or the keyword arguments."""
+        self.attachments.append(attachment if attachment is not None else kwargs)
+
+
+def chunk(content: str | None = None, **delta) -> SimpleNamespace:
+    """Streamed chat completion chunk with a single choice."""
+    delta = SimpleNamespace(**{"content": content, "custom_content": None, "tool_calls": None, **delta})
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+
+
+class FakeCompletions:
+    """`chat.completions` of `AsyncDial`, each call streams the next of `replies` (chunks, or an exception to raise)."""
+
+    def __init__(self, replies: list):
+        self.replies = list(replies)
+        self.calls: list[dict] = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        reply = self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+
+        async def stream():
+            for item in reply:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+
+        return stream()
+
+
+class FakeDial:
+
+    def __init__(self, replies: list):
+        self.chat = SimpleNamespace(completions=FakeCompletions(replies))
+
+
+class FakeClientRegistry:
+    """`DialClientRegistry` that hands out one `FakeDial` for every api key."""
+
+    def __init__(self, dial: FakeDial):
+        self.dial = dial
+
+    def get(self, endpoint: str, api_key: str, api_version: str | None = None) -> FakeDial:
+        return self.dial
+
+    def http_client(self, endpoint: str):
+        return None
+
+
+def tool_call_params(arguments: dict, registry: FakeClientRegistry, api_key: str = "key",
+                     conversation_id: str = "conversation", choice: FakeStage | None = None) -> ToolCallParams:
+    return ToolCallParams(
+        tool_call=ToolCall.validate(
+            {"id": "call_1", "type": "function", "function": {"name": "tool", "arguments": json.dumps(arguments)}}
+        ),
+        stage=FakeStage(),
+        choice=choice,
+        api_key=api_key,
+        api_version="",
+        conversation_id=conversation_id,
+        client_registry=registry,
+    )
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+from aidial_sdk.exceptions import HTTPException as DIALException
+
+from task.utils.admission import AdmissionController, FairScheduler, QueueFullError, stage_slot, tenant_id
+
+
+async def _serve_order(scheduler: FairScheduler, tenants: list[str]) -> list[str]:
+    """Queues one waiter per entry of `tenants` behind a held slot and returns the order they are granted."""
+    order = []
+
+    async def waiter(tenant: str, index: int):
+        await scheduler.acquire(tenant)
+        order.append(f"{tenant}{index}")
+
+    await scheduler.acquire("holder")
+    tasks = []
+    for index, tenant in enumerate(tenants):
+        tasks.append(asyncio.create_task(waiter(tenant, index)))
+        await asyncio.sleep(0)
+    for _ in tenants:
+        scheduler.release()
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_busy_tenant_does_not_starve_others():
+    order = asyncio.run(_serve_order(FairScheduler("test", 1), ["a", "a", "a", "b"]))
+    assert order == ["a0", "b3", "a1", "a2"]
+
+
+def test_weights_share_slots():
+    scheduler = FairScheduler("test", 1, weights={"a": 2.0})
+    order = asyncio.run(_serve_order(scheduler, ["a"] * 4 + ["b"] * 2))
+    assert [entry[0] for entry in order] == ["a", "b", "a", "a", "b", "a"]
+
+
+def test_capacity_is_respected():
+    async def scenario():
+        scheduler = FairScheduler("test", 2)
+        running = 0
+        peak = 0
+
+        async def work(tenant: str):
+            nonlocal running, peak
+            async with scheduler.slot(tenant):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*(work(f"t{i % 3}") for i in range(9)))
+        assert peak == 2
+        metrics = scheduler.metrics()
+        assert metrics["in_use"] == 0 and metrics["queued"] == {}
+        assert metrics["waits"] == 7
+
+    asyncio.run(scenario())
+
+
+def test_full_tenant_queue_is_rejected():
+    async def scenario():
+        scheduler = FairScheduler("test", 1, max_queued_per_tenant=1)
+        await scheduler.acquire("a")
+        queued = asyncio.create_task(scheduler.acquire("a"))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError):
+            await scheduler.acquire("a")
+        # Other tenants still have their own queue
+        other = asyncio.create_task(scheduler.acquire("b"))
+        await asyncio.sleep(0)
+        assert scheduler.metrics()["rejected"] == 1
+        scheduler.release()
+        scheduler.release()
+        await asyncio.gather(queued, other)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_queue_and_slot():
+    async def scenario():
+        scheduler = FairScheduler("test", 1)
+        await scheduler.acquire("a")
+        waiter = asyncio.create_task(scheduler.acquire("b"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.metrics()["queued"] == {}
+
+        # Slot granted right before the cancellation is handed back
+        waiter = asyncio.create_task(scheduler.acquire("b"))
+        await asyncio.sleep(0)
+        scheduler.release()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.metrics()["in_use"] == 0
+        assert await scheduler.acquire("c") == 0.0
+
+    asyncio.run(scenario())
+
+
+def test_admission_rejects_with_retry_after():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queued_per_tenant=0, retry_after_seconds=7)
+        async with controller.admit("key"):
+            with pytest.raises(DIALException) as error:
+                async with controller.admit("key"):
+                    pass
+        assert error.value.status_code == 429
+        assert error.value.headers == {"Retry-After": "7"}
+        assert controller.metrics()["requests"]["in_use"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_stage_slot_uses_scheduler_of_admitted_tenant():
+    async def scenario():
+        controller = AdmissionController(stage_concurrency={"embedding": 1})
+        async with stage_slot("embedding"):
+            assert controller.stages["embedding"].metrics()["in_use"] == 0
+
+        async with controller.admit("key"):
+            async with stage_slot("embedding"):
+                assert controller.stages["embedding"].metrics()["in_use"] == 1
+            # Stages without a scheduler are not limited
+            async with stage_slot("interpreter"):
+                pass
+        assert controller.stages["embedding"].metrics()["in_use"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_tenant_id_does_not_expose_api_key():
+    assert tenant_id("secret-key") == tenant_id("secret-key")
+    assert "secret" not in tenant_id("secret-key")
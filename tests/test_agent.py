@@ -0,0 +1,31 @@
+import asyncio
+import threading
+
+from aidial_sdk.chat_completion import Message, Role
+
+from task.agent import GeneralPurposeAgent
+from task.utils.state_codec import StateCodec
+
+
+class _ThreadRecordingCodec(StateCodec):
+
+    def __init__(self):
+        super().__init__()
+        self.threads: list[threading.Thread] = []
+
+    def resolve(self, messages, scope=None):
+        self.threads.append(threading.current_thread())
+        return super().resolve(messages, scope)
+
+
+def test_blob_references_are_resolved_off_the_event_loop():
+    codec = _ThreadRecordingCodec()
+    agent = GeneralPurposeAgent("http://dial", "You are helpful.", [], state_codec=codec)
+
+    async def scenario():
+        return await agent._prepare_messages([Message(role=Role.USER, content="hi")], "conversation")
+
+    messages = asyncio.run(scenario())
+    assert messages[0]["role"] == "system"
+    assert messages[-1]["content"] == "hi"
+    assert codec.threads and codec.threads[0] is not threading.main_thread()
@@ -0,0 +1,62 @@
+import numpy as np
+
+from task.tools.rag.answer_cache import AnswerCache, QueryEmbeddingCache
+from tests.fakes import HashingEmbeddingModel
+
+_MODEL = HashingEmbeddingModel()
+
+
+def _embed(query: str) -> np.ndarray:
+    return _MODEL.encode([query])
+
+
+def test_same_question_hits_after_normalization():
+    cache = AnswerCache()
+    cache.set("doc", [1, 2], "What is the max power?", _embed("What is the max power?"), "1000 W", 2.0)
+
+    assert cache.get("doc", [2, 1], "  what is the MAX power? ", _embed("what is the max power?")) == ("1000 W", 1.0)
+    assert cache.stats()["llm_seconds_saved"] == 2.0
+
+
+def test_similar_question_misses_by_default():
+    cache = AnswerCache()
+    cache.set("doc", [1, 2], "What is the max power?", _embed("What is the max power?"), "1000 W", 2.0)
+
+    assert cache.get("doc", [1, 2], "What is the min power?", _embed("What is the min power?")) is None
+
+
+def test_similar_question_hits_when_opted_in():
+    cache = AnswerCache(similarity_threshold=0.7)
+    cache.set("doc", [1, 2], "What is the max power?", _embed("What is the max power?"), "1000 W", 2.0)
+
+    answer, similarity = cache.get("doc", [1, 2], "what's the max power", _embed("what's the max power"))
+    assert answer == "1000 W"
+    assert 0.7 <= similarity < 1.0
+
+
+def test_other_document_version_or_chunks_miss():
+    cache = AnswerCache()
+    cache.set("doc-v1", [1, 2], "What is the max power?", _embed("What is the max power?"), "1000 W", 2.0)
+
+    assert cache.get("doc-v2", [1, 2], "What is the max power?", _embed("What is the max power?")) is None
+    assert cache.get("doc-v1", [1, 3], "What is the max power?", _embed("What is the max power?")) is None
+    assert cache.stats()["misses"] == 2
+
+
+def test_groups_are_evicted_lru():
+    cache = AnswerCache(max_entries=2)
+    for document in ("a", "b", "c"):
+        cache.set(document, [1], "question", _embed("question"), document, 1.0)
+
+    assert cache.get("a", [1], "question", _embed("question")) is None
+    assert cache.get("c", [1], "question", _embed("question")) == ("c", 1.0)
+
+
+def test_query_embedding_cache_is_bounded():
+    cache = QueryEmbeddingCache(max_entries=1)
+    cache.set("a", _embed("a"))
+    cache.set("b", _embed("b"))
+
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 1, "hit_rate": 0.5}
@@ -0,0 +1,67 @@
+from pathlib import Path
+
+import pytest
+
+from task.tools.rag.chunker import DEFAULT_SEPARATORS, TextChunker
+
+_MANUAL = (Path(__file__).parent / "microwave_manual.txt").read_text(encoding="utf-8")
+_SAMPLES = [
+    _MANUAL,
+    "",
+    "   \n\n  ",
+    "short text",
+    "x" * 1234,
+    "Sentence one. Sentence two.\nLine two.\n\n\n\nParagraph " * 40,
+    " ".join(f"word{i}" for i in range(600)) + ". " + "Тест юникода. " * 50,
+]
+_SIZES = [(500, 50), (100, 0), (64, 32), (1000, 200)]
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", _SIZES)
+def test_chunks_match_recursive_character_text_splitter(chunk_size, chunk_overlap):
+    text_splitters = pytest.importorskip("langchain_text_splitters")
+    splitter = text_splitters.RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len, separators=list(DEFAULT_SEPARATORS)
+    )
+    chunker = TextChunker(chunk_size, chunk_overlap)
+    for text in _SAMPLES:
+        assert chunker.split_text(text) == splitter.split_text(text)
+
+
+@pytest.mark.parametrize("compat", [True, False])
+@pytest.mark.parametrize("chunk_size, chunk_overlap", _SIZES)
+def test_offsets_point_into_text(chunk_size, chunk_overlap, compat):
+    chunker = TextChunker(chunk_size, chunk_overlap, compat=compat)
+    for text in _SAMPLES:
+        offsets = chunker.split_offsets(text)
+        assert chunker.split_text(text) == [text[start:end] for start, end in offsets]
+        for start, end in offsets:
+            assert 0 <= start < end <= len(text)
+            assert end - start <= chunk_size
+            assert not text[start].isspace() and not text[end - 1].isspace()
+
+
+def test_offsets_of_a_span_are_absolute():
+    chunker = TextChunker(100, 10)
+    start, end = 1000, 3000
+    assert chunker.split_offsets(_MANUAL, start, end) == [
+        (start + a, start + b) for a, b in chunker.split_offsets(_MANUAL[start:end])
+    ]
+
+
+def test_separator_stays_with_the_piece_it_ends():
+    chunks = TextChunker(30, 0, compat=False).split_text("First sentence here. Second sentence here. Third one.")
+    assert chunks[0].endswith(".")
+    assert not any(chunk.startswith(".") for chunk in chunks)
+
+
+def test_length_function_sizes_chunks():
+    chunker = TextChunker(10, 0, length_function=lambda text: len(text.split()))
+    chunks = chunker.split_text(" ".join(f"w{i}" for i in range(95)))
+    assert all(len(chunk.split()) <= 10 for chunk in chunks)
+    assert " ".join(chunks).split() == [f"w{i}" for i in range(95)]
+
+
+def test_overlap_larger_than_chunk_size_is_rejected():
+    with pytest.raises(ValueError, match="Chunk overlap"):
+        TextChunker(chunk_size=50, chunk_overlap=100)
@@ -0,0 +1,155 @@
+import asyncio
+import functools
+import json
+from types import SimpleNamespace
+
+import pytest
+from aidial_sdk.chat_completion import Attachment
+
+from task.tools.deployment.configurable_deployment_tool import ConfigurableDeploymentTool
+from task.tools.deployment.image_generation_tool import ImageGenerationTool
+from tests.fakes import FakeClientRegistry, FakeDial, FakeStage, chunk, tool_call_params
+
+_CONFIG = {"name": "summarize", "deployment_name": "gpt-4o-mini", "description": "Summarizes text."}
+
+
+def _image(url: str) -> SimpleNamespace:
+    return chunk(custom_content=SimpleNamespace(attachments=[Attachment(type="image/png", url=url)]))
+
+
+class _DelayedCompletions:
+    """Streams one image per call after a delay picked by the prompt, tracks concurrent calls per api key."""
+
+    def __init__(self, delays: dict[str, float]):
+        self.delays = delays
+        self.active: dict[str, int] = {}
+        self.max_active: dict[str, int] = {}
+        self.max_total = 0
+
+    def for_key(self, api_key: str) -> SimpleNamespace:
+        create = functools.partial(self._create, api_key)
+        return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    async def _create(self, api_key: str, messages, **kwargs):
+        prompt = messages[-1]["content"]
+
+        async def stream():
+            self.active[api_key] = self.active.get(api_key, 0) + 1
+            self.max_active[api_key] = max(self.max_active.get(api_key, 0), self.active[api_key])
+            self.max_total = max(self.max_total, sum(self.active.values()))
+            try:
+                await asyncio.sleep(self.delays.get(prompt, 0.01))
+                yield _image(f"files/{prompt}.png")
+            finally:
+                self.active[api_key] -= 1
+
+        return stream()
+
+
+class _KeyedRegistry(FakeClientRegistry):
+
+    def __init__(self, completions: _DelayedCompletions):
+        super().__init__(None)
+        self.completions = completions
+
+    def get(self, endpoint: str, api_key: str, api_version: str | None = None) -> SimpleNamespace:
+        return self.completions.for_key(api_key)
+
+
+def test_content_is_streamed_into_stage():
+    registry = FakeClientRegistry(FakeDial([[chunk("Short "), chunk("summary.")]]))
+    tool = ConfigurableDeploymentTool("http://dial", {**_CONFIG, "system_prompt": "Be brief."})
+    params = tool_call_params({"prompt": "Long text", "language": "en"}, registry)
+
+    message = asyncio.run(tool.execute(params))
+
+    assert params.stage.content == "Short summary."
+    assert message.content[0].text == "Short summary."
+    call = registry.dial.chat.completions.calls[0]
+    assert call["deployment_name"] == "gpt-4o-mini"
+    assert call["messages"] == [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "Long text"}]
+    assert call["extra_body"] == {"custom_fields": {"configuration": {"language": "en"}}}
+
+
+def test_clean_failure_is_retried():
+    registry = FakeClientRegistry(FakeDial([[RuntimeError("busy")], [chunk("done")]]))
+    tool = ConfigurableDeploymentTool("http://dial", {**_CONFIG, "max_retries": 1})
+
+    message = asyncio.run(tool.execute(tool_call_params({"prompt": "text"}, registry)))
+
+    assert message.content[0].text == "done"
+    assert len(registry.dial.chat.completions.calls) == 2
+
+
+def test_no_retry_after_partial_output():
+    registry = FakeClientRegistry(FakeDial([[chunk("Half a "), RuntimeError("connection reset")], [chunk("again")]]))
+    tool = ConfigurableDeploymentTool("http://dial", {**_CONFIG, "max_retries": 3})
+    params = tool_call_params({"prompt": "text"}, registry)
+
+    message = asyncio.run(tool.execute(params))
+
+    assert message.content == "Error: connection reset"
+    assert params.stage.content == "Half a "
+    assert len(registry.dial.chat.completions.calls) == 1
+
+
+def test_attempt_is_bounded_by_timeout():
+    completions = _DelayedCompletions({"text": 5.0})
+    tool = ConfigurableDeploymentTool("http://dial", {**_CONFIG, "timeout": 0.05})
+
+    message = asyncio.run(tool.execute(tool_call_params({"prompt": "text"}, _KeyedRegistry(completions))))
+
+    assert message.content == "Error: Deployment 'gpt-4o-mini' timed out after 0.05s"
+    assert completions.active == {"key": 0}
+
+
+def test_configured_parameters_must_have_prompt():
+    parameters = {"type": "object", "properties": {"text": {"type": "string"}}}
+
+    with pytest.raises(ValueError, match="prompt"):
+        ConfigurableDeploymentTool("http://dial", {**_CONFIG, "parameters": parameters})
+
+
+def test_configured_names_must_be_unique(tmp_path):
+    config_path = tmp_path / "tools.json"
+    config_path.write_text(json.dumps([_CONFIG, {**_CONFIG, "name": "translate"}]))
+
+    tools = ConfigurableDeploymentTool.load_all("http://dial", str(config_path), registered_names=["web_search"])
+    assert [tool.name for tool in tools] == ["summarize", "translate"]
+
+    with pytest.raises(ValueError, match="summarize"):
+        ConfigurableDeploymentTool.load_all("http://dial", str(config_path), registered_names=["summarize"])
+
+    config_path.write_text(json.dumps([_CONFIG, _CONFIG]))
+    with pytest.raises(ValueError, match="summarize"):
+        ConfigurableDeploymentTool.load_all("http://dial", str(config_path))
+
+
+def test_images_are_shown_as_they_complete():
+    completions = _DelayedCompletions({"slow": 0.2, "fast": 0.01})
+    choice = FakeStage()
+    params = tool_call_params({"prompts": ["slow", "fast"]}, _KeyedRegistry(completions), choice=choice)
+
+    message = asyncio.run(ImageGenerationTool("http://dial").execute(params))
+
+    assert choice.content.index("files/fast.png") < choice.content.index("files/slow.png")
+    assert message.content[0].text.splitlines()[0].startswith("Image #1:")
+    assert [attachment.url for attachment in message.custom_content.attachments] == ["files/slow.png", "files/fast.png"]
+    assert params.stage.content == ""
+
+
+def test_generations_are_limited_per_api_key():
+    completions = _DelayedCompletions({})
+    registry = _KeyedRegistry(completions)
+    tool = ImageGenerationTool("http://dial", max_concurrency_per_user=1)
+
+    async def scenario():
+        await asyncio.gather(*(
+            tool.execute(tool_call_params({"prompt": "cat", "n": 3}, registry, api_key=api_key, choice=FakeStage()))
+            for api_key in ("alice", "bob")
+        ))
+
+    asyncio.run(scenario())
+
+    assert completions.max_active == {"alice": 1, "bob": 1}
+    assert completions.max_total == 2
@@ -0,0 +1,37 @@
+import asyncio
+
+from task.utils.dial_client_registry import DialClientRegistry
+
+
+def test_clients_share_one_pool_per_endpoint():
+    async def scenario():
+        registry = DialClientRegistry()
+        first = registry.get("http://dial", "key-1", "2025-01-01")
+        assert registry.get("http://dial", "key-1", "2025-01-01") is first
+        assert first.api_version == "2025-01-01"
+
+        second = registry.get("http://dial", "key-2")
+        assert second is not first
+        assert first._http_client.internal_http_client is registry.http_client("http://dial")
+        assert second._http_client.internal_http_client is registry.http_client("http://dial")
+        assert registry.http_client("http://other") is not registry.http_client("http://dial")
+        await registry.close()
+
+    asyncio.run(scenario())
+
+
+def test_eviction_keeps_shared_pool_open():
+    async def scenario():
+        registry = DialClientRegistry(idle_ttl=0.0)
+        pool = registry.http_client("http://dial")
+        registry.get("http://dial", "key-1")
+        registry.get("http://dial", "key-2")
+        assert registry.size() == 1
+        assert not pool.is_closed
+        assert registry.http_client("http://dial") is pool
+
+        await registry.close()
+        assert pool.is_closed
+        assert registry.size() == 0
+
+    asyncio.run(scenario())
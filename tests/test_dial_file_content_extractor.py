@@ -0,0 +1,155 @@
+import asyncio
+import io
+from datetime import timedelta
+
+import pytest
+
+from task.utils import dial_file_conent_extractor
+from task.utils.dial_file_conent_extractor import DialFileContentExtractor, ExtractedTextCache
+from task.utils.dial_file_downloader import DownloadedFile
+from task.utils.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_computation():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await release.wait()
+            return "text"
+
+        callers = [asyncio.ensure_future(flight.do("file", compute)) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert flight.in_flight("file")
+        release.set()
+
+        assert await asyncio.gather(*callers) == ["text"] * 3
+        assert len(calls) == 1
+        assert not flight.in_flight("file")
+        # Nothing is cached after the computation finished
+        assert await flight.do("file", compute) == "text"
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
+
+
+def test_exception_is_shared_and_not_cached():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("broken file")
+
+        results = await asyncio.gather(flight.do("file", fail), flight.do("file", fail), return_exceptions=True)
+        assert [str(result) for result in results] == ["broken file", "broken file"]
+        assert not flight.in_flight("file")
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            return "text"
+
+        leader = asyncio.ensure_future(flight.do("file", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("file", compute))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await follower == "text"
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    asyncio.run(scenario())
+
+
+def test_text_cache_is_bounded_by_characters():
+    cache = ExtractedTextCache(max_chars=10)
+    cache.set("a", "12345")
+    cache.set("b", "12345")
+    cache.get("a")
+    cache.set("c", "123")
+    cache.set("huge", "x" * 11)
+
+    assert cache.get("a") == ("12345", None, True)
+    assert cache.get("b") is None
+    assert cache.get("c") == ("123", None, True)
+    assert cache.get("huge") is None
+
+
+def test_stale_text_is_kept_only_with_etag():
+    cache = ExtractedTextCache(ttl=timedelta(0))
+    cache.set("with_etag", "text", etag='"v1"')
+    cache.set("without_etag", "text")
+
+    assert cache.get("with_etag") == ("text", '"v1"', False)
+    assert cache.get("without_etag") is None
+
+    expired = ExtractedTextCache(ttl=timedelta(0), max_age=timedelta(0))
+    expired.set("with_etag", "text", etag='"v1"')
+    assert expired.get("with_etag") is None
+
+
+class _Downloader:
+
+    def __init__(self, etag: str = '"v1"'):
+        self.etag = etag
+        self.requests: list = []
+        self.release = asyncio.Event()
+
+    async def download(self, file_url: str, etag: str | None = None) -> DownloadedFile:
+        self.requests.append(etag)
+        await self.release.wait()
+        if etag == self.etag:
+            return DownloadedFile(filename="notes.txt", etag=etag, not_modified=True)
+        return DownloadedFile(filename="notes.txt", size=5, etag=self.etag, body=io.BytesIO(b"notes"))
+
+
+def _extractor(monkeypatch, cache: ExtractedTextCache) -> DialFileContentExtractor:
+    monkeypatch.setattr(dial_file_conent_extractor, "_extracted_texts", cache)
+    monkeypatch.setattr(dial_file_conent_extractor, "_extractions", SingleFlight())
+    extractor = DialFileContentExtractor("http://dial", "key")
+    extractor.downloader = _Downloader()
+    return extractor
+
+
+def test_concurrent_extractions_download_once(monkeypatch):
+    extractor = _extractor(monkeypatch, ExtractedTextCache())
+
+    async def scenario():
+        calls = [asyncio.ensure_future(extractor.extract_text_async("files/notes.txt")) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        extractor.downloader.release.set()
+        return await asyncio.gather(*calls)
+
+    assert asyncio.run(scenario()) == ["notes"] * 3
+    assert extractor.downloader.requests == [None]
+
+    async def cached():
+        return await extractor.extract_text_async("files/notes.txt")
+
+    assert asyncio.run(cached()) == "notes"
+    assert extractor.downloader.requests == [None]
+
+
+def test_stale_text_is_revalidated_with_etag(monkeypatch):
+    cache = ExtractedTextCache(ttl=timedelta(0))
+    cache.set("key:files/notes.txt", "cached notes", etag='"v1"')
+    extractor = _extractor(monkeypatch, cache)
+    extractor.downloader.release.set()
+
+    assert asyncio.run(extractor.extract_text_async("files/notes.txt")) == "cached notes"
+    assert extractor.downloader.requests == ['"v1"']
@@ -0,0 +1,56 @@
+import asyncio
+
+import httpx
+import pytest
+
+from task.utils.dial_file_downloader import DialFileDownloader, FileTooLargeError
+
+
+def _downloader(handler, **kwargs) -> DialFileDownloader:
+    # Shared pooled client with a long default timeout, like DialClientRegistry.http_client
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler), timeout=600.0)
+    return DialFileDownloader("http://dial", "key", http_client=client, **kwargs)
+
+
+def test_timeout_applies_to_shared_client():
+    timeouts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        timeouts.append(request.extensions["timeout"]["read"])
+        return httpx.Response(200, content=b"data", headers={"ETag": "v1"})
+
+    async def scenario():
+        downloader = _downloader(handler, timeout=5.0)
+        with await downloader.download("files/bucket/report.txt") as file:
+            assert file.read() == b"data"
+            assert file.etag == "v1"
+        assert await downloader.validator("files/bucket/report.txt") == "v1"
+
+    asyncio.run(scenario())
+    assert timeouts == [5.0, 5.0]
+
+
+def test_not_modified_is_reported_without_body():
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.headers["If-None-Match"] == "v1"
+        return httpx.Response(304)
+
+    async def scenario():
+        file = await _downloader(handler).download("files/bucket/report.txt", etag="v1")
+        assert file.not_modified and file.etag == "v1"
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("headers", [{"Content-Length": "100"}, {}])
+def test_body_above_limit_is_rejected(headers):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if headers:
+            return httpx.Response(200, content=b"x" * 100, headers=headers)
+        return httpx.Response(200, stream=httpx.ByteStream(b"x" * 100))
+
+    async def scenario():
+        with pytest.raises(FileTooLargeError):
+            await _downloader(handler, max_bytes=10).download("files/bucket/report.txt")
+
+    asyncio.run(scenario())
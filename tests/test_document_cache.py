@@ -0,0 +1,89 @@
+import os
+import pickle
+
+import faiss
+import numpy as np
+import pytest
+
+from task.tools.rag.bm25_index import BM25Index
+from task.tools.rag.compact_store import ChunkStore, compact_index
+from task.tools.rag.document_cache import DocumentCache
+from task.tools.rag.shared_store import FileSharedStore
+
+_CHUNKS = [f"Error E-{i}: check the door seal of model MW-{i % 7} before restarting" for i in range(300)]
+
+
+def _flat_index() -> faiss.IndexFlatL2:
+    vectors = np.random.default_rng(0).random((len(_CHUNKS), 48), dtype='float32')
+    index = faiss.IndexFlatL2(48)
+    index.add(vectors)
+    return index
+
+
+def _round_trip(tmp_path, index, chunks, lexical_index, spans=None):
+    store = FileSharedStore(str(tmp_path / "store"))
+    DocumentCache(shared_store=store).set("doc", index, chunks, lexical_index, spans)
+    return DocumentCache(shared_store=store).get("doc")
+
+
+def test_flat_entry_round_trip(tmp_path):
+    index = _flat_index()
+    lexical_index = BM25Index.from_chunks(_CHUNKS)
+    spans = np.arange(len(_CHUNKS) * 2, dtype=np.int64).reshape(-1, 2)
+    restored_index, chunks, restored_lexical, restored_spans = _round_trip(
+        tmp_path, index, list(_CHUNKS), lexical_index, spans
+    )
+
+    assert chunks == _CHUNKS
+    assert np.array_equal(restored_spans, spans)
+    query = index.reconstruct(5).reshape(1, -1)
+    assert restored_index.search(query, 5)[1].tolist() == index.search(query, 5)[1].tolist()
+    assert restored_lexical.search("E-17 door", 5) == lexical_index.search("E-17 door", 5)
+
+
+def test_compact_entry_round_trip(tmp_path):
+    index = compact_index(_flat_index(), 'sq8', rerank=True)
+    restored_index, chunks, restored_lexical, spans = _round_trip(
+        tmp_path, index, ChunkStore.from_chunks(_CHUNKS), None
+    )
+
+    assert isinstance(chunks, ChunkStore)
+    assert list(chunks) == _CHUNKS
+    assert restored_lexical is None
+    assert spans is None
+    assert np.array_equal(restored_index.exact_vectors, index.exact_vectors)
+    query = np.asarray(index.exact_vectors[3]).reshape(1, -1)
+    assert restored_index.search(query, 3)[1].tolist() == index.search(query, 3)[1].tolist()
+
+
+class _Exploit:
+    def __reduce__(self):
+        return os.system, ("touch pwned",)
+
+
+def test_pickled_entries_are_not_loaded(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = FileSharedStore(str(tmp_path / "store"))
+    store.set("doc", pickle.dumps(_Exploit()), 60)
+
+    assert DocumentCache(shared_store=store).get("doc") is None
+    assert not (tmp_path / "pwned").exists()
+
+
+def test_lock_is_released_only_by_its_owner(tmp_path):
+    first = FileSharedStore(str(tmp_path / "store"))
+    second = FileSharedStore(str(tmp_path / "store"))
+
+    assert first.try_lock("doc", 60)
+    second.unlock("doc")
+    assert not second.try_lock("doc", 60)
+    first.unlock("doc")
+    assert second.try_lock("doc", 60)
+
+
+def test_writable_directory_is_rejected(tmp_path):
+    directory = tmp_path / "store"
+    directory.mkdir(mode=0o777)
+    directory.chmod(0o777)
+    with pytest.raises(PermissionError):
+        FileSharedStore(str(directory))
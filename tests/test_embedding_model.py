@@ -0,0 +1,81 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from task.tools.rag import embedding_model
+from task.tools.rag.chunker import TextChunker
+from task.tools.rag.embedding_model import export_embedding_model, load_embedding_model
+
+
+class _FakeSentenceTransformer:
+    """Stands in for SentenceTransformer, `save_pretrained` writes the files of every backend."""
+
+    created: list[dict] = []
+
+    def __init__(self, model_name_or_path: str, **kwargs):
+        self.created.append({"model_name_or_path": model_name_or_path, **kwargs})
+
+    def save_pretrained(self, path: str) -> None:
+        for backend in ("onnx", "openvino"):
+            file_name = embedding_model._model_kwargs(backend)["file_name"]
+            os.makedirs(os.path.join(path, os.path.dirname(file_name)), exist_ok=True)
+            open(os.path.join(path, file_name), "w").close()
+
+
+@pytest.fixture
+def fake_transformer(monkeypatch):
+    _FakeSentenceTransformer.created = []
+    monkeypatch.setattr(embedding_model, "SentenceTransformer", _FakeSentenceTransformer)
+    monkeypatch.setattr(embedding_model, "_models", {})
+    return _FakeSentenceTransformer
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="Unsupported embedding backend 'tensorrt'"):
+        load_embedding_model(backend="tensorrt")
+
+
+def test_model_is_loaded_once_per_backend(fake_transformer, tmp_path):
+    model = load_embedding_model("org/model", "torch")
+    assert load_embedding_model("org/model", "torch") is model
+    assert load_embedding_model("org/model", "onnx", str(tmp_path)) is not model
+    assert [created["model_name_or_path"] for created in fake_transformer.created] == [
+        "org/model", "org/model", str(tmp_path / "org--model" / "onnx")
+    ]
+
+
+def test_export_is_reused_until_files_are_missing(fake_transformer, tmp_path):
+    path = export_embedding_model("org/model", "onnx", str(tmp_path))
+    assert len(fake_transformer.created) == 1
+    assert export_embedding_model("org/model", "onnx", str(tmp_path)) == path
+    assert len(fake_transformer.created) == 1
+
+    os.remove(os.path.join(path, "onnx", "model.onnx"))
+    assert export_embedding_model("org/model", "onnx", str(tmp_path)) == path
+    assert len(fake_transformer.created) == 2
+
+
+def test_exports_are_kept_per_backend(fake_transformer, tmp_path):
+    onnx_path = export_embedding_model("org/model", "onnx", str(tmp_path))
+    openvino_path = export_embedding_model("org/model", "openvino", str(tmp_path))
+    assert onnx_path != openvino_path
+    assert len(fake_transformer.created) == 2
+
+
+def test_onnx_backend_matches_torch(tmp_path):
+    pytest.importorskip("optimum.onnxruntime")
+    text = (Path(__file__).parent / "microwave_manual.txt").read_text(encoding="utf-8")
+    chunks = TextChunker(500, 50).split_text(text)[:64]
+    try:
+        baseline = load_embedding_model(backend="torch").encode(chunks, normalize_embeddings=True)
+    except OSError as e:
+        pytest.skip(f"embedding model is not available: {e}")
+
+    for backend in ("onnx", "onnx-int8"):
+        embeddings = load_embedding_model(backend=backend, cache_dir=str(tmp_path)).encode(
+            chunks, normalize_embeddings=True
+        )
+        cosines = np.sum(embeddings * baseline, axis=1)
+        assert cosines.mean() >= 0.98, backend
@@ -0,0 +1,110 @@
+import asyncio
+from types import SimpleNamespace
+
+from aidial_sdk.chat_completion import Attachment, CustomContent, Message, Role
+
+from task.utils import file_prefetcher
+from task.utils.file_prefetcher import FilePrefetcher
+from tests.fakes import FakeClientRegistry
+
+_TEXTS = {
+    "files/manual.pdf": "manual " * 10,
+    "files/notes.txt": "notes",
+    "files/report": "a,b",
+    "files/empty.txt": "",
+    "files/big.txt": "x" * 101,
+}
+
+
+class _Extractor:
+    """Stands in for `DialFileContentExtractor`, tracks how many extractions run at once."""
+    extracted: list[tuple[str, str]] = []
+    active = 0
+    max_active = 0
+
+    def __init__(self, endpoint: str, api_key: str, http_client=None):
+        self.api_key = api_key
+
+    async def extract_text_async(self, file_url: str) -> str:
+        _Extractor.active += 1
+        _Extractor.max_active = max(_Extractor.max_active, _Extractor.active)
+        try:
+            await asyncio.sleep(0.01)
+            if file_url not in _TEXTS:
+                raise FileNotFoundError(file_url)
+            _Extractor.extracted.append((self.api_key, file_url))
+            return _TEXTS[file_url]
+        finally:
+            _Extractor.active -= 1
+
+
+class _RagTool:
+
+    def __init__(self):
+        self.prefetched: list[tuple[str, str]] = []
+
+    async def prefetch(self, conversation_id: str, file_url: str, extractor) -> None:
+        self.prefetched.append((conversation_id, file_url))
+
+
+def _request(*attachments: tuple[str, str | None], role: Role = Role.USER, conversation_id: str | None = "chat"):
+    message = Message(
+        role=role,
+        content="Summarize the files",
+        custom_content=CustomContent(
+            attachments=[Attachment(url=url, type=mime_type) for url, mime_type in attachments]
+        ),
+    )
+    headers = {"x-conversation-id": conversation_id} if conversation_id else {}
+    return SimpleNamespace(messages=[message], headers=headers, api_key="key")
+
+
+def _prefetch(monkeypatch, request, **kwargs) -> FilePrefetcher:
+    monkeypatch.setattr(file_prefetcher, "DialFileContentExtractor", _Extractor)
+    monkeypatch.setattr(_Extractor, "extracted", [])
+    monkeypatch.setattr(_Extractor, "max_active", 0)
+    prefetcher = FilePrefetcher("http://dial", FakeClientRegistry(None), **kwargs)
+
+    async def scenario():
+        prefetcher.start(request)
+        await asyncio.gather(*prefetcher._tasks)
+
+    asyncio.run(scenario())
+    return prefetcher
+
+
+def test_supported_attachments_are_extracted_and_indexed(monkeypatch):
+    rag_tool = _RagTool()
+    request = _request(
+        ("files/manual.pdf", None), ("files/report", "text/csv"), ("files/photo.png", "image/png"),
+        ("files/empty.txt", None), ("files/big.txt", None),
+    )
+
+    _prefetch(monkeypatch, request, rag_tool=rag_tool, max_index_chars=100)
+
+    assert sorted(url for _, url in _Extractor.extracted) == [
+        "files/big.txt", "files/empty.txt", "files/manual.pdf", "files/report"
+    ]
+    # Empty documents and documents over `max_index_chars` are not indexed speculatively
+    assert sorted(rag_tool.prefetched) == [("chat", "files/manual.pdf"), ("chat", "files/report")]
+
+
+def test_prefetch_is_bounded(monkeypatch):
+    request = _request(*((f"files/missing-{i}.txt", None) for i in range(4)), ("files/notes.txt", None))
+
+    _prefetch(monkeypatch, request, max_files=3, max_concurrency=2)
+
+    assert _Extractor.max_active == 2
+    # Failures are only logged
+    assert _Extractor.extracted == []
+
+
+def test_only_new_user_attachments_are_prefetched(monkeypatch):
+    rag_tool = _RagTool()
+
+    _prefetch(monkeypatch, _request(("files/notes.txt", None), role=Role.ASSISTANT), rag_tool=rag_tool)
+    assert _Extractor.extracted == []
+
+    _prefetch(monkeypatch, _request(("files/notes.txt", None), conversation_id=None), rag_tool=rag_tool)
+    assert _Extractor.extracted == [("key", "files/notes.txt")]
+    assert rag_tool.prefetched == []
@@ -0,0 +1,75 @@
+import io
+
+import pytest
+from bs4 import BeautifulSoup
+
+from task.utils import html_text
+from task.utils.html_text import extract_html_text
+
+_DOCUMENTS = {
+    "scripts_and_styles": (
+        "<html><head><title>Manual</title><style>body { color: red; }</style>"
+        "<script>var x = '<p>not text</p>';</script></head>"
+        "<body><p>Visible</p><script type='text/javascript'>alert(1)</script>after</body></html>"
+    ),
+    "entities": "<p>Fish &amp; chips &lt;tag&gt; &quot;quoted&quot; caf&eacute; &#169; &#x2014; a&nbsp;b</p>",
+    "nested_blocks": (
+        "<div><section><h1>Title</h1><div><p>First <b>bold</b> and <i>italic</i></p>"
+        "<ul><li>one</li><li>two <span>nested</span></li></ul></div></section>"
+        "<table><tr><td>cell 1</td><td>cell 2</td></tr></table></div>"
+    ),
+    "malformed": "<div><p>Unclosed paragraph<p>Another <b>bold <i>crossed</b> tags</i><div>trailing text",
+    "whitespace_and_comments": "<p>\n   padded   \n</p><!-- hidden comment --><p></p><br/>  last  ",
+    "non_ascii": "<p>Привіт, світ</p><p>日本語のテキスト</p>",
+}
+
+
+def _baseline(html: str) -> str:
+    soup = BeautifulSoup(html, 'html.parser')
+    for script in soup(["script", "style"]):
+        script.decompose()
+    return soup.get_text(separator='\n', strip=True)
+
+
+def _extract(html: str) -> str:
+    return extract_html_text(io.BytesIO(html.encode('utf-8')))
+
+
+@pytest.fixture(params=["lxml", "stdlib"])
+def parser(request, monkeypatch):
+    if request.param == "lxml":
+        pytest.importorskip("lxml")
+    else:
+        monkeypatch.setattr(html_text, "etree", None)
+    return request.param
+
+
+@pytest.mark.parametrize("name", sorted(_DOCUMENTS))
+def test_matches_beautifulsoup_extraction(parser, name):
+    html = _DOCUMENTS[name]
+
+    assert _extract(html) == _baseline(html)
+
+
+def test_text_split_across_read_blocks(parser, monkeypatch):
+    monkeypatch.setattr(html_text, "_READ_SIZE", 7)
+    html = "<p>" + "word " * 50 + "caf&eacute; Привіт</p><script>skipped()</script><p>end</p>"
+
+    assert _extract(html) == _baseline(html)
+
+
+def test_navigation_and_templates_are_dropped(parser):
+    html = "<nav><a>Home</a></nav><noscript>Enable JS</noscript><template><p>t</p></template><p>Body</p>"
+
+    assert _extract(html) == "Body"
+
+
+def test_falls_back_to_beautifulsoup(monkeypatch):
+    def broken(file):
+        file.read()
+        raise ValueError("parser failed")
+
+    monkeypatch.setattr(html_text, "_extract_streaming", broken)
+    html = _DOCUMENTS["nested_blocks"]
+
+    assert _extract(html) == _baseline(html)
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from task.tools.rag.bm25_index import BM25Index, tokenize
+from task.tools.rag.document_cache import DocumentCache
+from task.tools.rag.rag_tool import RagTool
+
+_CHUNKS = [
+    "Error E-12 means the door sensor is faulty, contact service.",
+    "To defrost food, press the defrost button and select the weight.",
+    "The model MW-2000X supports grill and convection modes.",
+    "Clean the interior with a soft damp cloth after every use.",
+    "Do not operate the oven when it is empty.",
+    "Error E-15 indicates overheating, let the oven cool down.",
+]
+
+
+class _DenseIndex:
+    """FAISS-like index returning a fixed ranking."""
+
+    def __init__(self, ranking: list[int]):
+        self.ranking = ranking
+
+    def search(self, query_embedding, k: int):
+        ids = (self.ranking + [-1] * k)[:k]
+        return np.zeros((1, k)), np.array([ids])
+
+
+class _SparseIndex(BM25Index):
+
+    def __init__(self, ranking: list[int]):
+        super().__init__()
+        self.ranking = ranking
+
+    def search(self, query: str, k: int) -> list[tuple[int, float]]:
+        return [(chunk_id, 1.0) for chunk_id in self.ranking[:k]]
+
+
+@pytest.fixture
+def tool(embedding_model) -> RagTool:
+    return RagTool("http://dial", "gpt-4o", DocumentCache(), min_k=1, max_k=4, answer_cache_size=0)
+
+
+def _retrieve(tool: RagTool, dense: list[int], sparse: list[int], chunks: list[str] = _CHUNKS) -> list[int]:
+    retrieved = tool._retrieve("query", np.zeros((1, 4)), _DenseIndex(dense), chunks, _SparseIndex(sparse))
+    return [chunk_id for chunk_id, _ in retrieved]
+
+
+def test_tokenizer_keeps_identifiers():
+    assert tokenize("Error E-12 on MW-2000X v1.2") == [
+        "error", "e-12", "e", "12", "on", "mw-2000x", "mw", "2000x", "v1.2", "v1", "2"
+    ]
+
+
+def test_bm25_finds_exact_identifiers():
+    index = BM25Index.from_chunks(_CHUNKS)
+
+    assert [chunk_id for chunk_id, _ in index.search("what does E-12 mean", k=2)][0] == 0
+    assert index.search("MW-2000X", k=3)[0][0] == 2
+    assert index.search("unrelated words", k=3) == []
+
+
+def test_bm25_survives_serialization():
+    index = BM25Index.from_chunks(_CHUNKS)
+    restored = BM25Index.from_arrays(*index.to_arrays())
+
+    assert restored.search("error oven", k=6) == index.search("error oven", k=6)
+
+
+def test_fusion_ranks_chunks_found_by_both_retrievers_first(tool):
+    tool.max_k = 6
+
+    # 0: ranks 0 and 1, 2: ranks 2 and 0, 1 and 4: one retriever only
+    assert _retrieve(tool, dense=[0, 1, 2], sparse=[2, 0, 4])[:2] == [0, 2]
+
+
+def test_fusion_breaks_ties_by_rank(tool):
+    tool.score_cutoff = 0.0
+
+    assert _retrieve(tool, dense=[3, 1], sparse=[5, 4]) == [3, 5, 1, 4]
+
+
+def test_cutoff_drops_single_retriever_chunks_when_retrievers_agree(tool):
+    # Top chunks of each retriever (3 and 5) are not found by the other one
+    assert _retrieve(tool, dense=[3, 0, 4, 1], sparse=[5, 0, 2, 1]) == [0, 1]
+
+
+def test_min_k_is_kept_regardless_of_cutoff(tool):
+    tool.min_k = 3
+
+    assert _retrieve(tool, dense=[0, 1, 3, 4], sparse=[0, 5, 1, 2]) == [0, 1, 5]
+
+
+def test_nothing_is_dropped_when_rankings_do_not_overlap(tool):
+    assert _retrieve(tool, dense=[0, 1, 2], sparse=[3, 4, 5]) == [0, 3, 1, 4]
+
+
+def test_hybrid_search_with_real_indexes(tool):
+    index = BM25Index.from_chunks(_CHUNKS)
+    retrieved = tool._retrieve("E-15", np.zeros((1, 4)), _DenseIndex([1, 5, 3]), _CHUNKS, index)
+
+    assert retrieved[0][0] == 5
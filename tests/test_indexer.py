@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+from task.tools.rag.chunker import TextChunker
+from task.tools.rag.indexer import DocumentIndexer, iter_segments
+from task.tools.rag.rag_tool import RagTool
+from tests.fakes import HashingEmbeddingModel
+
+# Repeated paragraphs produce identical chunks at different offsets
+_TEXT = "\n\n".join(
+    ["Keep the door seal clean."] * 40 + [f"Step {i}: set the power level and press start." for i in range(300)]
+)
+
+
+def _index(text: str):
+    chunker = TextChunker(chunk_size=120, chunk_overlap=20)
+    indexer = DocumentIndexer(HashingEmbeddingModel(), chunker, chunk_size=120, batch_size=8)
+
+    async def run():
+        job = indexer.start(text)
+        await job.task
+        return job
+
+    return asyncio.run(run()), chunker
+
+
+def test_spans_locate_chunks_in_text():
+    job, chunker = _index(_TEXT)
+
+    assert len(job.spans) == len(job.chunks) == job.index.ntotal
+    assert all(_TEXT[start:end] == chunk for (start, end), chunk in zip(job.spans, job.chunks))
+    assert all(a[0] < b[0] for a, b in zip(job.spans, job.spans[1:]))
+    # Same chunks as splitting every segment on its own
+    assert job.chunks == [
+        chunk for start, end in iter_segments(_TEXT, 120 * 8) for chunk in chunker.split_text(_TEXT[start:end])
+    ]
+
+
+def test_excerpts_report_recorded_offsets_of_repeated_chunks(embedding_model):
+    job, _ = _index(_TEXT)
+    repeated = [i for i, chunk in enumerate(job.chunks) if chunk == job.chunks[0]]
+    assert len(repeated) > 1
+
+    tool = RagTool("http://dial", "gpt-4o", None, answer_cache_size=0, retrieval_only=True)
+    retrieved = [(repeated[-1], 0.03), (repeated[0], 0.02)]
+    result = tool._format_excerpts(retrieved, [job.chunks[i] for i, _ in retrieved], job.spans)
+
+    last, first = job.spans[repeated[-1]], job.spans[repeated[0]]
+    assert f"[1] score=0.0300, chars {last[0]}-{last[1]}" in result
+    assert f"[2] score=0.0200, chars {first[0]}-{first[1]}" in result
+
+
+class _PoolModel(HashingEmbeddingModel):
+
+    def __init__(self, fail: bool = False):
+        super().__init__()
+        self.fail = fail
+        self.pools_started = 0
+        self.pools_stopped = 0
+        self.pooled_batches = 0
+
+    def start_multi_process_pool(self, target_devices):
+        if self.fail:
+            raise OSError("no shared memory")
+        self.pools_started += 1
+        return {"processes": target_devices}
+
+    def stop_multi_process_pool(self, pool):
+        self.pools_stopped += 1
+
+    def encode(self, sentences, pool=None, **kwargs):
+        if pool:
+            self.pooled_batches += 1
+        return super().encode(sentences, **kwargs)
+
+
+def _pooled_indexer(model: _PoolModel, lock_path: str) -> DocumentIndexer:
+    chunker = TextChunker(chunk_size=120, chunk_overlap=20)
+    return DocumentIndexer(model, chunker, chunk_size=120, batch_size=8, workers=2, pool_lock_path=lock_path)
+
+
+def _run_job(indexer: DocumentIndexer) -> None:
+    async def run():
+        await indexer.start(_TEXT).task
+
+    asyncio.run(run())
+
+
+def test_embedding_pool_is_started_lazily_once_per_host(tmp_path):
+    lock_path = str(tmp_path / "pool.lock")
+    first_model, second_model = _PoolModel(), _PoolModel()
+    # Stand-ins for two pre-fork workers of one host
+    first, second = _pooled_indexer(first_model, lock_path), _pooled_indexer(second_model, lock_path)
+    assert first_model.pools_started == second_model.pools_started == 0
+
+    _run_job(first)
+    _run_job(second)
+    assert first_model.pools_started == 1 and first_model.pooled_batches > 0
+    assert second_model.pools_started == 0 and second_model.pooled_batches == 0
+    assert second_model.encoded > 0
+
+    first.close()
+    assert first_model.pools_stopped == 1
+    _run_job(second)
+    assert second_model.pools_started == 1
+    second.close()
+
+
+def test_embedding_falls_back_to_in_process_when_pool_fails(tmp_path):
+    model = _PoolModel(fail=True)
+    indexer = _pooled_indexer(model, str(tmp_path / "pool.lock"))
+
+    _run_job(indexer)
+
+    assert model.encoded > 0 and model.pooled_batches == 0
+    # The lock is not kept by a worker without a pool
+    other = _PoolModel()
+    other_indexer = _pooled_indexer(other, str(tmp_path / "pool.lock"))
+    _run_job(other_indexer)
+    assert other.pools_started == 1
+    other_indexer.close()
+
+
+def test_wait_ready_reports_cancelled_indexing():
+    async def scenario():
+        indexer = DocumentIndexer(HashingEmbeddingModel(), TextChunker(chunk_size=120, chunk_overlap=20), 120, 8)
+        job = indexer.start(_TEXT)
+        await asyncio.sleep(0)
+        job.task.cancel()
+        with pytest.raises(RuntimeError, match="cancelled"):
+            await job.wait_ready()
+
+    asyncio.run(scenario())
@@ -0,0 +1,90 @@
+import asyncio
+from pathlib import PurePosixPath
+from types import SimpleNamespace
+
+from task.tools.mcp.mcp_tool_model import MCPToolModel
+from task.tools.py_interpreter._response import _ExecutionResult
+from task.tools.py_interpreter.python_code_interpreter_tool import PythonCodeInterpreterTool
+from tests.fakes import FakeClientRegistry, FakeStage, tool_call_params
+
+
+class _FilesDial:
+    """`AsyncDial` with the storage calls used for spilling output, `fail` makes uploads raise."""
+
+    def __init__(self, fail: bool = False):
+        self.uploads: dict[str, bytes] = {}
+        self.fail = fail
+        self.files = SimpleNamespace(upload=self._upload)
+
+    async def my_files_home(self) -> PurePosixPath:
+        return PurePosixPath("files/bucket")
+
+    async def _upload(self, path: str, file: tuple[str, bytes, str]) -> None:
+        if self.fail:
+            raise ConnectionError("storage is down")
+        self.uploads[path] = file[1]
+
+
+def _tool(**kwargs) -> PythonCodeInterpreterTool:
+    return PythonCodeInterpreterTool(
+        None, [MCPToolModel(name="execute_code", description="", parameters={})], "execute_code", "http://dial",
+        **kwargs
+    )
+
+
+def _apply(tool: PythonCodeInterpreterTool, result: _ExecutionResult, dial: _FilesDial):
+    params = tool_call_params({"code": ""}, FakeClientRegistry(dial), choice=FakeStage())
+    asyncio.run(tool._apply_output_budget(result, params))
+    return params.choice.attachments
+
+
+def test_small_output_is_kept():
+    result = _ExecutionResult(success=True, output=["a", "b"], result="42")
+    dial = _FilesDial()
+
+    assert _apply(_tool(), result, dial) == []
+    assert result.output == ["a", "b"] and result.result == "42"
+    assert dial.uploads == {}
+
+
+def test_large_output_is_spilled_to_storage():
+    stdout = "".join(f"line {i}\n" for i in range(5000))
+    result = _ExecutionResult(success=True, output=[stdout], result="x" * 3000)
+    dial = _FilesDial()
+
+    attachments = _apply(_tool(spill_threshold=2000), result, dial)
+
+    path = "files/bucket/interpreter-output/call_1_stdout.txt"
+    assert dial.uploads == {
+        path: stdout.encode('utf-8'),
+        "files/bucket/interpreter-output/call_1_result.txt": b"x" * 3000,
+    }
+    assert [attachment.url for attachment in attachments] == list(dial.uploads)
+    assert result.output[0].startswith("line 0\n") and "line 4999" in result.output[0]
+    assert f"[Full output ({len(stdout)} chars) is saved to file: {path}]" in result.output[0]
+    assert len(result.output[0]) < 2200
+
+
+def test_output_is_truncated_when_upload_fails():
+    stdout = "y" * 10000
+    result = _ExecutionResult(success=True, output=[stdout])
+
+    assert _apply(_tool(spill_threshold=2000), result, _FilesDial(fail=True)) == []
+    assert result.output[0].endswith("[Full output (10000 chars) was truncated]")
+    assert "chars truncated" in result.output[0]
+
+
+def test_whole_result_fits_output_budget():
+    result = _ExecutionResult(
+        success=False,
+        output=["o" * 6000, "p" * 6000],
+        result="r" * 6000,
+        error="ValueError",
+        traceback=[f"  frame {i}" for i in range(100)],
+    )
+
+    _apply(_tool(output_budget=4000, spill_threshold=100000), result, _FilesDial())
+
+    assert len(result.traceback) == 21 and result.traceback[0] == "..." and result.traceback[-1] == "  frame 99"
+    assert len(result.model_dump_json().encode('utf-8')) <= 4000
+    assert all(text.startswith(text[0] * 100) for text in result.output)
@@ -0,0 +1,129 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from task.tools.mcp.mcp_tool_model import MCPToolModel
+from task.tools.py_interpreter.python_code_interpreter_tool import PythonCodeInterpreterTool
+from task.tools.py_interpreter.session_manager import InterpreterSessionManager
+
+
+class _FakeMCPClient:
+    """Interpreter server that knows `sessions` and creates `new-<n>` sessions for calls without one."""
+
+    def __init__(self, sessions: set[str]):
+        self.sessions = sessions
+        self.calls: list[tuple[str, dict]] = []
+
+    async def call_tool(self, name: str, args: dict) -> str:
+        self.calls.append((name, dict(args)))
+        session_id = args.get("session_id")
+        if session_id and session_id not in self.sessions:
+            return json.dumps({"success": False, "error": f"Session {session_id} not found"})
+        if not session_id:
+            session_id = f"new-{len(self.calls)}"
+            self.sessions.add(session_id)
+        return json.dumps({"success": True, "output": ["42"], "session_info": {"session_id": session_id}})
+
+
+def _manager(idle_timeout: float = 10.0) -> InterpreterSessionManager:
+    async def start():
+        return "warm"
+
+    return InterpreterSessionManager(start, idle_timeout=idle_timeout)
+
+
+def _tool(client: _FakeMCPClient, **kwargs) -> PythonCodeInterpreterTool:
+    return PythonCodeInterpreterTool(
+        client, [MCPToolModel(name="execute_code", description="", parameters={})], "execute_code", "http://dial",
+        **kwargs
+    )
+
+
+def test_idle_bindings_expire():
+    async def scenario():
+        manager = _manager()
+        manager.bind("idle", "kernel-1")
+        manager.bind("active", "kernel-2")
+        manager.mark_staged("kernel-1", "files/report.csv", "attachments/report.csv")
+        manager._warm_pool.append(("warm-1", 0.0))
+        manager._sessions["idle"] = ("kernel-1", 0.0)
+
+        assert manager.acquire("active") == ("kernel-2", False)
+        assert manager.stats()["expired"] == 1
+        assert manager.staged_path("kernel-1", "files/report.csv") is None
+        # Warm kernels wait in the pool, one reclaimed by the server is replaced on its first call
+        assert manager.acquire("idle") == ("warm-1", True)
+        await manager.close()
+
+    asyncio.run(scenario())
+
+
+def test_close_stops_background_work_without_server_calls():
+    async def scenario():
+        client = _FakeMCPClient(sessions=set())
+        started = asyncio.Event()
+
+        async def slow_call(name, args):
+            started.set()
+            await asyncio.sleep(3600)
+
+        client.call_tool = slow_call
+        tool = _tool(client, warm_pool_size=1)
+        tool.sessions.refill()
+        await started.wait()
+        tool.sessions.bind("conversation", "kernel-1")
+
+        await tool.close()
+        stats = tool.sessions.stats()
+        assert stats["bound_sessions"] == 0 and stats["warming"] == 0
+        assert tool.sessions._sweeper is None
+        assert not tool.sessions._tasks
+
+    asyncio.run(scenario())
+
+
+def test_lost_session_is_released_and_code_rerun():
+    async def scenario():
+        client = _FakeMCPClient(sessions={"kernel-1"})
+        tool = _tool(client)
+        tool.sessions.bind("conversation", "kernel-1")
+        client.sessions.clear()
+
+        params = SimpleNamespace(
+            tool_call=SimpleNamespace(function=SimpleNamespace(arguments=json.dumps({"code": "print(42)"}))),
+            stage=SimpleNamespace(append_content=lambda content: None),
+            conversation_id="conversation",
+        )
+        result = json.loads(await tool._execute(params))
+
+        assert result["success"]
+        assert [args.get("session_id") for _, args in client.calls] == ["kernel-1", None]
+        assert tool.sessions.acquire("conversation") == (result["session_info"]["session_id"], False)
+        assert tool.sessions.stats()["startups"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_code_errors_mentioning_sessions_are_not_retried():
+    async def scenario():
+        client = _FakeMCPClient(sessions={"kernel-1"})
+
+        async def failing(name, args):
+            client.calls.append((name, dict(args)))
+            return json.dumps({
+                "success": False, "error": "KeyError: 'session not found'", "traceback": ["KeyError"],
+                "session_info": {"session_id": "kernel-1"},
+            })
+
+        client.call_tool = failing
+        tool = _tool(client)
+        tool.sessions.bind("conversation", "kernel-1")
+        params = SimpleNamespace(
+            tool_call=SimpleNamespace(function=SimpleNamespace(arguments=json.dumps({"code": "d['session']"}))),
+            stage=SimpleNamespace(append_content=lambda content: None),
+            conversation_id="conversation",
+        )
+        await tool._execute(params)
+        assert len(client.calls) == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,128 @@
+import asyncio
+import base64
+import io
+import json
+import re
+
+from task.tools.mcp.mcp_tool_model import MCPToolModel
+from task.tools.py_interpreter import python_code_interpreter_tool
+from task.tools.py_interpreter.python_code_interpreter_tool import PythonCodeInterpreterTool
+from task.utils.admission import AdmissionController
+from task.utils.dial_file_downloader import DownloadedFile
+from tests.fakes import FakeClientRegistry, tool_call_params
+
+_FILES = {
+    "files/bucket/a/report.csv": b"a,b\n1,2\n",
+    "files/bucket/b/report.csv": b"c,d\n3,4\n",
+    "files/bucket/large.bin": bytes(range(256)) * 5000,
+}
+
+
+class _FakeDownloader:
+
+    def __init__(self, endpoint, api_key, http_client=None):
+        pass
+
+    async def download(self, file_url: str) -> DownloadedFile:
+        data = _FILES[file_url]
+        return DownloadedFile(filename=file_url.rsplit("/", 1)[-1], size=len(data), body=io.BytesIO(data))
+
+
+class _FakeInterpreter:
+    """Interpreter server keeping the files written by staging code per session."""
+
+    def __init__(self, on_call=None):
+        self.sessions: dict[str, dict[str, bytes]] = {}
+        self.calls: list[dict] = []
+        self.on_call = on_call
+
+    async def call_tool(self, name: str, args: dict) -> str:
+        self.calls.append(dict(args))
+        if self.on_call:
+            self.on_call()
+        session_id = args.get("session_id")
+        if session_id and session_id not in self.sessions:
+            return json.dumps({"success": False, "error": f"Session {session_id} not found"})
+        if not session_id:
+            session_id = f"kernel-{len(self.calls)}"
+            self.sessions[session_id] = {}
+        write = re.search(r"open\('(.+?)', '(ab|wb)'\).*b64decode\('(.*?)'\)", args["code"], re.DOTALL)
+        if write:
+            path, mode, data = write.groups()
+            files = self.sessions[session_id]
+            files[path] = (files.get(path, b"") if mode == "ab" else b"") + base64.b64decode(data)
+        return json.dumps({"success": True, "output": [], "session_info": {"session_id": session_id}})
+
+
+def _execute(tool: PythonCodeInterpreterTool, urls: list[str]) -> dict:
+    params = tool_call_params({"code": "print(1)", "attachment_urls": urls}, FakeClientRegistry(None))
+    return json.loads(asyncio.run(tool._execute(params)))
+
+
+def _tool(interpreter: _FakeInterpreter, monkeypatch) -> PythonCodeInterpreterTool:
+    monkeypatch.setattr(python_code_interpreter_tool, "DialFileDownloader", _FakeDownloader)
+    return PythonCodeInterpreterTool(
+        interpreter, [MCPToolModel(name="execute_code", description="", parameters={})], "execute_code", "http://dial"
+    )
+
+
+def test_files_are_copied_in_chunks(monkeypatch):
+    interpreter = _FakeInterpreter()
+    tool = _tool(interpreter, monkeypatch)
+
+    result = _execute(tool, ["files/bucket/large.bin"])
+
+    session_files = interpreter.sessions[result["session_info"]["session_id"]]
+    assert session_files == {"attachments/large.bin": _FILES["files/bucket/large.bin"]}
+    assert len(interpreter.calls) == 4  # three chunks and the code itself
+
+
+def test_files_with_same_name_do_not_overwrite_each_other(monkeypatch):
+    interpreter = _FakeInterpreter()
+    tool = _tool(interpreter, monkeypatch)
+
+    result = _execute(tool, ["files/bucket/a/report.csv", "files/bucket/b/report.csv", "files/bucket/a/report.csv"])
+
+    assert interpreter.sessions[result["session_info"]["session_id"]] == {
+        "attachments/report.csv": _FILES["files/bucket/a/report.csv"],
+        "attachments/report_2.csv": _FILES["files/bucket/b/report.csv"],
+    }
+    assert result["output"] == [
+        "Attached files with the same name are available as: files/bucket/b/report.csv -> attachments/report_2.csv"
+    ]
+    # Already staged files are not copied again
+    calls = len(interpreter.calls)
+    _execute(tool, ["files/bucket/b/report.csv"])
+    assert len(interpreter.calls) == calls + 1
+
+
+def test_files_are_staged_again_after_lost_session(monkeypatch):
+    interpreter = _FakeInterpreter()
+    tool = _tool(interpreter, monkeypatch)
+    first = _execute(tool, ["files/bucket/a/report.csv"])["session_info"]["session_id"]
+    interpreter.sessions.clear()
+
+    second = _execute(tool, ["files/bucket/a/report.csv"])["session_info"]["session_id"]
+
+    assert second != first
+    assert interpreter.sessions[second] == {"attachments/report.csv": _FILES["files/bucket/a/report.csv"]}
+    assert tool.sessions.staged_path(second, "files/bucket/a/report.csv") == "attachments/report.csv"
+
+
+def test_staging_runs_under_admission_control(monkeypatch):
+    controller = AdmissionController(stage_concurrency={"interpreter": 1})
+    in_use = []
+    interpreter = _FakeInterpreter(on_call=lambda: in_use.append(
+        controller.stages["interpreter"].metrics()["in_use"]
+    ))
+    tool = _tool(interpreter, monkeypatch)
+    params = tool_call_params({"code": "print(1)", "attachment_urls": ["files/bucket/large.bin"]},
+                              FakeClientRegistry(None))
+
+    async def scenario():
+        async with controller.admit("key"):
+            await tool._execute(params)
+
+    asyncio.run(scenario())
+
+    assert in_use == [1, 1, 1, 1]
@@ -0,0 +1,106 @@
+import asyncio
+import sqlite3
+
+import pytest
+from mcp.types import CallToolResult, TextContent
+
+from task.tools.mcp.mcp_client import MCPClient, MCPToolError
+from task.tools.mcp.mcp_tool import MCPTool
+from task.tools.mcp.mcp_tool_model import MCPToolModel
+from task.tools.mcp.result_store import CachePolicy, MCPResultStore
+
+
+class _FakeSession:
+
+    def __init__(self, result: CallToolResult):
+        self.result = result
+        self.calls = 0
+
+    async def call_tool(self, name, args):
+        self.calls += 1
+        return self.result
+
+
+def _client(text: str, is_error: bool = False) -> MCPClient:
+    client = MCPClient("http://localhost:8051/mcp")
+    client.session = _FakeSession(CallToolResult(content=[TextContent(type="text", text=text)], isError=is_error))
+    return client
+
+
+def _tool(client: MCPClient, store: MCPResultStore) -> MCPTool:
+    return MCPTool(client, MCPToolModel(name="search", description="", parameters={}), store, CachePolicy(60, 600))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MCPResultStore(str(tmp_path / "cache" / "results.sqlite3"))
+    yield store
+    store.close()
+
+
+def test_error_result_raises():
+    with pytest.raises(MCPToolError, match="rate limited"):
+        asyncio.run(_client("rate limited", is_error=True).call_tool("search", {}))
+
+
+def test_results_are_cached(store):
+    client = _client("1. DIAL - https://dialx.ai")
+    tool = _tool(client, store)
+    assert asyncio.run(tool._execute_cached({"query": "dial"})) == "1. DIAL - https://dialx.ai"
+    assert asyncio.run(tool._execute_cached({"query": "dial"})) == "1. DIAL - https://dialx.ai"
+    assert client.session.calls == 1
+
+
+@pytest.mark.parametrize("text", [
+    "No results were found for your search query.",
+    "Error: Could not access the webpage (403 Forbidden)",
+    "   ",
+])
+def test_failed_replies_are_not_cached(store, text):
+    client = _client(text)
+    tool = _tool(client, store)
+    asyncio.run(tool._execute_cached({"query": "dial"}))
+    asyncio.run(tool._execute_cached({"query": "dial"}))
+    assert client.session.calls == 2
+
+
+def test_error_results_are_not_cached(store):
+    client = _client("rate limited", is_error=True)
+    tool = _tool(client, store)
+    for _ in range(2):
+        with pytest.raises(MCPToolError):
+            asyncio.run(tool._execute_cached({"query": "dial"}))
+    assert client.session.calls == 2
+    assert store.get(MCPResultStore.make_key("search", {"query": "dial"})) is None
+
+
+def test_hits_do_not_write_until_flushed(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    store = MCPResultStore(path, access_flush_size=2)
+    store.set("search:a", "a", CachePolicy(60))
+    store.set("search:b", "b", CachePolicy(60))
+
+    def accessed_at(key):
+        with sqlite3.connect(path) as db:
+            return db.execute("SELECT accessed_at FROM results WHERE key = ?", (key,)).fetchone()[0]
+
+    written = accessed_at("search:a")
+    assert store.get("search:a") == ("a", True)
+    assert accessed_at("search:a") == written
+    store.get("search:b")
+    assert accessed_at("search:a") > written
+    store.close()
+
+
+def test_lru_eviction_uses_batched_access_times(tmp_path):
+    store = MCPResultStore(
+        str(tmp_path / "results.sqlite3"), max_bytes=250, memory_entries=1, compress_threshold=10_000
+    )
+    store.set("search:a", "a" * 100, CachePolicy(60))
+    store.set("search:b", "b" * 100, CachePolicy(60))
+    store.get("search:a")
+    store.set("search:c", "c" * 100, CachePolicy(60))
+    assert store.get("search:a") is not None
+    assert store.get("search:b") is None
+    store.close()
+
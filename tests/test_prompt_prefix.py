@@ -0,0 +1,50 @@
+from typing import Any
+
+from task.tools.base import BaseTool
+from task.utils.prompt_prefix import PromptCacheStats, PromptPrefix
+
+
+class _Tool(BaseTool):
+
+    def __init__(self, name: str):
+        self._name = name
+
+    async def _execute(self, tool_call_params):
+        return ""
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def description(self) -> str:
+        return f"Tool {self._name}"
+
+    @property
+    def parameters(self) -> dict[str, Any]:
+        return {"type": "object", "properties": {"query": {"type": "string"}}}
+
+
+def test_schemas_and_fingerprint_do_not_depend_on_tool_order():
+    first = PromptPrefix("You are helpful.", [_Tool("search"), _Tool("rag")])
+    second = PromptPrefix("You are helpful.", [_Tool("rag"), _Tool("search")])
+    assert first.tool_schemas() == second.tool_schemas()
+    assert first.fingerprint == second.fingerprint
+    assert first.fingerprint != PromptPrefix("You are brief.", [_Tool("rag"), _Tool("search")]).fingerprint
+
+
+def test_fingerprint_follows_the_tools_actually_sent():
+    prefix = PromptPrefix("You are helpful.", [_Tool("search"), _Tool("rag")])
+    subset = prefix.tool_schemas(["rag"])
+    assert [schema["function"]["name"] for schema in subset] == ["rag"]
+    assert prefix.fingerprint_for(prefix.tool_schemas()) == prefix.fingerprint
+    assert prefix.fingerprint_for(subset) != prefix.fingerprint
+    assert prefix.fingerprint_for(None) == prefix.fingerprint_for([])
+
+
+def test_cache_stats_read_openai_and_anthropic_usage():
+    stats = PromptCacheStats()
+    stats.record("a", {"prompt_tokens": 100, "prompt_tokens_details": {"cached_tokens": 80}})
+    stats.record("a", {"prompt_tokens": 100, "cache_read_input_tokens": 20})
+    stats.record("b", None)
+    assert stats.stats() == {"a": {"calls": 2, "prompt_tokens": 200, "cached_tokens": 100, "hit_ratio": 0.5}}
@@ -0,0 +1,145 @@
+import asyncio
+
+from task.tools.rag import rag_tool
+from task.tools.rag.document_cache import DocumentCache
+from task.tools.rag.rag_tool import RagTool
+from tests.fakes import FakeClientRegistry, FakeDial, FakeExtractor, chunk, tool_call_params, wait_for
+
+_KEY = "conversation:files/manual.txt"
+_TEXT = "\n\n".join(f"Paragraph {i} about the microwave oven and its safety instructions." for i in range(200))
+
+
+def _rag_tool() -> RagTool:
+    return RagTool("http://dial", "gpt-4o", DocumentCache(), answer_cache_size=0, embedding_batch_size=8)
+
+
+async def _open_and_store(tool: RagTool, extractor: FakeExtractor, key: str = _KEY, file_url: str = "files/manual.txt"):
+    document = await tool._open_document(key, file_url, extractor)
+    if isinstance(document, rag_tool.IndexingJob):
+        await document.task
+        await wait_for(lambda: not tool._indexing_jobs)
+    return document
+
+
+def test_known_version_is_served_without_download(embedding_model):
+    async def scenario():
+        tool = _rag_tool()
+        extractor = FakeExtractor(_TEXT)
+        first = await _open_and_store(tool, extractor)
+        assert isinstance(first, rag_tool.IndexingJob)
+        assert extractor.extractions == [True]
+
+        cached = await tool._open_document(_KEY, "files/manual.txt", extractor)
+        assert isinstance(cached, tuple)
+        assert extractor.downloader.validator_calls == 1
+        assert extractor.extractions == [True]
+
+        # After the check interval the unchanged file is only revalidated
+        tool._versions[_KEY].checked_at -= rag_tool._VERSION_CHECK_SECONDS
+        cached = await tool._open_document(_KEY, "files/manual.txt", extractor)
+        assert isinstance(cached, tuple)
+        assert extractor.downloader.validator_calls == 2
+        assert extractor.extractions == [True]
+
+    asyncio.run(scenario())
+
+
+def test_new_version_is_reindexed_reusing_embeddings(embedding_model):
+    async def scenario():
+        tool = _rag_tool()
+        extractor = FakeExtractor(_TEXT)
+        await _open_and_store(tool, extractor)
+        first_version = tool._versions[_KEY].key
+
+        tool._versions[_KEY].checked_at -= rag_tool._VERSION_CHECK_SECONDS
+        extractor.downloader.current_validator = "v2"
+        extractor.text = _TEXT.replace("Paragraph 100 ", "Edited paragraph 100 ")
+        encoded = embedding_model.encoded
+        job = await _open_and_store(tool, extractor)
+
+        assert isinstance(job, rag_tool.IndexingJob)
+        assert extractor.extractions == [True, True]
+        assert tool._versions[_KEY].key != first_version
+        assert job.reused_chunks > 0
+        assert embedding_model.encoded - encoded < len(job.chunks)
+
+    asyncio.run(scenario())
+
+
+def test_content_hash_is_used_without_validator(embedding_model):
+    async def scenario():
+        tool = _rag_tool()
+        extractor = FakeExtractor(_TEXT, validator=None)
+        await _open_and_store(tool, extractor)
+        first_version = tool._versions[_KEY].key
+
+        tool._versions[_KEY].checked_at -= rag_tool._VERSION_CHECK_SECONDS
+        cached = await tool._open_document(_KEY, "files/manual.txt", extractor)
+        assert isinstance(cached, tuple)
+        assert extractor.extractions == [False, True]
+        assert tool._versions[_KEY].key == first_version
+
+    asyncio.run(scenario())
+
+
+def test_version_is_recorded_only_after_index_is_stored(embedding_model, monkeypatch):
+    async def scenario():
+        tool = _rag_tool()
+
+        def fail(*args, **kwargs):
+            raise RuntimeError("cache is unavailable")
+
+        monkeypatch.setattr(tool.document_cache, "set", fail)
+        job = await tool._open_document(_KEY, "files/manual.txt", FakeExtractor(_TEXT))
+        assert _KEY not in tool._versions
+        await job.task
+        await wait_for(lambda: not tool._indexing_jobs)
+        assert _KEY not in tool._versions
+
+    asyncio.run(scenario())
+
+
+def test_empty_document_releases_claim(embedding_model):
+    async def scenario():
+        tool = _rag_tool()
+        released = []
+        tool.document_cache.release_claim = released.append
+        assert await tool._open_document(_KEY, "files/manual.txt", FakeExtractor("")) is None
+        assert len(released) == 1
+
+    asyncio.run(scenario())
+
+
+
+def test_answers_are_not_shared_between_documents_with_same_validator(embedding_model, monkeypatch):
+    # Both files were uploaded within the same second, so their Last-Modified validators are equal
+    last_modified = "Mon, 05 Oct 2026 10:00:00 GMT"
+    extractors = {
+        "files/a/salary.txt": FakeExtractor("Alice's salary is 100 000 per year.", validator=last_modified),
+        "files/b/salary.txt": FakeExtractor("Bob's salary is 50 000 per year.", validator=last_modified),
+    }
+    current = {}
+    monkeypatch.setattr(rag_tool, "DialFileContentExtractor", lambda *args: current["extractor"])
+
+    async def ask(tool: RagTool, file_url: str, registry: FakeClientRegistry, conversation_id: str) -> str:
+        current["extractor"] = extractors[file_url]
+        # Answers from a partially indexed document aren't cached, so index it first
+        await _open_and_store(tool, extractors[file_url], f"{conversation_id}:{file_url}", file_url)
+        params = tool_call_params({"request": "What is the salary?", "file_url": file_url}, registry,
+                                  conversation_id=conversation_id)
+        answer = await tool._execute(params)
+        await wait_for(lambda: not tool._indexing_jobs)
+        return answer
+
+    async def scenario():
+        tool = RagTool("http://dial", "gpt-4o", DocumentCache())
+        registry = FakeClientRegistry(FakeDial([[chunk("100 000")], [chunk("50 000")]]))
+        assert await ask(tool, "files/a/salary.txt", registry, "conversation-a") == "100 000"
+        assert await ask(tool, "files/b/salary.txt", registry, "conversation-b") == "50 000"
+        assert len(registry.dial.chat.completions.calls) == 2
+
+        # Same document and question is still answered from the cache
+        assert await ask(tool, "files/a/salary.txt", registry, "conversation-a") == "100 000"
+        assert len(registry.dial.chat.completions.calls) == 2
+
+    asyncio.run(scenario())
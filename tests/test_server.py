@@ -0,0 +1,48 @@
+import socket
+
+import pytest
+
+from task import server
+from task.server import PreforkServer
+
+
+def test_fast_failures_back_off_and_give_up():
+    prefork = PreforkServer("127.0.0.1", 0, 2)
+    prefork._spawned_at = {0: 100.0, 1: 100.0}
+    delays = [prefork._restart_delay(0, 1, 101.0) for _ in range(server._MAX_FAST_FAILURES - 1)]
+    assert delays == sorted(delays) and delays[0] > 0
+    assert prefork._restart_delay(0, 1, 101.0) is None
+    # Failures are counted per worker slot
+    assert prefork._restart_delay(1, 1, 101.0) == delays[0]
+
+
+def test_clean_exit_or_long_run_resets_failures():
+    prefork = PreforkServer("127.0.0.1", 0, 1)
+    prefork._spawned_at = {0: 100.0}
+    prefork._restart_delay(0, 1, 101.0)
+    prefork._restart_delay(0, 1, 101.0)
+    assert prefork._restart_delay(0, -9, 100.0 + server._FAST_FAILURE_SECONDS) == 0.0
+    assert prefork._fast_failures[0] == 0
+    prefork._restart_delay(0, 1, 101.0)
+    assert prefork._restart_delay(0, 0, 101.0) == 0.0
+    assert prefork._fast_failures[0] == 0
+
+
+@pytest.mark.parametrize("error, exit_code", [
+    (RuntimeError("broken config"), server._EXIT_ERROR),
+    (SystemExit(server._EXIT_STARTUP_FAILURE), server._EXIT_STARTUP_FAILURE),
+])
+def test_worker_errors_are_logged_with_exit_code(monkeypatch, capsys, error, exit_code):
+    class _FailingServer:
+
+        def __init__(self, config):
+            self.started = False
+
+        def run(self, sockets):
+            raise error
+
+    monkeypatch.setattr(server.uvicorn, "Server", _FailingServer)
+    with socket.socket() as sock:
+        assert PreforkServer("127.0.0.1", 0, 1)._serve(sock) == exit_code
+    if isinstance(error, RuntimeError):
+        assert "RuntimeError: broken config" in capsys.readouterr().err
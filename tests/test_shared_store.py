@@ -0,0 +1,60 @@
+import os
+import time
+
+from task.tools.rag import shared_store
+from task.tools.rag.shared_store import FileSharedStore, create_shared_store
+
+
+def _files(store: FileSharedStore, suffix: str) -> list[str]:
+    return [name for name in os.listdir(store._directory) if name.endswith(suffix)]
+
+
+def test_sweep_removes_expired_entries_without_reading_them(tmp_path):
+    store = FileSharedStore(str(tmp_path / "store"))
+    store.set("expired", b"old", ttl_seconds=60)
+    store.set("live", b"new", ttl_seconds=60)
+    past = time.time() - 1
+    os.utime(store._path("expired", ".bin"), (past, past))
+    assert len(_files(store, ".bin")) == 2
+
+    store.sweep()
+    assert len(_files(store, ".bin")) == 1
+    assert store.get("live") == b"new"
+
+
+def test_entries_closest_to_expiration_are_evicted_over_budget(tmp_path):
+    store = FileSharedStore(str(tmp_path / "store"), max_bytes=250, sweep_interval=3600)
+    for i, ttl in enumerate([300, 100, 200]):
+        store.set(f"entry-{i}", b"x" * 100, ttl_seconds=ttl)
+    store.sweep()
+    assert store.get("entry-1") is None
+    assert store.get("entry-0") == b"x" * 100
+    assert store.get("entry-2") == b"x" * 100
+
+
+def test_set_sweeps_after_interval(tmp_path):
+    store = FileSharedStore(str(tmp_path / "store"), max_bytes=150, sweep_interval=0.0)
+    store.set("first", b"x" * 100, ttl_seconds=60)
+    store.set("second", b"y" * 100, ttl_seconds=120)
+    assert store.get("first") is None
+    assert store.get("second") == b"y" * 100
+
+
+def test_sweep_removes_only_abandoned_locks(tmp_path):
+    store = FileSharedStore(str(tmp_path / "store"))
+    assert store.try_lock("abandoned", ttl_seconds=600)
+    assert store.try_lock("held", ttl_seconds=600)
+    abandoned = store._path("abandoned", ".lock")
+    past = time.time() - shared_store._ABANDONED_FILE_SECONDS - 1
+    os.utime(abandoned, (past, past))
+
+    store.sweep()
+    assert not abandoned.exists()
+    assert store._path("held", ".lock").exists()
+
+
+def test_url_sets_budget(tmp_path):
+    store = create_shared_store(f"file://{tmp_path / 'store'}?max_bytes=1024")
+    assert isinstance(store, FileSharedStore)
+    assert store.max_bytes == 1024
+    assert store._directory == tmp_path / "store"
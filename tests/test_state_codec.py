@@ -0,0 +1,117 @@
+import base64
+import zlib
+
+import pytest
+from aidial_sdk.chat_completion import Message, Role
+
+from task.tools.rag.shared_store import FileSharedStore
+from task.utils.constants import CONTENT_REF_KEY, STATE_VERSION_KEY, TOOL_CALL_HISTORY_KEY
+from task.utils.history import unpack_messages
+from task.utils.state_codec import BlobStore, StateCodec
+
+_CONVERSATION = "conversations/user-bucket/chat"
+_LARGE = "".join(f"row {i}: {i * 7919 % 10007}\n" for i in range(3000))
+
+
+class _CountingStore(FileSharedStore):
+
+    def __init__(self, directory: str):
+        super().__init__(directory)
+        self.reads = 0
+
+    def get(self, key):
+        self.reads += 1
+        return super().get(key)
+
+
+def _history(content: str) -> list[dict]:
+    return [
+        {"role": "assistant", "tool_calls": [{"id": "call_1", "type": "function",
+                                              "function": {"name": "search", "arguments": "{}"}}]},
+        {"role": "tool", "tool_call_id": "call_1", "content": content},
+    ]
+
+
+def _unpack(codec: StateCodec, state: dict) -> list[dict]:
+    message = Message(role=Role.ASSISTANT, content="done", custom_content={"state": state})
+    return unpack_messages([Message(role=Role.USER, content="hi"), message], [], codec)
+
+
+def test_inline_contents_round_trip_compressed():
+    codec = StateCodec()
+    state = codec.encode(_history(_LARGE), _CONVERSATION)
+    assert state[STATE_VERSION_KEY] == 2
+    assert "content" not in state[TOOL_CALL_HISTORY_KEY][1]
+    assert codec.decode(state) == _history(_LARGE)
+
+
+def test_plain_history_is_passed_through():
+    assert StateCodec().decode({TOOL_CALL_HISTORY_KEY: _history("result")}) == _history("result")
+
+
+def test_blobs_are_fetched_only_when_resolved(tmp_path):
+    store = _CountingStore(str(tmp_path / "blobs"))
+    codec = StateCodec(BlobStore(store))
+    state = codec.encode(_history(_LARGE), _CONVERSATION)
+    assert CONTENT_REF_KEY in state[TOOL_CALL_HISTORY_KEY][1]
+    assert store.reads == 0
+
+    messages = _unpack(codec, state)
+    assert store.reads == 0
+    assert CONTENT_REF_KEY in messages[2]
+
+    resolved = codec.resolve(messages, _CONVERSATION)
+    assert resolved[2]["content"] == _LARGE
+    assert CONTENT_REF_KEY not in resolved[2]
+    assert store.reads == 1
+
+
+def test_existing_blob_is_not_read_back_on_put(tmp_path):
+    store = _CountingStore(str(tmp_path / "blobs"))
+    blobs = BlobStore(store)
+    digest = blobs.put(_CONVERSATION, b"data")
+    assert blobs.put(_CONVERSATION, b"data") == digest
+    assert store.reads == 0
+
+
+def test_blobs_are_scoped_to_conversation(tmp_path):
+    codec = StateCodec(BlobStore(FileSharedStore(str(tmp_path / "blobs"))))
+    state = codec.encode(_history(_LARGE), _CONVERSATION)
+    messages = _unpack(codec, state)
+
+    assert codec.resolve(messages, "conversations/other-bucket/chat")[2]["content"] != _LARGE
+    assert codec.resolve(messages, None)[2]["content"] != _LARGE
+    assert codec.resolve(messages, _CONVERSATION)[2]["content"] == _LARGE
+
+
+def test_large_contents_stay_inline_without_conversation(tmp_path):
+    codec = StateCodec(BlobStore(FileSharedStore(str(tmp_path / "blobs"))))
+    state = codec.encode(_history(_LARGE))
+    assert CONTENT_REF_KEY not in state[TOOL_CALL_HISTORY_KEY][1]
+    assert codec.decode(state) == _history(_LARGE)
+
+
+def _compressed_state(payload: str) -> dict:
+    return {
+        STATE_VERSION_KEY: 2,
+        TOOL_CALL_HISTORY_KEY: [{"role": "tool", "tool_call_id": "call_1", "content_zlib": payload}],
+    }
+
+
+def test_decompression_bomb_is_not_inflated():
+    bomb = base64.b64encode(zlib.compress(b"\0" * (64 * 1024 * 1024), 9)).decode('ascii')
+    history = StateCodec(max_content_bytes=1024 * 1024).decode(_compressed_state(bomb))
+    assert history[0]["content"] == "[Tool output could not be decoded]"
+
+
+@pytest.mark.parametrize("payload", [
+    "not base64!",
+    base64.b64encode(b"not zlib").decode('ascii'),
+    base64.b64encode(zlib.compress(b"\xff\xfe invalid utf-8")).decode('ascii'),
+    base64.b64encode(zlib.compress(b"truncated" * 100)[:20]).decode('ascii'),
+    12345,
+])
+def test_corrupt_content_is_replaced_by_placeholder(payload):
+    history = StateCodec().decode(_compressed_state(payload))
+    assert history[0]["content"] == "[Tool output could not be decoded]"
+    assert history[0]["tool_call_id"] == "call_1"
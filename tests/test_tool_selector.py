@@ -0,0 +1,107 @@
+import asyncio
+from typing import Any
+
+from aidial_sdk.chat_completion import Attachment, CustomContent, Message, Role
+
+from task.tools.base import BaseTool
+from task.utils.tool_selector import ToolSelector
+from tests.fakes import HashingEmbeddingModel
+
+
+class _Tool(BaseTool):
+
+    def __init__(self, name: str, description: str, parameter: str = "query"):
+        self._name = name
+        self._description = description
+        self._parameter = parameter
+
+    async def _execute(self, tool_call_params):
+        return ""
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def description(self) -> str:
+        return self._description
+
+    @property
+    def parameters(self) -> dict[str, Any]:
+        return {"type": "object", "properties": {self._parameter: {"type": "string"}}}
+
+
+_TOOLS = [
+    _Tool("weather", "weather forecast temperature rain wind"),
+    _Tool("stocks", "stock prices market shares exchange"),
+    _Tool("translate", "translate text between languages"),
+    _Tool("read_file", "read content of an attached document", parameter="file_url"),
+    _Tool("calculator", "calculate arithmetic math expressions"),
+]
+
+
+def _selector(max_tools: int = 2, load_model=HashingEmbeddingModel, **kwargs) -> ToolSelector:
+    return ToolSelector(_TOOLS, max_tools, load_model, **kwargs)
+
+
+def _select(selector: ToolSelector, question: str, prepared_messages=(), attachments: bool = False) -> list[str]:
+    custom_content = CustomContent(attachments=[Attachment(url="files/bucket/report.pdf")]) if attachments else None
+    messages = [Message(role=Role.USER, content=question, custom_content=custom_content)]
+    return [tool.name for tool in asyncio.run(selector.select(messages, list(prepared_messages)))]
+
+
+def test_selects_top_ranked_tools_in_registration_order():
+    selected = _select(_selector(), "What is the weather forecast, will there be rain and wind?")
+
+    assert len(selected) == 2
+    assert "weather" in selected
+    assert selected == [tool.name for tool in _TOOLS if tool.name in selected]
+
+
+def test_previously_called_tools_are_always_included():
+    prepared = [
+        {"role": "user", "content": "price of ACME"},
+        {"role": "assistant", "tool_calls": [{"id": "1", "type": "function", "function": {"name": "stocks"}}]},
+        {"role": "tool", "tool_call_id": "1", "content": "42"},
+    ]
+
+    selected = _select(_selector(), "weather forecast rain wind", prepared)
+
+    assert selected == ["weather", "stocks"]
+
+
+def test_file_tools_are_included_when_conversation_has_attachments():
+    selected = _select(_selector(max_tools=1), "weather forecast rain wind", attachments=True)
+
+    assert selected == ["read_file"]
+
+
+def test_all_tools_are_sent_when_selection_does_not_apply():
+    assert len(_select(_selector(max_tools=0), "weather forecast")) == len(_TOOLS)
+    assert len(_select(_selector(max_tools=len(_TOOLS)), "weather forecast")) == len(_TOOLS)
+    assert len(_select(_selector(min_similarity=1.01), "weather forecast")) == len(_TOOLS)
+    assert len(_select(_selector(), "   ")) == len(_TOOLS)
+
+
+def test_falls_back_to_all_tools_when_embedding_model_is_missing():
+    loads = []
+
+    def load_model():
+        loads.append(1)
+        raise OSError("model weights not found")
+
+    selector = _selector(load_model=load_model)
+
+    assert _select(selector, "weather forecast") == [tool.name for tool in _TOOLS]
+    assert _select(selector, "stock prices") == [tool.name for tool in _TOOLS]
+    assert len(loads) == 1
+
+
+def test_tool_embeddings_are_computed_once():
+    model = HashingEmbeddingModel()
+    selector = _selector(load_model=lambda: model)
+
+    _select(selector, "weather forecast")
+    _select(selector, "stock prices")
+
+    assert model.encoded == len(_TOOLS) + 2